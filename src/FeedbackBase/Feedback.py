@@ -22,14 +22,25 @@ feedbacks.
 
 
 import logging
-import threading
-import datetime
 import sys
 import cPickle as pickle
-from threading import Event, Timer
+from threading import Event, Condition, Thread, current_thread
+from collections import deque
 import socket
 import json
 
+from lib import bcixml
+from lib import trigger
+from lib import markers
+from lib import timeline
+
+
+# Delivery policies for control events, see Feedback.set_control_delivery
+CONTROL_DELIVERY_LOSSLESS = "lossless"
+CONTROL_DELIVERY_LATEST = "latest"
+CONTROL_DELIVERY_QUEUE = "queue"
+DEFAULT_CONTROL_QUEUE_SIZE = 32
+
 
 class Feedback(object):
     """
@@ -68,6 +79,12 @@ class Feedback(object):
 
     """
 
+    # Set to True in derived classes which call :func:`_poll_control_ring`
+    # regularly from their main loop.
+    _polls_control_ring = False
+    # Presentation timeline recording the triggers, see lib.timeline
+    _timeline = None
+
     def __init__(self, port_num=None):
         """
         Initializes the feedback.
@@ -104,12 +121,38 @@ class Feedback(object):
         self._playEvent = Event()
         self._shouldQuit = False
 
-        # Initialize with dummy values so we cann call safely .cancel
-        self._triggerResetTimer = Timer(0, None)
-        self._triggerResetTime = 0.01
+        # Shared memory ring for control signals, see lib.controlring
+        self._control_ring = None
+        self._control_seq = 0
+
+        # Delivery of control events, see set_control_delivery
+        self._control_delivery = CONTROL_DELIVERY_LOSSLESS
+        self._control_queue = deque()
+        self._control_queue_size = DEFAULT_CONTROL_QUEUE_SIZE
+        self._control_cond = Condition()
+        self._control_thread = None
+        self._control_events_received = 0
+        self._control_events_dropped = 0
+        self._control_events_coalesced = 0
+
+        # Triggers are reset by the process' trigger dispatcher
+        self._triggerPort = None
+        if self._pport:
+            self._triggerPort = trigger.ParallelPort(self._pport, self._port_num)
+        # Used without a parallel port, the dispatcher still records the times
+        self._nullPort = trigger.NullPort()
+        self._triggerResetTime = trigger.DEFAULT_RESET_TIME
+        # Serial port for markers, e.g. the trigger_port of a
+        # lib.serialport.SerialPort, set by Feedbacks triggering via serial
+        self._serialTriggerPort = None
 
         self.udp_markers_host = '127.0.0.1'
         self.udp_markers_port = 12344
+        self._udp_markers_socket = None
+
+        # Transports used by send_marker: parallel, serial, udp and lsl
+        self.marker_transports = ['parallel', 'serial', 'udp', 'lsl']
+        self._marker_sink = None
 
         #self.tcp_markers_enable = False
         #self.tcp_markers_host = '127.0.0.1'
@@ -117,7 +160,8 @@ class Feedback(object):
 
         self._has_lsl = False
         try:
-            from pylsl import StreamInfo, StreamOutlet
+            from pylsl import StreamInfo, StreamOutlet, local_clock
+            self._lsl_local_clock = local_clock
             self._has_lsl = True
         except:
             self.logger.warning("Could not import LabStreamingLayer. Ignore, if you don't want to send LSL Markers.")
@@ -141,11 +185,107 @@ class Feedback(object):
         """
         Store the data in the feedback and call on_control_event.
 
+        Batched control signals are passed to on_control_batch instead.
+
         You should not override this method, use on_control_event instead.
         """
+        if bcixml.CL_BATCH in data:
+            self.on_control_batch(data[bcixml.CL_BATCH])
+            return
         self._data = data
         self.on_control_event(data)
 
+    def _queue_control_event(self, data):
+        """
+        Deliver the control event according to the delivery policy.
+
+        This method is called by the IPC channel. In lossless mode the event
+        is handled right away, otherwise it is queued for the delivery
+        thread.
+        """
+        if self._control_delivery == CONTROL_DELIVERY_LOSSLESS:
+            self._control_events_received += 1
+            self._on_control_event(data)
+            return
+        self._control_cond.acquire()
+        try:
+            self._control_events_received += 1
+            if self._control_delivery == CONTROL_DELIVERY_LATEST:
+                if self._control_queue:
+                    self._control_queue.clear()
+                    self._control_events_coalesced += 1
+            elif len(self._control_queue) >= self._control_queue_size:
+                self._control_queue.popleft()
+                self._control_events_dropped += 1
+            self._control_queue.append(data)
+            self._control_cond.notify()
+        finally:
+            self._control_cond.release()
+
+    def _control_delivery_loop(self):
+        """Deliver queued control events until the delivery is stopped."""
+        me = current_thread()
+        while True:
+            self._control_cond.acquire()
+            try:
+                while not self._control_queue and self._control_thread is me:
+                    self._control_cond.wait()
+                # stopped or replaced by a new delivery thread
+                if self._control_thread is not me:
+                    return
+                data = self._control_queue.popleft()
+            finally:
+                self._control_cond.release()
+            try:
+                self._on_control_event(data)
+            except:
+                self.logger.exception("Handling a control event caused an exception:")
+
+    def _stop_control_delivery(self):
+        """Stop the delivery thread, pending control events are discarded."""
+        self._control_cond.acquire()
+        try:
+            self._control_thread = None
+            self._control_queue.clear()
+            self._control_cond.notifyAll()
+        finally:
+            self._control_cond.release()
+
+    def _attach_control_ring(self, ring):
+        """
+        Attach the shared memory ring for control signals.
+
+        The Feedback Controller writes numeric control signals into the ring
+        instead of sending them via IPC, as long as a Feedback is attached.
+        Feedbacks which do not poll the ring stay detached.
+
+        :param ring: The ring buffer
+        :type ring: lib.controlring.ControlSignalRing
+        :returns: True if the ring was attached, False otherwise
+
+        """
+        if not self._polls_control_ring:
+            self.logger.debug("Not polling the control signal ring, leaving it detached.")
+            return False
+        self._control_ring = ring
+        self._control_seq = 0
+        ring.attach()
+        return True
+
+    def _poll_control_ring(self):
+        """
+        Read the latest control signal from the ring, if there is a new one,
+        and call on_control_event.
+
+        You should not override this method.
+        """
+        if self._control_ring is None:
+            return
+        seq, data = self._control_ring.read_latest(self._control_seq)
+        if data is not None:
+            self._control_seq = seq
+            self._on_control_event(data)
+
     def _on_interaction_event(self, data):
         """
         Store the variable-value pairs in the feedback and call
@@ -182,7 +322,10 @@ class Feedback(object):
 
         You should not override this method, use on_play instead.
         """
-        self._udp_markers_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self._udp_markers_socket is None:
+            self._udp_markers_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # set up the marker transports again with the current variables
+        self._close_marker_sink()
         #if self.tcp_markers_enable:
         #    self.logger.info("Connecting to " + self.tcp_markers_host + ":" + str(self.tcp_markers_port))
         #    self._tcp_markers_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -216,7 +359,9 @@ class Feedback(object):
         """
         self._shouldQuit = True
         self._playEvent.set()
+        self._stop_control_delivery()
         self.on_quit()
+        self._close_marker_sink()
 
 
     #
@@ -316,31 +461,89 @@ class Feedback(object):
         self.logger.debug("on_control_event not implemented yet!")
 
 
+    def on_control_batch(self, samples):
+        """
+        This method is called after the FeedbackController received a batched
+        control signal, carrying several classifier outputs at once.
+
+        The default implementation passes only the latest sample as
+        ``{"cl_output" : value}`` to :func:`on_control_event`. Override this
+        method if you want to process every sample.
+
+        :param samples: (timestamp, cl_output) tuples, oldest first
+        :type samples: list
+
+        """
+        if samples:
+            timestamp, value = samples[-1]
+            self._on_control_event({bcixml.CL_OUTPUT : value})
+
+
     #
     # Common routines for all feedbacks
     #
+    def set_control_delivery(self, policy, queue_size=None):
+        """Set how control events are delivered to :func:`on_control_event`.
+
+        By default every control event is delivered right away by the thread
+        receiving it (``CONTROL_DELIVERY_LOSSLESS``). If your
+        :func:`on_control_event` is slow, the events pile up. With the other
+        policies the events are delivered by a separate thread instead:
+
+        ``CONTROL_DELIVERY_LATEST``
+            only the latest pending event is delivered, older ones are
+            coalesced
+        ``CONTROL_DELIVERY_QUEUE``
+            up to ``queue_size`` pending events are kept, if the queue is
+            full the oldest one is dropped
+
+        The number of received, dropped and coalesced events is available
+        via the Feedback's variables.
+
+        :param policy: One of the ``CONTROL_DELIVERY_*`` constants
+        :type policy: str
+        :param queue_size: Maximum number of pending events for
+            ``CONTROL_DELIVERY_QUEUE``
+        :type queue_size: int
+
+        """
+        if policy not in (CONTROL_DELIVERY_LOSSLESS, CONTROL_DELIVERY_LATEST,
+                          CONTROL_DELIVERY_QUEUE):
+            raise ValueError("Unknown control delivery policy: %s" % str(policy))
+        # the condition's lock is reentrant, _stop_control_delivery takes it
+        # too
+        self._control_cond.acquire()
+        try:
+            self._control_delivery = policy
+            if queue_size is not None:
+                self._control_queue_size = max(1, queue_size)
+            if policy == CONTROL_DELIVERY_LOSSLESS:
+                self._stop_control_delivery()
+            elif not self._control_thread:
+                self._control_thread = Thread(target=self._control_delivery_loop,
+                                              name="ControlDelivery")
+                self._control_thread.daemon = True
+                self._control_thread.start()
+        finally:
+            self._control_cond.release()
+
+
     def send_parallel(self, data, reset=True):
         """Sends the data to the parallel port.
 
         The data is sent to the parallel port. After a short amount of
-        time the parallel port is reset automatically.
+        time the parallel port is reset automatically. The actual times are
+        recorded by the trigger dispatcher, see :mod:`lib.trigger`.
 
         :param data: Data to be sent to the parallel port
         :type data: int
 
         """
-        self.logger.info("Trigger: %s :%s" % (str(datetime.datetime.now()), str(data)))
-        if reset == True:
-            # A new trigger arrived before we could reset the old one
-            self._triggerResetTimer.cancel()
-        if self._pport:
-            if sys.platform == 'win32':
-                self._pport.Out32(self._port_num, data)
-            else:
-                self._pport.setData(data)
-            if reset:
-                self._triggerResetTimer = threading.Timer(self._triggerResetTime, self.send_parallel, (0x0, False))
-                self._triggerResetTimer.start()
+        self.logger.debug("Trigger: %s", data)
+        if self._timeline:
+            self._timeline.event(timeline.TRIGGER, data)
+        port = self._triggerPort or self._nullPort
+        trigger.get_dispatcher().send(port, data, reset, self._triggerResetTime)
 
 
     def send_udp(self, data):
@@ -355,6 +558,8 @@ class Feedback(object):
             the marker.
 
         """
+        if self._udp_markers_socket is None:
+            self._udp_markers_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._udp_markers_socket.sendto(data + '\n',
                                         (self.udp_markers_host, self.udp_markers_port))
 
@@ -369,11 +574,68 @@ class Feedback(object):
 
         """
         if not self._has_lsl:
-            logger.error("Lab Streaming Layer is not available, no markers have been sent!")
+            self.logger.error("Lab Streaming Layer is not available, no markers have been sent!")
             return
         self._lsl_outlet.push_sample([data])
 
 
+    def send_marker(self, data):
+        """Sends the marker to all transports in :attr:`marker_transports`.
+
+        The marker is timestamped and queued, a background thread delivers
+        it to the parallel or serial port (integers only), via UDP and via
+        LSL with the timestamp. Unlike :func:`send_parallel`, :func:`send_udp` and
+        :func:`send_lsl` this method never blocks on a port or socket.
+
+        The transports are set up with the first marker, changes of
+        :attr:`udp_markers_host`, :attr:`udp_markers_port` and
+        :attr:`marker_transports` take effect with the next ``play``.
+
+        :param data: The marker
+        :type data: int or str
+        :returns: The :func:`lib.stats.monotonic` time of the marker
+
+        """
+        if self._timeline:
+            self._timeline.event(timeline.MARKER,
+                                 data if isinstance(data, (int, long)) else -1)
+        if self._marker_sink is None:
+            self._marker_sink = markers.MarkerSink(self._make_marker_transports())
+        return self._marker_sink.put(data)
+
+
+    def marker_stats(self):
+        """Return the number of sent and dropped markers and their latency
+        per transport, see :meth:`lib.markers.MarkerSink.stats`."""
+        if self._marker_sink is None:
+            return dict()
+        return self._marker_sink.stats()
+
+
+    def _make_marker_transports(self):
+        transports = []
+        if 'parallel' in self.marker_transports and self._triggerPort:
+            transports.append(markers.TriggerTransport(self._triggerPort,
+                                                       self._triggerResetTime))
+        if 'serial' in self.marker_transports and self._serialTriggerPort:
+            transports.append(markers.TriggerTransport(self._serialTriggerPort,
+                                                       self._triggerResetTime))
+        if 'udp' in self.marker_transports:
+            transports.append(markers.UdpTransport(self.udp_markers_host,
+                                                   self.udp_markers_port))
+        if 'lsl' in self.marker_transports and self._has_lsl:
+            transports.append(markers.LslTransport(self._lsl_outlet,
+                                                   self._lsl_local_clock))
+        return transports
+
+
+    def _close_marker_sink(self):
+        """Deliver the pending markers and close the transports."""
+        if self._marker_sink is not None:
+            self._marker_sink.close()
+            self._marker_sink = None
+
+
     #def send_tcp(self, data):
     #    """Sends marker via TCP/IP.
     #
@@ -402,6 +664,10 @@ class Feedback(object):
                 self.logger.warning("Unable to pickle %s" % key)
                 continue
             d[key] = val
+        d["control_events_received"] = self._control_events_received
+        d["control_events_dropped"] = self._control_events_dropped
+        d["control_events_coalesced"] = self._control_events_coalesced
+        d["marker_stats"] = self.marker_stats()
         self.logger.debug("Returning variables.")
         return d
 
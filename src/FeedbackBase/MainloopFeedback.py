@@ -16,7 +16,15 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+from threading import Condition
+
 from Feedback import Feedback
+from lib import timeline
+from lib.stats import monotonic, LatencyHistogram
+
+
+# Default maximum time between two ticks while paused in seconds
+PAUSE_TICK_INTERVAL = 0.02
 
 
 class MainloopFeedback(Feedback):
@@ -55,12 +63,32 @@ class MainloopFeedback(Feedback):
     Additionally it calls either :func:`play_tick` or :func:`pause_tick`
     repeatedly afterwards, depending if the Feedback is paused or not.
 
+    If the Feedback Controller delivers control signals through shared
+    memory, the latest one is read before each :func:`tick` and passed to
+    :func:`on_control_event` from within the mainloop.
+
+    While paused, the mainloop sleeps up to :attr:`_pause_tick_interval`
+    seconds between two ticks and wakes up as soon as the Feedback is
+    resumed, stopped or quit. The time until the mainloop notices such a
+    transition is recorded and available as ``transition_latency`` in the
+    Feedback's variables.
+
     """
 
+    _polls_control_ring = True
+    # Records the duration of the ticks, see lib.benchmark.feedback
+    _tick_recorder = None
+    # Maximum time between two ticks while paused, None to tick continuously
+    _pause_tick_interval = PAUSE_TICK_INTERVAL
+
     def on_init(self):
+        self._stateCondition = Condition()
         self._running = False
         self._paused = False
         self._inMainloop = False
+        # time of the last transition the mainloop did not notice yet
+        self._transitionTime = None
+        self._transitionLatency = LatencyHistogram()
         self.init()
 
     def on_play(self):
@@ -69,15 +97,33 @@ class MainloopFeedback(Feedback):
         self.post_mainloop()
 
     def on_pause(self):
-        self._paused = not self._paused
+        self._set_state(paused=not self._paused)
 
     def on_stop(self):
-        self._running = False
+        self._set_state(running=False)
 
     def on_quit(self):
-        self._running = False
-        while self._inMainloop:
-            pass
+        self._set_state(running=False)
+        self._stateCondition.acquire()
+        try:
+            while self._inMainloop:
+                self._stateCondition.wait()
+        finally:
+            self._stateCondition.release()
+
+    def _set_state(self, running=None, paused=None):
+        """Change the state and wake up the mainloop."""
+        self._stateCondition.acquire()
+        try:
+            if running is not None:
+                self._running = running
+            if paused is not None:
+                self._paused = paused
+            if self._inMainloop and self._transitionTime is None:
+                self._transitionTime = monotonic()
+            self._stateCondition.notifyAll()
+        finally:
+            self._stateCondition.release()
 
     def _mainloop(self):
         """
@@ -86,15 +132,94 @@ class MainloopFeedback(Feedback):
         Additionally it calls either :func:`pause_tick` or :func:`play_tick`,
         depending if the Feedback is paused or not.
         """
-        self._running = True
-        self._inMainloop = True
+        self._stateCondition.acquire()
+        try:
+            self._running = True
+            self._inMainloop = True
+            self._transitionTime = None
+        finally:
+            self._stateCondition.release()
+        recorder = self._tick_recorder
         while self._running:
+            if self._transitionTime is not None:
+                self._stateCondition.acquire()
+                try:
+                    self._transition_noticed()
+                finally:
+                    self._stateCondition.release()
+            if recorder:
+                recorder.begin()
+            self._poll_control_ring()
             self.tick()
             if self._paused:
                 self.pause_tick()
             else:
                 self.play_tick()
-        self._inMainloop = False
+            if recorder:
+                recorder.end()
+            if self._paused and self._pause_tick_interval is not None:
+                self._wait_while_paused()
+        self._stateCondition.acquire()
+        try:
+            if self._transitionTime is not None:
+                self._transition_noticed()
+            self._inMainloop = False
+            self._stateCondition.notifyAll()
+        finally:
+            self._stateCondition.release()
+
+    def _wait_while_paused(self):
+        """Sleep until the next pause tick is due or the state changes."""
+        self._stateCondition.acquire()
+        try:
+            if self._paused and self._running and self._transitionTime is None:
+                self._stateCondition.wait(self._pause_tick_interval)
+        finally:
+            self._stateCondition.release()
+
+    def _transition_noticed(self):
+        """Record the latency of the last transition, call with the state
+        condition acquired."""
+        t = self._transitionTime
+        self._transitionTime = None
+        if t is not None:
+            self._transitionLatency.add(monotonic() - t)
+
+    def _start_timeline(self):
+        """Start recording a presentation timeline, see :mod:`lib.timeline`.
+
+        Triggers sent with :func:`send_parallel` and :func:`send_marker` are
+        recorded automatically, derived classes record the flips.
+
+        :returns: The new timeline
+
+        """
+        self._timeline = timeline.Timeline()
+        return self._timeline
+
+    def _save_timeline(self, filename):
+        """Stop recording the timeline and save it.
+
+        :param filename: File to save the timeline to
+        :type filename: str
+
+        """
+        tl = self._timeline
+        if tl is None:
+            return
+        self._timeline = None
+        self.logger.info("Presentation timeline: %s" % tl)
+        try:
+            tl.save(filename)
+        except (IOError, OSError), e:
+            self.logger.error("Unable to save the timeline to %s: %s" % (filename, str(e)))
+
+    def _get_variables(self):
+        d = Feedback._get_variables(self)
+        latency = getattr(self, "_transitionLatency", None)
+        if latency is not None:
+            d["transition_latency"] = latency.summary()
+        return d
 
     def init(self):
         """Called at the beginning of the Feedback's lifecycle.
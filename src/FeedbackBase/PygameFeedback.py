@@ -18,10 +18,309 @@
 """This module contains the PygameFeedback baseclass."""
 
 import os
+from collections import OrderedDict
 
 import pygame
 
 from MainloopFeedback import MainloopFeedback
+from lib import timeline
+
+
+# default maximum number of cached fonts and rendered texts
+FONT_CACHE_SIZE = 32
+TEXT_CACHE_SIZE = 512
+
+
+class TextCache(object):
+    """Cache for pygame fonts and rendered texts.
+
+    Loading a font and rendering a text are expensive, Feedbacks which print
+    the same texts every frame should get them from this cache. Fonts are
+    cached per face and size, rendered texts per text, size, color,
+    antialiasing, background and face. The least recently used entries are
+    evicted when the cache is full.
+
+    The surfaces returned by :meth:`render` are shared, blit them but do not
+    draw on them.
+
+    All Feedbacks use the module's :data:`text_cache`::
+
+        surface = text_cache.render("Hello", 30, (255, 255, 255))
+        screen.blit(surface, surface.get_rect(center=center))
+
+    """
+
+    def __init__(self, maxfonts=FONT_CACHE_SIZE, maxtexts=TEXT_CACHE_SIZE):
+        self.maxfonts = maxfonts
+        self.maxtexts = maxtexts
+        self.clear()
+
+    def clear(self):
+        """Remove all fonts and texts from the cache and reset the counters.
+
+        Fonts must not be used after pygame quit, so this method is called
+        when pygame quits.
+        """
+        self.fonts = OrderedDict()
+        self.texts = OrderedDict()
+        self.fonthits = self.fontmisses = 0
+        self.hits = self.misses = 0
+        self._quit_registered = False
+
+    def font(self, size, face=None):
+        """Return the font.
+
+        :param size: Font size
+        :type size: int
+        :param face: Font file name or None for pygame's default font
+        :type face: str
+
+        """
+        key = face, int(size)
+        font = self.fonts.pop(key, None)
+        if font is None:
+            self.fontmisses += 1
+            if not self._quit_registered:
+                pygame.register_quit(self.clear)
+                self._quit_registered = True
+            font = pygame.font.Font(face, int(size))
+            if len(self.fonts) >= self.maxfonts:
+                self.fonts.popitem(last=False)
+        else:
+            self.fonthits += 1
+        self.fonts[key] = font
+        return font
+
+    def render(self, text, size, color, antialias=True, background=None, face=None):
+        """Return the rendered text.
+
+        :param text: Text
+        :type text: str
+        :param size: Font size
+        :type size: int
+        :param color: RGB(A) color of the text
+        :param antialias: Render the text antialiased
+        :type antialias: bool
+        :param background: RGB color of the background or None for a
+            transparent background
+        :param face: Font file name or None for pygame's default font
+        :type face: str
+        :returns: pygame.Surface
+
+        """
+        key = (text, int(size), tuple(color), bool(antialias),
+               tuple(background) if background is not None else None, face)
+        surface = self.texts.pop(key, None)
+        if surface is None:
+            self.misses += 1
+            font = self.font(size, face)
+            if background is None:
+                surface = font.render(text, antialias, color)
+            else:
+                surface = font.render(text, antialias, color, background)
+            if len(self.texts) >= self.maxtexts:
+                self.texts.popitem(last=False)
+        else:
+            self.hits += 1
+        self.texts[key] = surface
+        return surface
+
+
+text_cache = TextCache()
+"""Text cache shared by all Feedbacks of the process."""
+
+
+class SceneObject(object):
+    """A surface at a position in a :class:`Scene`."""
+
+    def __init__(self, name, surface, rect, layer, order, visible=True):
+        self.name = name
+        self.surface = surface
+        self.rect = rect
+        self.layer = layer
+        self.order = order
+        self.visible = visible
+
+
+class Scene(object):
+    """Retained-mode scene which redraws only the changed parts of the screen.
+
+    Instead of blitting the background and every surface each frame, a
+    Feedback adds its surfaces once and only changes their surface, position
+    or visibility afterwards. :meth:`update` redraws the regions which
+    changed since the last update and updates only those regions of the
+    display.
+
+    Objects are drawn in the order of their layer, objects with the same
+    layer in the order they were added::
+
+        scene = Scene(screen, background)
+        scene.add("ball", ballSurface, ballRect, layer=1)
+        ...
+        scene.set("ball", rect=ballRect.move(dx, dy))
+        scene.update()
+
+    If something else draws on the screen, call :meth:`invalidate` so the
+    next update redraws the whole screen.
+
+    """
+
+    def __init__(self, screen, background=None, backgroundRect=None, backgroundColor=(0, 0, 0)):
+        """Initialize an empty scene.
+
+        :param screen: Surface to draw on, usually the display surface
+        :type screen: pygame.Surface
+        :param background: Background surface or None to fill the screen with
+            backgroundColor
+        :type background: pygame.Surface
+        :param backgroundRect: Position of the background, defaults to the
+            top left corner
+        :param backgroundColor: RGB color for the parts of the screen not
+            covered by the background
+
+        """
+        self.screen = screen
+        self.background = background
+        if background is not None and backgroundRect is None:
+            backgroundRect = background.get_rect()
+        self.backgroundRect = backgroundRect
+        self.backgroundColor = backgroundColor
+        self.objects = {}
+        self.order = []
+        self.counter = 0
+        self.dirty = []
+        self.invalid = True
+
+    def add(self, name, surface, rect, layer=0, visible=True):
+        """Add a surface to the scene.
+
+        :param name: Unique name of the object
+        :type name: str
+        :param surface: Surface
+        :type surface: pygame.Surface
+        :param rect: Rectangle or top left position of the surface
+        :param layer: Objects in higher layers are drawn on top
+        :type layer: int
+        :param visible: Draw the object
+        :type visible: bool
+
+        """
+        if name in self.objects:
+            self.remove(name)
+        obj = SceneObject(name, surface, self._rect(surface, rect), layer, self.counter, visible)
+        self.counter += 1
+        self.objects[name] = obj
+        self.order.append(obj)
+        self.order.sort(key=lambda o: (o.layer, o.order))
+        if visible:
+            self.dirty.append(obj.rect)
+        return obj
+
+    def set(self, name, surface=None, rect=None, visible=None):
+        """Change the surface, position or visibility of an object.
+
+        :param name: Name of the object
+        :type name: str
+        :param surface: New surface or None to keep the current one
+        :param rect: New rectangle or top left position or None to keep the
+            current one
+        :param visible: New visibility or None to keep the current one
+
+        """
+        obj = self.objects[name]
+        if surface is None:
+            surface = obj.surface
+        if rect is None:
+            rect = obj.rect
+        rect = self._rect(surface, rect)
+        if visible is None:
+            visible = obj.visible
+        if surface is obj.surface and rect == obj.rect and visible == obj.visible:
+            return
+        if obj.visible:
+            self.dirty.append(obj.rect)
+        if visible:
+            self.dirty.append(rect)
+        obj.surface, obj.rect, obj.visible = surface, rect, visible
+
+    def remove(self, name):
+        """Remove an object from the scene.
+
+        :param name: Name of the object
+        :type name: str
+
+        """
+        obj = self.objects.pop(name)
+        self.order.remove(obj)
+        if obj.visible:
+            self.dirty.append(obj.rect)
+
+    def invalidate(self):
+        """Redraw the whole screen on the next update."""
+        self.invalid = True
+
+    def draw(self):
+        """Redraw the changed regions on the screen without updating the
+        display.
+
+        :returns: list of the redrawn rectangles
+
+        """
+        if self.invalid:
+            rects = [self.screen.get_rect()]
+        else:
+            rects = _merge_rects(self.dirty)
+        self.dirty = []
+        self.invalid = False
+        screen = self.screen
+        for rect in rects:
+            screen.set_clip(rect)
+            if self.background is None or not self.backgroundRect.contains(rect):
+                screen.fill(self.backgroundColor, rect)
+            if self.background is not None:
+                screen.blit(self.background, self.backgroundRect)
+            for obj in self.order:
+                if obj.visible and obj.rect.colliderect(rect):
+                    screen.blit(obj.surface, obj.rect)
+        screen.set_clip(None)
+        return rects
+
+    def redraw(self):
+        """Draw the whole scene on the screen without updating the display.
+
+        Use this method before drawing something on top of the scene, the
+        next update redraws the whole screen.
+        """
+        self.invalidate()
+        self.draw()
+        self.invalidate()
+
+    def update(self):
+        """Redraw the changed regions and update them on the display."""
+        rects = self.draw()
+        if rects:
+            pygame.display.update(rects)
+
+    def _rect(self, surface, rect):
+        if len(rect) == 2:
+            return pygame.Rect(rect, surface.get_size())
+        return pygame.Rect(rect)
+
+
+def _merge_rects(rects):
+    """Merge overlapping rectangles, so no region is drawn twice."""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
 
 
 class PygameFeedback(MainloopFeedback):
@@ -66,6 +365,9 @@ class PygameFeedback(MainloopFeedback):
         self.lastkey = None
         """What was the last key?"""
 
+        self.timelineFile = None
+        """Record every display update and save the presentation timeline to this file, see :mod:`lib.timeline`."""
+
 
     def pre_mainloop(self):
         """Initialize pygame and graphics."""
@@ -109,11 +411,17 @@ class PygameFeedback(MainloopFeedback):
                                                    self.screenSize[1]),
                                                    pygame.RESIZABLE)
         self.clock = pygame.time.Clock()
+        if self.timelineFile:
+            timeline.record_pygame_flips(self._start_timeline())
 
 
     def quit_pygame(self):
         """Quit Pygame."""
+        if self._timeline:
+            timeline.stop_recording_pygame_flips()
+            self._save_timeline(self.timelineFile)
         pygame.quit()
+        text_cache.clear()
 
 
     def init_graphics(self):
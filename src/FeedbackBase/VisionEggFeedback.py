@@ -18,6 +18,7 @@ along with this program; if not, see <http://www.gnu.org/licenses/>.
 import logging, time
 
 import VisionEgg
+from VisionEgg.FlowControl import FunctionController
 import pygame
 
 from FeedbackBase.MainloopFeedback import MainloopFeedback
@@ -40,6 +41,9 @@ class VisionEggFeedback(MainloopFeedback):
     The view methods L{add_viewport}, L{add_stimuli} and L{set_stimuli}
     are forwarded for convenience.
     """
+    # Our mainloop is run(), which does not poll the control signal ring
+    _polls_control_ring = False
+
     def __init__(self, view_type=VisionEggView, *args, **kwargs):
         """ @param view_type: If a custom view class should be used, its
         type can be specified here. See _create_view for more.
@@ -76,6 +80,10 @@ class VisionEggFeedback(MainloopFeedback):
         of the display device
         framecount_stimulus_transition: Whether to use vsync-determined
         frame counts to assess the stimulus display time
+        stimulus_spin_margin: How long before a stimulus onset to stop
+        sleeping and start busy-waiting, in seconds
+        timeline_file: If set, record the frames, stimulus onsets and
+        triggers and save the presentation timeline to this file
         """
         self.wait_style_fixed = True
         self.fullscreen = False
@@ -91,6 +99,8 @@ class VisionEggFeedback(MainloopFeedback):
         self.print_frames = False
         self.adapt_times_to_refresh_rate = True
         self.framecount_stimulus_transition = False
+        self.stimulus_spin_margin = .002
+        self.timeline_file = None
         self._view_parameters = ['fullscreen', 'geometry', 'bg_color',
                                  'font_color_name', 'font_size',
                                  'fixation_cross_time',
@@ -133,7 +143,9 @@ class VisionEggFeedback(MainloopFeedback):
         self._stimseq_fact = StimulusSequenceFactory(self._view, self._flag,
                                                      self.print_frames,
                                             self.adapt_times_to_refresh_rate,
-                                            self.framecount_stimulus_transition)
+                                            self.framecount_stimulus_transition,
+                                            self.stimulus_spin_margin,
+                                            self._timeline)
 
     def _trigger(self, trigger, wait=False):
         self.send_parallel(trigger)
@@ -179,11 +191,26 @@ class VisionEggFeedback(MainloopFeedback):
     def pre_mainloop(self):
         """ Reset the iterator semaphore and initialize the screen. """
         self._flag.reset()
+        if self.timeline_file:
+            self._start_timeline()
         try:
             self._view.acquire()
             self._update_parameters()
         except pygame.error, e:
             self.logger.error(e)
+        if self._tick_recorder:
+            # Our mainloop has no ticks, record the frames instead
+            recorder = self._tick_recorder
+            self._view.presentation.add_controller(None, None,
+                FunctionController(during_go_func=lambda t: recorder.frame()))
+        if self._timeline:
+            # The controllers are called before the frame is drawn and
+            # swapped, i.e. right after the swap of the previous frame. Every
+            # flip is therefore recorded one frame late, which shifts the
+            # frame numbers by one but leaves the intervals intact.
+            tl = self._timeline
+            self._view.presentation.add_controller(None, None,
+                FunctionController(during_go_func=lambda t: tl.flip()))
 
     def on_interaction_event(self, data):
         if not self._running:
@@ -226,6 +253,7 @@ class VisionEggFeedback(MainloopFeedback):
     def post_mainloop(self):
         self.quit()
         self._view.close()
+        self._save_timeline(self.timeline_file)
 
     def add_viewport(self, viewport):
         """ Add an additional custom viewport object to the list of
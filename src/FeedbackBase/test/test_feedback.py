@@ -17,8 +17,24 @@
 
 
 import unittest
+import time
+import socket
+from threading import Event, Thread, enumerate as threads
 
+from FeedbackBase import Feedback as feedback
 from FeedbackBase.Feedback import Feedback
+from lib import bcixml
+from lib import timeline
+from lib import trigger
+
+
+class RecordingFeedback(Feedback):
+
+    def on_init(self):
+        self.events = []
+
+    def on_control_event(self, data):
+        self.events.append(data)
 
 
 class FeedbackTestCase(unittest.TestCase):
@@ -48,6 +64,146 @@ class FeedbackTestCase(unittest.TestCase):
         except:
             self.fail()
 
+    def testControlBatchLatest(self):
+        """Should pass only the latest sample of a batch by default."""
+        fb = RecordingFeedback()
+        fb.on_init()
+        fb._on_control_event({bcixml.CL_BATCH : [(0.0, 1), (0.002, 2)]})
+        self.assertEqual(fb.events, [{bcixml.CL_OUTPUT : 2}])
+        self.assertEqual(fb._data, {bcixml.CL_OUTPUT : 2})
+
+    def testControlBatchAll(self):
+        """Should pass every sample of a batch to on_control_batch."""
+        fb = RecordingFeedback()
+        fb.on_init()
+        fb.on_control_batch = fb.events.append
+        samples = [(0.0, 1), (0.002, 2)]
+        fb._on_control_event({bcixml.CL_BATCH : samples})
+        self.assertEqual(fb.events, [samples])
+
+    def testControlDeliveryLatest(self):
+        """Should coalesce pending control events in latest-wins mode."""
+        fb = self.__deliver(feedback.CONTROL_DELIVERY_LATEST, None, 2)
+        self.assertEqual(fb.events, [{"v" : 0}, {"v" : 3}])
+        variables = fb._get_variables()
+        self.assertEqual(variables["control_events_received"], 4)
+        self.assertEqual(variables["control_events_coalesced"], 2)
+        self.assertEqual(variables["control_events_dropped"], 0)
+
+    def testControlDeliveryQueue(self):
+        """Should drop the oldest pending control events in queue mode."""
+        fb = self.__deliver(feedback.CONTROL_DELIVERY_QUEUE, 2, 3)
+        self.assertEqual(fb.events, [{"v" : 0}, {"v" : 2}, {"v" : 3}])
+        variables = fb._get_variables()
+        self.assertEqual(variables["control_events_dropped"], 1)
+        self.assertEqual(variables["control_events_coalesced"], 0)
+
+    def testControlDeliveryOneThread(self):
+        """Should never run more than one delivery thread."""
+        fb = RecordingFeedback()
+        fb.on_init()
+        def toggle():
+            for i in range(50):
+                fb.set_control_delivery(feedback.CONTROL_DELIVERY_LATEST)
+                fb.set_control_delivery(feedback.CONTROL_DELIVERY_LOSSLESS)
+                fb.set_control_delivery(feedback.CONTROL_DELIVERY_LATEST)
+        togglers = [Thread(target=toggle) for i in range(4)]
+        for t in togglers:
+            t.start()
+        for t in togglers:
+            t.join()
+        for i in range(100):
+            if len([t for t in threads() if t.name == "ControlDelivery"]) <= 1:
+                break
+            time.sleep(0.01)
+        self.assertEqual([t for t in threads() if t.name == "ControlDelivery"],
+                         [fb._control_thread])
+        fb._queue_control_event({"v" : 0})
+        for i in range(100):
+            if fb.events:
+                break
+            time.sleep(0.01)
+        self.assertEqual(fb.events, [{"v" : 0}])
+        fb._on_quit()
+
+    def testControlDeliveryUnknown(self):
+        """Should reject unknown delivery policies."""
+        fb = Feedback()
+        self.assertRaises(ValueError, fb.set_control_delivery, "foo")
+
+    def testSendMarker(self):
+        """Should deliver markers via UDP and count them."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1.0)
+        fb = Feedback()
+        fb.marker_transports = ['udp']
+        fb.udp_markers_port = receiver.getsockname()[1]
+        fb._on_play()
+        fb.send_marker("S 1")
+        self.assertEqual(receiver.recv(4096), "S 1\n")
+        fb._marker_sink.flush()
+        self.assertEqual(fb.marker_stats()["udp"]["sent"], 1)
+        fb._on_quit()
+        receiver.close()
+
+    def testSerialMarker(self):
+        """Should write integer markers to the serial trigger port."""
+        port = trigger.LoopbackPort()
+        port.name = "serial"
+        fb = Feedback()
+        fb.marker_transports = ['serial']
+        fb._serialTriggerPort = port
+        fb._on_play()
+        fb.send_marker(5)
+        fb.send_marker("text")
+        fb._marker_sink.flush()
+        self.assertEqual(port.values[0], 5)
+        self.assertEqual(fb.marker_stats()["serial"]["sent"], 1)
+        fb._on_quit()
+
+    def testSendParallelWithoutPort(self):
+        """Should record the trigger times without a parallel port."""
+        fb = Feedback()
+        fb.send_parallel(7, reset=False)
+        records = trigger.get_dispatcher().records
+        self.assertEqual(records[-1][1:], ("null", 7))
+        fb._on_quit()
+
+    def testTimelineTriggers(self):
+        """Should record triggers and markers in the timeline."""
+        fb = Feedback()
+        fb._timeline = timeline.Timeline(4, 4)
+        fb.marker_transports = []
+        fb.send_parallel(5)
+        fb.send_marker("S 1")
+        fb._on_quit()
+        self.assertEqual([(k, v) for t, k, v, f, d in fb._timeline.get_events()],
+                         [(timeline.TRIGGER, 5), (timeline.MARKER, -1)])
+
+    def __deliver(self, policy, queue_size, expected):
+        """Send 4 control events while the first one blocks the delivery."""
+        class BlockingFeedback(RecordingFeedback):
+            def on_control_event(self, data):
+                self.busy.set()
+                self.release.wait()
+                RecordingFeedback.on_control_event(self, data)
+        fb = BlockingFeedback()
+        fb.on_init()
+        fb.busy, fb.release = Event(), Event()
+        fb.set_control_delivery(policy, queue_size)
+        fb._queue_control_event({"v" : 0})
+        fb.busy.wait(1)
+        for i in range(1, 4):
+            fb._queue_control_event({"v" : i})
+        fb.release.set()
+        for i in range(100):
+            if len(fb.events) >= expected:
+                break
+            time.sleep(0.01)
+        fb._on_quit()
+        return fb
+
 def suite():
     testSuite = unittest.makeSuite(FeedbacksTestCase)
     return testSuite
@@ -16,6 +16,7 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
+import time
 import unittest
 from threading import Thread
 
@@ -65,6 +66,31 @@ class MainloopFeedbackTestCase(unittest.TestCase):
         self.stop()
         self.assertTrue(self.quit())
 
+    def testPausedSleeps(self):
+        """Paused Mainloop Feedback should tick only every pause_tick_interval."""
+        ticks = []
+        self.fb.tick = lambda: ticks.append(1)
+        self.play()
+        self.pause()
+        time.sleep(0.02)
+        del ticks[:]
+        time.sleep(0.2)
+        self.assertTrue(len(ticks) <= 0.2 / self.fb._pause_tick_interval + 2)
+        self.assertTrue(self.quit(1))
+
+    def testTransitionLatency(self):
+        """Mainloop Feedback should record the latency of transitions."""
+        self.play()
+        time.sleep(0.01)
+        self.pause()
+        time.sleep(0.01)
+        self.pause()
+        time.sleep(0.01)
+        self.assertTrue(self.quit(1))
+        latency = self.fb._get_variables()["transition_latency"]
+        self.assertEqual(latency["count"], 3)
+        self.assertTrue(latency["max"] < 0.1)
+
 
     def init(self, timeout=None):
         return self.call_async(self.fb.on_init, timeout)
@@ -0,0 +1,139 @@
+# test_pygamefeedback.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+import pygame
+
+from FeedbackBase.PygameFeedback import TextCache, Scene
+
+
+class TextCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        pygame.font.init()
+        self.cache = TextCache(maxfonts=2, maxtexts=2)
+
+    def tearDown(self):
+        pygame.font.quit()
+
+    def testRenderCached(self):
+        """Should render a text only once."""
+        s1 = self.cache.render("foo", 20, (255, 255, 255))
+        s2 = self.cache.render("foo", 20, [255, 255, 255])
+        self.assertTrue(s1 is s2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual((self.cache.fonthits, self.cache.fontmisses), (0, 1))
+
+    def testDistinctKeys(self):
+        """Should distinguish size, color, antialiasing and background."""
+        s = self.cache.render("foo", 20, (255, 255, 255))
+        self.assertFalse(s is self.cache.render("foo", 21, (255, 255, 255)))
+        self.assertFalse(s is self.cache.render("foo", 20, (255, 0, 0)))
+        self.assertFalse(s is self.cache.render("foo", 20, (255, 255, 255), False))
+        self.assertFalse(s is self.cache.render("foo", 20, (255, 255, 255), True, (0, 0, 0)))
+
+    def testEviction(self):
+        """Should evict the least recently used text."""
+        a = self.cache.render("a", 20, (255, 255, 255))
+        self.cache.render("b", 20, (255, 255, 255))
+        self.cache.render("a", 20, (255, 255, 255))
+        self.cache.render("c", 20, (255, 255, 255))
+        self.assertEqual(len(self.cache.texts), 2)
+        self.assertTrue(a is self.cache.render("a", 20, (255, 255, 255)))
+        self.cache.render("b", 20, (255, 255, 255))
+        self.assertEqual(self.cache.misses, 4)
+
+    def testClearedOnQuit(self):
+        """Should forget the fonts when pygame quits."""
+        self.cache.render("foo", 20, (255, 255, 255))
+        pygame.quit()
+        self.assertEqual(len(self.cache.fonts), 0)
+        self.assertEqual(len(self.cache.texts), 0)
+
+
+class SceneTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.screen = pygame.Surface((100, 100))
+        background = pygame.Surface((100, 100))
+        background.fill((0, 0, 255))
+        self.scene = Scene(self.screen, background)
+        self.box = pygame.Surface((10, 10))
+        self.box.fill((255, 0, 0))
+        self.scene.add("box", self.box, (0, 0))
+
+    def testFirstDrawIsFull(self):
+        """Should redraw the whole screen the first time."""
+        self.assertEqual(self.scene.draw(), [pygame.Rect(0, 0, 100, 100)])
+        self.assertEqual(self.scene.draw(), [])
+
+    def testMove(self):
+        """Should redraw the old and the new position of a moved object."""
+        self.scene.draw()
+        self.scene.set("box", rect=(50, 50))
+        rects = self.scene.draw()
+        self.assertEqual(sorted(rects), [pygame.Rect(0, 0, 10, 10), pygame.Rect(50, 50, 10, 10)])
+        self.assertEqual(self.screen.get_at((5, 5))[:3], (0, 0, 255))
+        self.assertEqual(self.screen.get_at((55, 55))[:3], (255, 0, 0))
+
+    def testMergeOverlapping(self):
+        """Should merge overlapping regions."""
+        self.scene.draw()
+        self.scene.set("box", rect=(5, 5))
+        self.assertEqual(self.scene.draw(), [pygame.Rect(0, 0, 15, 15)])
+
+    def testUnchanged(self):
+        """Should not redraw objects which did not change."""
+        self.scene.draw()
+        self.scene.set("box", self.box, (0, 0), True)
+        self.assertEqual(self.scene.draw(), [])
+
+    def testLayers(self):
+        """Should draw higher layers on top."""
+        top = pygame.Surface((10, 10))
+        top.fill((0, 255, 0))
+        self.scene.add("top", top, (0, 0), layer=1)
+        self.scene.set("box", visible=False)
+        self.scene.set("box", visible=True)
+        self.scene.draw()
+        self.assertEqual(self.screen.get_at((5, 5))[:3], (0, 255, 0))
+
+    def testHideAndRemove(self):
+        """Should restore the background of hidden or removed objects."""
+        self.scene.add("other", self.box, (50, 50))
+        self.scene.draw()
+        self.scene.set("box", visible=False)
+        self.scene.remove("other")
+        self.scene.draw()
+        self.assertEqual(self.screen.get_at((5, 5))[:3], (0, 0, 255))
+        self.assertEqual(self.screen.get_at((55, 55))[:3], (0, 0, 255))
+
+
+def suite():
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(unittest.makeSuite(TextCacheTestCase))
+    testSuite.addTest(unittest.makeSuite(SceneTestCase))
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -28,6 +28,7 @@ from multiprocessing import Process
 
 import GUI
 from lib.feedbackcontroller import FeedbackController
+from lib.pluginindex import PluginIndex, DEFAULT_INDEX_FILE
 
 
 def main():
@@ -70,8 +71,17 @@ the Free Software Foundation; either version 2 of the License, or
     parser.add_option("--nogui", action="store_true", default=False,
                       help="Start without GUI.")
     parser.add_option("--protocol", dest='protocol', type='choice',
-                      help="Set the protocol to which Pyff listens to. Options are: json, bcixml and tobixml.",
-                        choices=['bcixml', 'json', 'tobixml'], default='bcixml')
+                      help="Set the protocol to which Pyff listens to. Options are: json, bcixml, tobixml and binary.",
+                        choices=['bcixml', 'json', 'tobixml', 'binary'], default='bcixml')
+    parser.add_option("--shm-control-signals", dest='controlring',
+                      action='store_true', default=False,
+                      help="Deliver numeric control signals (cl_output) to the Feedback via shared memory instead of IPC.")
+    parser.add_option("--pool-size", dest='poolsize', type='int', default=1,
+                      help="Number of Feedback processes to start in advance, with common modules already imported. [default: 1]",
+                      metavar="N")
+    parser.add_option("--plugin-index", dest='pluginindex', default=DEFAULT_INDEX_FILE,
+                      help="File to remember the Feedbacks found between runs, or 'none' to search the Feedback paths from scratch. [default: %default]",
+                      metavar="FILE")
 
     options, args = parser.parse_args()
 
@@ -108,8 +118,11 @@ the Free Software Foundation; either version 2 of the License, or
     port = None
     if options.port != None:
         port = int(options.port, 16)
+    index = None
+    if options.pluginindex.lower() != 'none':
+        index = PluginIndex(options.pluginindex)
     try:
-        fc = FeedbackController(fbpath, port, options.protocol)
+        fc = FeedbackController(fbpath, port, options.protocol, options.controlring, options.poolsize, index)
     except:
         logging.exception("Could not start Feedback Controller, is another instance already running?")
         return
@@ -28,7 +28,7 @@ import os
 
 import pygame
 
-from FeedbackBase.PygameFeedback import PygameFeedback
+from FeedbackBase.PygameFeedback import PygameFeedback, Scene, text_cache
 
 
 class BrainPong(PygameFeedback):
@@ -342,11 +342,12 @@ class BrainPong(PygameFeedback):
         if not center:
             center = self.screen.get_rect().center
 
-        font = pygame.font.Font(None, size)
         if not superimpose:
             self.screen.blit(self.background, self.backgroundRect)
-        surface = font.render(text, 1, color)
+        surface = text_cache.render(text, size, color)
         self.screen.blit(surface, surface.get_rect(center=center))
+        # the text is not part of the scene
+        self.scene.invalidate()
         
 
     def init_graphics(self):
@@ -416,20 +417,30 @@ class BrainPong(PygameFeedback):
             if self.control == "relative":
                 self.BarX = (1.0* self.playWidth / self.oldPlayWidth) * self.BarX
                 self.barMoveRect = self.barRect.move(self.BarX,0)
+
+        # init scene, draw_all only moves the objects around
+        self.scene = Scene(self.screen, self.background, self.backgroundRect)
+        self.scene.add("wall1", self.wall, self.wallRect1)
+        self.scene.add("wall2", self.wall, self.wallRect2)
+        self.scene.add("counter", pygame.Surface((0, 0)), (0, 0), layer=1, visible=False)
+        self.scene.add("bowl", self.bowl, self.bowlMoveRect, layer=2)
+        self.scene.add("bar", self.bar, self.barMoveRect, layer=2)
                 
     def draw_all(self, draw=False):
-        # draw images on the screen
-        self.screen.blit(self.background, self.backgroundRect)
-        self.screen.blit(self.wall, self.wallRect1)
-        self.screen.blit(self.wall, self.wallRect2)
+        # update the scene, only the changed regions are redrawn
         if self.showCounter:
             s = self.hitstr + str(self.hitMiss[0]).rjust(2) + self.missstr + str(self.hitMiss[-1]).rjust(2)
             center = (self.wallW+self.playWidth*self.x_transl, self.size/20)
-            self.do_print(s, self.hitmissCounterColor, self.counterSize, center)
-        self.screen.blit(self.bowl, self.bowlMoveRect)
-        self.screen.blit(self.bar, self.barMoveRect)
+            surface = text_cache.render(s, self.counterSize, self.hitmissCounterColor)
+            self.scene.set("counter", surface, surface.get_rect(center=center), True)
+        else:
+            self.scene.set("counter", visible=False)
+        self.scene.set("bowl", rect=self.bowlMoveRect)
+        self.scene.set("bar", rect=self.barMoveRect)
         if draw:
-            pygame.display.flip()
+            self.scene.update()
+        else:
+            self.scene.redraw()
 
 
 
@@ -28,7 +28,7 @@ import math
 
 import pygame
 
-from FeedbackBase.PygameFeedback import PygameFeedback
+from FeedbackBase.PygameFeedback import PygameFeedback, text_cache
 
 
 class FeedbackCursorArrow(PygameFeedback):
@@ -474,18 +474,17 @@ class FeedbackCursorArrow(PygameFeedback):
         if not size:
             size = self.size/10
 
-        font = pygame.font.Font(None, size)
         if not superimpose:
             self.draw_init()
 
         if type(text) is list:
-            height = pygame.font.Font.get_linesize(font)
+            height = text_cache.font(size).get_linesize()
             top = -(2*len(text)-1)*height/2
             for t in range(len(text)):
-                surface = font.render(text[t], 1, color)
+                surface = text_cache.render(text[t], size, color)
                 self.screen.blit(surface, surface.get_rect(midtop=(self.screenWidth/2, self.screenHeight/2+top+t*2*height)))
         else:
-            surface = font.render(text, 1, color)
+            surface = text_cache.render(text, size, color)
             self.screen.blit(surface, surface.get_rect(center=self.screen.get_rect().center))
         pygame.display.update()
 
@@ -26,8 +26,10 @@ Serves as base class for spellers such as CakeSpeller and CenterSpeller.
 
 
 from time import time, clock
+from array import array
 from FeedbackBase.MainloopFeedback import MainloopFeedback
-from lib.P300Aux.P300Functions import random_flash_sequence
+from lib.P300Aux.FlashSequence import FlashSequenceGenerator, FlashSequencePool
+from lib.P300Aux.ScoreAccumulator import ScoreAccumulator, make_stopping_rule
 
 from VisionEgg.Core import Screen
 from VisionEgg.Core import Viewport
@@ -42,12 +44,31 @@ import numpy as NP
 import random, pygame, os, math, pygame.sndarray
 import logging
 
-from sys import platform, maxint
+from sys import platform
 
 from lib import marker
 from lib import serialport
 
 
+class TrialSchedule(object):
+    '''
+    Flash order, trigger codes and target flags of all stimuli of a trial,
+    compiled before the trial starts so presenting a stimulus only needs to
+    look them up.
+    '''
+
+    def __init__(self, elements, triggers, targets, stimulus_duration,
+                 interstimulus_duration):
+        self.elements = array('i', elements)
+        self.triggers = array('i', triggers)
+        self.targets = array('b', targets)
+        self.stimulus_duration = (stimulus_duration, 'seconds')
+        self.interstimulus_duration = (interstimulus_duration, 'seconds')
+
+    def __len__(self):
+        return len(self.elements)
+
+
 class VisualSpellerVE(MainloopFeedback):
     '''
     Visual Speller with six circles like the classical HexOSpell.
@@ -130,6 +151,9 @@ class VisualSpellerVE(MainloopFeedback):
 
 
         self.wait_after_early_stopping=3 #sec
+        self.early_stopping = None # None, 'margin', 'ttest' or 'posterior', see lib.P300Aux.ScoreAccumulator
+        self.early_stopping_threshold = 1.0
+        self.early_stopping_min_sequences = 2
         self.abort_trial=False
         self.output_per_stimulus=True
         self.use_ErrP_detection = False
@@ -185,6 +209,8 @@ class VisualSpellerVE(MainloopFeedback):
         self._current_level = 1          # Index of current level
         self._current_sequence = 0       # Index of current sequence
         self._current_stimulus = 0       # Index of current stimlus
+        self._sequences_run = self.nr_sequences # Sequences presented in the last trial
+        self._schedule = None            # Compiled stimuli of current trial
         self._current_countdown = self.nCountdown
         self.random = random.Random(clock())
         self._debug_classified = None
@@ -214,6 +240,11 @@ class VisualSpellerVE(MainloopFeedback):
         ## call subclass-specific pre_mainloop:
         self.prepare_mainloop()
 
+        ## precompute the flash sequences of the next trials:
+        self._flash_pool = None
+        if self.randomize_sequence:
+            self._update_flash_pool()
+
         ## build screen elements:
         self.__init_screen()
         if self.offline:
@@ -243,9 +274,11 @@ class VisualSpellerVE(MainloopFeedback):
         if serial:
             self.logger.debug('using serial port')
             self.send_parallel = self.serialport.send
+            self._serialTriggerPort = self.serialport.trigger_port
         else:
             self.logger.debug('using parallel port')
             self.send_parallel = self.send_parallel_bak
+            self._serialTriggerPort = None
 
 
     def post_mainloop(self):
@@ -265,6 +298,8 @@ class VisualSpellerVE(MainloopFeedback):
         pygame.time.wait(500)
         self._presentation.set(quit=True)
         self._screen.close()
+        if self._flash_pool is not None:
+            self._flash_pool.close()
 
 
     def __init_screen(self):
@@ -478,23 +513,11 @@ class VisualSpellerVE(MainloopFeedback):
                  if self.do_animation:
                       self.set_countdown_screen()
                  self.set_standard_screen()
-            # generate random sequences:
-            if self.randomize_sequence:
-                self.flash_sequence = []
-                for _ in range(self.nr_sequences):
-                    random_flash_sequence(self,
-                                      set=range(self._nr_elements),
-                                      min_dist=self.min_dist,
-                                      seq_len=self._nr_elements)
-            # or else use fixed sequence:
-            else:
-                self.flash_sequence = range(self._nr_elements)
-
+            self._schedule = self.compile_trial()
 
-        if self.randomize_sequence:
-            currentStimulus = self.flash_sequence[self._current_sequence*self._nr_elements + self._current_stimulus]
-        else:
-            currentStimulus = self.flash_sequence[self._current_stimulus]
+        i = self._current_sequence*self._nr_elements + self._current_stimulus
+        currentStimulus = self._schedule.elements[i]
+        trigger = self._schedule.triggers[i]
         # set stimulus:
         self.stimulus(currentStimulus, True)
         #self._ve_oscillator.set(on=True)
@@ -506,101 +529,123 @@ class VisualSpellerVE(MainloopFeedback):
             self._state_abort=True
             return
 
-        # check if current stimulus is target and then send trigger:
-        target_add = 0
-        if len(self._desired_letters) > 0:
-            if self._current_level==1:
-                if self._desired_letters[:1] in self.letter_set[currentStimulus]:
-                    # current stimulus is target group:
-                    target_add = self.TARGET_ADD
-            else:
-                if currentStimulus==self._idx_backdoor:
-                    # current stimulus is backdoor:
-                    if not self._desired_letters[:1] in self.letter_set[self._classified_element]:
-                        # we are in the wrong group. backdoor is target:
-                        target_add = self.TARGET_ADD
-                else:
-                    # current stimulus is no backdoor:
-                    if self._desired_letters[:1]==self.letter_set[self._classified_element][currentStimulus]:
-                        # current stimulus is target symbol:
-                        target_add = self.TARGET_ADD
-
-        self.send_parallel(self.STIMULUS[self._current_level-1][currentStimulus] + target_add)
-        self.logger.info("[TRIGGER] %d" % (self.STIMULUS[self._current_level-1][currentStimulus] + target_add))
-
-        # present stimulus:
-        self._presentation.set(go_duration=(self.stimulus_duration, 'seconds'))
+        # send trigger and present stimulus:
+        self.send_parallel(trigger)
+        self._presentation.set(go_duration=self._schedule.stimulus_duration)
         self._presentation.go()
+        self.logger.info("[TRIGGER] %d" % trigger)
 
         # reset to normal:
         self._ve_oscillator.set(on=False)
         self.stimulus(currentStimulus, False)
 
         # present interstimulus:
-        self._presentation.set(go_duration=(self.interstimulus_duration, 'seconds'))
+        self._presentation.set(go_duration=self._schedule.interstimulus_duration)
         self._presentation.go()
 
         if self.debug:
             self.on_control_event({'cl_output':(self.random.random(), currentStimulus+1)})
 
         ## TODO: check here for classification !!!!
-        if self.output_per_stimulus:
-            # increase
-            self._current_stimulus = (self._current_stimulus+1) % self._nr_elements
-            if self._current_stimulus == 0:
-                self._current_sequence = (self._current_sequence+1) % self.nr_sequences
-
-            # check for end of trial:
-            if self._current_sequence == 0 and self._current_stimulus == 0:
-
-                # send trigger:
-                if self._current_level==1:
-                    self.send_parallel(self.END_LEVEL1)
-                    self.logger.info("[TRIGGER] %d" % self.END_LEVEL1)
-                else:
-                    self.send_parallel(self.END_LEVEL2)
-                    self.logger.info("[TRIGGER] %d" % self.END_LEVEL2)
+        if self._next_stimulus():
 
-                # decide how to continue:
-                self._state_trial = False
-                self._state_classify = True
-        else:
-            # increase
-            self._current_stimulus = (self._current_stimulus+1) % self._nr_elements
-            if self._current_stimulus == 0:
-                self._current_sequence = (self._current_sequence+1) % self.nr_sequences
-                if self.check_classification(self._current_sequence+1):
-                    self._state_trial = False
-                    self._state_classify = True
-                    pygame.time.wait(self.wait_after_early_stopping*1000)
-
-            if self._current_sequence == 0 and self._current_stimulus == 0:
-
-                # send trigger:
-                if self._current_level==1:
-                    self.send_parallel(self.END_LEVEL1)
-                    self.logger.info("[TRIGGER] %d" % self.END_LEVEL1)
-                else:
-                    self.send_parallel(self.END_LEVEL2)
-                    self.logger.info("[TRIGGER] %d" % self.END_LEVEL2)
+            # send trigger:
+            if self._current_level==1:
+                self.send_parallel(self.END_LEVEL1)
+                self.logger.info("[TRIGGER] %d" % self.END_LEVEL1)
+            else:
+                self.send_parallel(self.END_LEVEL2)
+                self.logger.info("[TRIGGER] %d" % self.END_LEVEL2)
 
-                # decide how to continue:
-                self._state_trial = False
-                self._state_classify = True
+            # decide how to continue:
+            self._state_trial = False
+            self._state_classify = True
 
-    def check_classification(self,nr):
-        #print self._classifier_output
-        means = [None]*self._nr_elements
-        minimum = maxint
-        classified = None
-        for ii in range(self._nr_elements):
-            means[ii] = sum(self._classifier_output[ii]) /nr
-            if means[ii]<minimum:
-               minimum = means[ii]
-               classified = ii+1
+    def _next_stimulus(self):
+        '''
+        Advance to the next stimulus and return True if the trial is over,
+        either after all sequences or because the early stopping rule
+        allows to classify. The number of presented sequences is kept in
+        self._sequences_run.
+        '''
+        self._current_stimulus = (self._current_stimulus+1) % self._nr_elements
+        if self._current_stimulus == 0:
+            self._sequences_run = self._current_sequence + 1
+            self._current_sequence = self._sequences_run % self.nr_sequences
+            if self._current_sequence > 0 and self.check_classification(self._sequences_run):
+                # end the trial early:
+                self._current_sequence = 0
+                pygame.time.wait(self.wait_after_early_stopping*1000)
+        return self._current_sequence == 0 and self._current_stimulus == 0
+
+    def compile_trial(self):
+        '''
+        Generate the flash sequence of the trial and compute the trigger
+        codes and target flags of all stimuli.
+        '''
+        # take precomputed random sequences:
+        if self.randomize_sequence:
+            self._update_flash_pool()
+            self.flash_sequence = self._flash_pool.get().tolist()
+            elements = self.flash_sequence
+        # or else use fixed sequence:
+        else:
+            if self._flash_pool is not None:
+                self._flash_pool.close()
+                self._flash_pool = None
+            self.flash_sequence = range(self._nr_elements)
+            elements = self.flash_sequence * self.nr_sequences
+
+        targets = [self.is_target(e) for e in range(self._nr_elements)]
+        codes = [self.STIMULUS[self._current_level-1][e] + self.TARGET_ADD * targets[e]
+                 for e in range(self._nr_elements)]
+        return TrialSchedule(elements,
+                             [codes[e] for e in elements],
+                             [targets[e] for e in elements],
+                             self.stimulus_duration,
+                             self.interstimulus_duration)
+
+    def _update_flash_pool(self):
+        '''
+        Create the pool of precomputed flash sequences, or rebuild it if
+        the sequence parameters were changed since it was created.
+        '''
+        params = (self._nr_elements, self.nr_sequences, self.min_dist)
+        if self._flash_pool is not None:
+            generator = self._flash_pool.generator
+            if (generator.nr_groups, generator.nr_sequences, generator.min_dist) == params:
+                return
+            self._flash_pool.close()
+        generator = FlashSequenceGenerator(self._nr_elements,
+                                           self.nr_sequences,
+                                           min_dist=self.min_dist,
+                                           seed=self.random.randint(0, 2**31-1))
+        self._flash_pool = FlashSequencePool(generator)
+
+    def is_target(self, element):
+        '''
+        Check if the element is the target of the current level.
+        '''
+        if len(self._desired_letters) == 0:
+            return False
+        if self._current_level==1:
+            # target group:
+            return self._desired_letters[:1] in self.letter_set[element]
+        if element==self._idx_backdoor:
+            # we are in the wrong group. backdoor is target:
+            return not self._desired_letters[:1] in self.letter_set[self._classified_element]
+        # target symbol:
+        return self._desired_letters[:1]==self.letter_set[self._classified_element][element]
 
-        print "\n**** Class: %d (mean=%f)\n" % (classified,means[classified-1])
-        return classified
+    def check_classification(self,nr):
+        '''
+        Check if the early stopping rule allows to classify after nr
+        sequences.
+        '''
+        if self._stopping_rule is None or not self._stopping_rule(self._scores):
+            return False
+        self.logger.info("[EARLY_STOPPING] after %d sequences" % nr)
+        return True
 
 
 
@@ -620,34 +665,17 @@ class VisualSpellerVE(MainloopFeedback):
             self._debug_classified = None
         else:
             if self.output_per_stimulus:
-                nClassified = sum([len(self._classifier_output[i]) for i in xrange(self._nr_elements)])
-                if nClassified < self._nr_elements * self.nr_sequences:
+                # after an early stop, only the presented sequences are scored
+                if self._scores.total < self._nr_elements * self._sequences_run:
                     pygame.time.wait(20)
                     print 'not enough classifier-outputs received! (something may be wrong)'
                     return
 
-                ## classify and set output:
-                means = [None]*self._nr_elements
-                minimum = maxint
-                classified = None
-                for ii in range(self._nr_elements):
-                    means[ii] = sum(self._classifier_output[ii]) / self.nr_sequences
-                    if means[ii]<minimum:
-                        minimum = means[ii]
-                        classified = ii
-                print "\n**** Class: %d (mean=%f)\n" % (classified+1,means[classified])
-            else:
-                means = [None]*self._nr_elements
-                minimum = maxint
-                classified = None
-                for ii in range(self._nr_elements):
-                    means[ii] = sum(self._classifier_output[ii]) /self.nr_sequences
-                    if means[ii]<minimum:
-                        minimum = means[ii]
-                        classified = ii
-                print "\n**** Class: %d (mean=%f)\n" % (classified+1,means[classified])
-
-            ## Reset classifier output to empty lists
+            ## classify and set output:
+            classified = self._scores.best()
+            print "\n**** Class: %d (mean=%f)\n" % (classified+1,self._scores.means()[classified])
+
+            ## Reset the score accumulator
             self._init_classifier_output()
 
         error_add = 0
@@ -818,8 +846,15 @@ class VisualSpellerVE(MainloopFeedback):
 
 
     def _init_classifier_output(self):
-        ## Empty lists
-        self._classifier_output = [list() for _ in xrange(self._nr_elements)]
+        ## Empty score accumulator
+        scores = getattr(self, '_scores', None)
+        if scores is not None and (scores.n_classes, scores.max_sequences) == (self._nr_elements, self.nr_sequences):
+            scores.reset()
+        else:
+            self._scores = ScoreAccumulator(self._nr_elements, self.nr_sequences)
+        self._stopping_rule = make_stopping_rule(self.early_stopping,
+                                                 self.early_stopping_threshold,
+                                                 self.early_stopping_min_sequences)
 
     def abort_trial_check(self):
         '''
@@ -874,7 +909,7 @@ class VisualSpellerVE(MainloopFeedback):
             cl_out = score_data[0]
             iSubstim = int(score_data[1]) # evt auch "Subtrial"
             if iSubstim in range(1,7):
-                self._classifier_output[iSubstim-1].append(cl_out)
+                self._scores.add(iSubstim-1, cl_out)
             elif self.use_ErrP_detection:
                 self._ErrP_classifier = cl_out
         elif data.has_key('new_letter'):
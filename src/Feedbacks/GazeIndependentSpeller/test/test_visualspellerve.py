@@ -0,0 +1,112 @@
+# test_visualspellerve.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from Feedbacks.GazeIndependentSpeller.VisualSpellerVE import VisualSpellerVE
+
+
+class IdlePresentation(object):
+    """Presentation which returns immediately."""
+
+    def set(self, **kwargs):
+        pass
+
+    def go(self):
+        pass
+
+
+class VisualSpellerVETestCase(unittest.TestCase):
+
+    def setUp(self):
+        fb = VisualSpellerVE()
+        fb.on_init()
+        fb.offline = False
+        fb.nr_sequences = 5
+        fb.wait_before_classify = 0
+        fb.wait_after_early_stopping = 0
+        fb._nr_elements = 6
+        fb._idx_backdoor = 5
+        fb._current_level = 1
+        fb._current_sequence = 0
+        fb._current_stimulus = 0
+        fb._desired_letters = ""
+        fb._debug_classified = None
+        fb._state_classify = False
+        fb._state_feedback = False
+        fb._presentation = IdlePresentation()
+        self.fb = fb
+
+    def run_trial(self, scores_per_sequence=6):
+        """Present stimuli until the trial ends, class 2 getting the best
+        scores, and return the number of presented stimuli."""
+        fb = self.fb
+        fb._init_classifier_output()
+        n = 0
+        while True:
+            element = n % fb._nr_elements
+            if element < scores_per_sequence:
+                fb._scores.add(element, -1.0 if element == 2 else 1.0)
+            n += 1
+            if fb._next_stimulus():
+                return n
+
+    def testFullTrial(self):
+        """Should present all sequences without early stopping."""
+        self.assertEqual(self.run_trial(), 30)
+        self.assertEqual(self.fb._sequences_run, 5)
+
+    def testEarlyStop(self):
+        """Should classify with the scores of the presented sequences after
+        an early stop."""
+        fb = self.fb
+        fb.early_stopping = 'margin'
+        fb.early_stopping_threshold = 1.0
+        fb.early_stopping_min_sequences = 2
+        self.assertEqual(self.run_trial(), 12)
+        self.assertEqual(fb._sequences_run, 2)
+        self.assertEqual(fb._current_sequence, 0)
+        fb._VisualSpellerVE__classify()
+        self.assertTrue(fb._state_feedback)
+        self.assertEqual(fb._classified_element, 2)
+
+    def testWaitForScores(self):
+        """Should not classify before the scores of all presented
+        sequences arrived."""
+        fb = self.fb
+        fb.nr_sequences = 2
+        self.run_trial(scores_per_sequence=5)
+        fb._VisualSpellerVE__classify()
+        self.assertFalse(fb._state_feedback)
+        fb._scores.add(5, 1.0)
+        fb._scores.add(5, 1.0)
+        fb._VisualSpellerVE__classify()
+        self.assertTrue(fb._state_feedback)
+        self.assertEqual(fb._classified_element, 2)
+
+
+def suite():
+    testSuite = unittest.makeSuite(VisualSpellerVETestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
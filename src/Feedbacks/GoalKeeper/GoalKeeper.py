@@ -32,7 +32,7 @@ from PIL import Image
 
 import pygame
 
-from FeedbackBase.PygameFeedback import PygameFeedback
+from FeedbackBase.PygameFeedback import PygameFeedback, text_cache
 
 
 class GoalKeeper(PygameFeedback):
@@ -608,10 +608,9 @@ class GoalKeeper(PygameFeedback):
         if not center:
             center = self.screen.get_rect().center
 
-        font = pygame.font.Font(None, size)
         if not superimpose:
             self.screen.blit(self.background, self.backgroundRect)
-        surface = font.render(text, 1, color, self.backgroundColor)
+        surface = text_cache.render(text, size, color, True, self.backgroundColor)
         self.screen.blit(surface, surface.get_rect(center=center))
         if superimpose:
             pygame.display.update(surface.get_rect(center=center))
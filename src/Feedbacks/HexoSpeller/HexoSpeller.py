@@ -189,9 +189,9 @@ class HexoSpeller(MainloopFeedback):
         MainloopFeedback.on_play(self)
     
     def on_pause(self):
-        if self._MainloopFeedback__running and self._MainloopFeedback__paused:
+        if self._running and self._paused:
             self.send_parallel(Marker.status_change_to_play)
-        if self._MainloopFeedback__running and not self._MainloopFeedback__paused:
+        if self._running and not self._paused:
             self.send_parallel(Marker.status_change_to_pause)
         MainloopFeedback.on_pause(self)
         
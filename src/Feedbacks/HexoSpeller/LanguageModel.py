@@ -17,30 +17,44 @@
 
 import os
 import cPickle as pickle
-from numpy import ones, outer, sum, isscalar, squeeze, array
-import pylab as p
+from collections import OrderedDict
+from numpy import ones, outer, sum, isscalar, squeeze, array, arange, lexsort
 import Utils
 
 
+# number of probability vectors kept by get_probabilities
+PROBABILITY_CACHE_SIZE = 256
+
+
 class LanguageModel():
     
     delete_symbol = '<'
     
     def __init__(self, file_name, 
                  head_factors=[1.0, 0.9, 0.8, 0.6, 0.5], 
-                 letter_factor=0.01, n_pred=2):
+                 letter_factor=0.01, n_pred=2,
+                 cache_size=PROBABILITY_CACHE_SIZE):
         self.file_name = file_name
         self.head_factors = head_factors
         self.letter_factor = letter_factor
         self.n_pred = n_pred
+        self.cache_size = cache_size
+        # (word, n_pred, letter_factor, head_factors) -> (prob, hp, pp), least recently used first
+        self.probability_cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
         self.load_mat_file()
         self.create_symbol_list()
         self.create_other_variables()
         
         
     def load_mat_file(self):
-        f = open(self.file_name,'r')
-        self.file_content = pickle.load(f)
+        # the pickles are text files with Windows line endings
+        f = open(self.file_name,'rU')
+        try:
+            self.file_content = pickle.loads(f.read())
+        finally:
+            f.close()
     
     def create_symbol_list(self):
         """ Get all the individual characters and store them in self.symbol_list, which is a list of lists. Each
@@ -60,11 +74,15 @@ class LanguageModel():
                 sub_list = []
                 symbol_list.append(sub_list)
         self.symbol_list = symbol_list
+        # sublist of every symbol, used to sort the symbols within the sublists
+        self.symbol_sublists = arange(self.nr_chars) // 5
     
     def create_other_variables(self):
         # create the word look-up tables
         self.head_table = self._create_word_table(self.file_content['head_table'])
         self.pred_table = self._create_word_table(self.file_content['pred_table'])
+        self.head_index = self._create_word_index(self.head_table)
+        self.pred_index = self._create_word_index(self.pred_table)
         #  create and normalize the probability tables
         self.head_prob = self._normalize_probability_tables(self.file_content['head_prob'])
         self.pred_prob = self._normalize_probability_tables(self.file_content['pred_prob'])
@@ -86,6 +104,17 @@ class LanguageModel():
             word_table.append(table)
         return word_table
 
+    def _create_word_index(self, word_table):
+        """ Returns a dictionary word -> index in the table for every table of word_table. """
+        word_index = []
+        for table in word_table:
+            index = {}
+            for i, word in enumerate(table):
+                # the first occurrence like list.index
+                index.setdefault(word, i)
+            word_index.append(index)
+        return word_index
+
     def _normalize_probability_tables(self, tables):
         n_tables = []
         tables = squeeze(tables)
@@ -99,16 +128,32 @@ class LanguageModel():
         
     
     def get_probabilities(self, spelled_text):
-        """ Returns a probability distribution over the character set, based on the spelled_text. """
+        """ Returns a probability distribution over the character set, based on the spelled_text. The
+        distributions of the recently spelled words are cached, do not modify the returned array. """
         # find the beginning of the last written word and store it in word
         words = spelled_text.split('_')
         word = words[-1] # word after the last '_'
+        key = (word, self.n_pred, self.letter_factor, tuple(self.head_factors))
+        cached = self.probability_cache.pop(key, None)
+        if cached is None:
+            self.misses += 1
+            cached = self._compute_probabilities(word)
+            if len(self.probability_cache) >= self.cache_size:
+                self.probability_cache.popitem(last=False)
+        else:
+            self.hits += 1
+        self.probability_cache[key] = cached
+        prob, self.hp, self.pp = cached
+        return prob
+
+    def _compute_probabilities(self, word):
+        """ Returns the probability distribution over the character set after word and the head and
+        prediction based distributions. """
         word_length = len(word)
         # hp - probability based on "head", i.e. the half complete word from the beginning on
         if word_length < len(self.head_table):
             # find the index of the word in the look-up table
-            word_list = self.head_table[word_length]
-            index = self._find_word_index(word, word_list)
+            index = self._find_word_index(word, self.head_index[word_length])
         else:
             index = None
         if index == None:
@@ -117,27 +162,25 @@ class LanguageModel():
             hp = self.head_prob[0]
         else:
             hp = self.head_prob[word_length][:,index]
-        self.hp = hp
         # partial predictive match based on the k previous letters, with k being either self.n_pred or less if the word is too short
         k = min(word_length, self.n_pred)
         # try to find the combination of the k previous letters in the lookup table
         index = None
         while index==None and k > 0:
-            word_list = self.pred_table[k]
             k_prev_letters = word[-k:]
-            index = self._find_word_index(k_prev_letters, word_list)
+            index = self._find_word_index(k_prev_letters, self.pred_index[k])
             k = k - 1
         if index == None or k==0:
             # the k_prev_letter combination could not be found in the table
             pp = self.pred_prob[0]
         else:
             pp = self.pred_prob[k+1][:,index]
-        self.pp = pp
         hf = self.head_factors[min(word_length, len(self.head_factors)-1)]
         prob = hp*hf + pp*(1-hf)
         if k > 0:
             prob = self.pred_prob[0]*self.letter_factor + prob*(1-self.letter_factor)
-        return prob
+        prob.flags.writeable = False
+        return prob, hp, pp
     
     def update_symbol_list_sorting(self, spelled_text):
         """ 
@@ -146,14 +189,16 @@ class LanguageModel():
         """
         probs = self.get_probabilities(spelled_text)
 #        probs = ones(29)/29.0
+        # sort by sublist, within the sublists by descending probability, equally probable symbols keep
+        # their order
+        order = lexsort((-probs, self.symbol_sublists)).tolist()
         self.probs_list = []
-        symbol_list = Utils.copy_list(self.symbol_list)
+        symbol_list = []
         start = 0
-        for i, sub_list in enumerate(symbol_list):
+        for sub_list in self.symbol_list:
             stop = min(start + len(sub_list), len(probs))
-            values = Utils.array_to_list(probs[start:stop])
-            self.probs_list.append(Utils.copy_list(values))
-            symbol_list[i] = Utils.sort_list_according_to_values(sub_list, values)
+            self.probs_list.append(probs[start:stop].tolist())
+            symbol_list.append([self.char_set_list[i] for i in order[start:stop]])
             start = stop
         # add the back symbol
         symbol_list[-1].append(self.delete_symbol)
@@ -184,18 +229,15 @@ class LanguageModel():
             idx = None
         return idx
     
-    def _find_word_index(self, word, word_list):
-        """ A little helper method that returns the index of word in word_list. If word is not contained in word_list, None will
-        be returned. """
-        try:
-            idx = word_list.index(word)
-        except ValueError:
-            idx = None
-        return idx
+    def _find_word_index(self, word, word_index):
+        """ A little helper method that returns the index of word in the table of word_index. If word is not contained in
+        the table, None will be returned. """
+        return word_index.get(word)
     
 
 
 if __name__ == "__main__":
+    import pylab as p
     base_dir = 'D:\Work\BBCI\python\pyff\src\Feedbacks\HexoSpeller\LanguageModels'
     file_name = 'german.pckl'
 #    file_name = 'german.mat'
@@ -0,0 +1,183 @@
+# test_languagemodel.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import cPickle as pickle
+
+from numpy import array, empty, ones, arange
+
+from Feedbacks.HexoSpeller import Utils
+from Feedbacks.HexoSpeller.LanguageModel import LanguageModel
+
+
+CHARSET = "abcdefghij_."
+
+
+def ascii_table(words):
+    """Return the words as matrix of ascii codes, one word per row."""
+    return array([[ord(c) for c in word] for word in words])
+
+
+def object_array(elements):
+    """Return a 1 x n object array like the cell arrays of the mat files."""
+    a = empty((1, len(elements)), dtype=object)
+    for i, element in enumerate(elements):
+        a[0, i] = element
+    return a
+
+
+def synthetic_model():
+    """Return the content of a small language model file."""
+    n = len(CHARSET)
+    head_words = [[], ["a", "b", "c"], ["ab", "ba", "ca", "ab"]]
+    pred_words = [[], ["a", "b", "c", "d"], ["ab", "ba", "bc"]]
+    def probs(words, seed):
+        # ties within the sublists test the order of equally probable symbols
+        return (arange(n * len(words)).reshape(len(words), n).T * seed % 7) + 1.0
+    # prior with ties
+    prior = array([3, 1, 3, 2, 3, 1, 1, 2, 2, 1, 4, 4], dtype=float)
+    empty_table = array([])
+    return {"charset" : [CHARSET],
+            "head_table" : object_array([empty_table] + [ascii_table(w) for w in head_words[1:]]),
+            "pred_table" : object_array([empty_table] + [ascii_table(w) for w in pred_words[1:]]),
+            "head_prob" : object_array([prior] + [probs(w, 3) for w in head_words[1:]]),
+            "pred_prob" : object_array([prior[::-1].copy()] + [probs(w, 5) for w in pred_words[1:]])}
+
+
+class OriginalLanguageModel(object):
+    """The look-up and sorting of the symbols before the indexing."""
+
+    def __init__(self, lm):
+        self.lm = lm
+
+    def get_probabilities(self, spelled_text):
+        lm = self.lm
+        word = spelled_text.split('_')[-1]
+        word_length = len(word)
+        index = None
+        if word_length < len(lm.head_table) and word in lm.head_table[word_length]:
+            index = lm.head_table[word_length].index(word)
+        if index == None:
+            hp = lm.head_prob[0]
+        else:
+            hp = lm.head_prob[word_length][:,index]
+        k = min(word_length, lm.n_pred)
+        index = None
+        while index == None and k > 0:
+            if word[-k:] in lm.pred_table[k]:
+                index = lm.pred_table[k].index(word[-k:])
+            k = k - 1
+        if index == None or k == 0:
+            pp = lm.pred_prob[0]
+        else:
+            pp = lm.pred_prob[k+1][:,index]
+        hf = lm.head_factors[min(word_length, len(lm.head_factors)-1)]
+        prob = hp*hf + pp*(1-hf)
+        if k > 0:
+            prob = lm.pred_prob[0]*lm.letter_factor + prob*(1-lm.letter_factor)
+        return prob
+
+    def update_symbol_list_sorting(self, spelled_text):
+        probs = self.get_probabilities(spelled_text)
+        probs_list = []
+        symbol_list = Utils.copy_list(self.lm.symbol_list)
+        start = 0
+        for i, sub_list in enumerate(symbol_list):
+            stop = min(start + len(sub_list), len(probs))
+            values = Utils.array_to_list(probs[start:stop])
+            probs_list.append(Utils.copy_list(values))
+            symbol_list[i] = Utils.sort_list_according_to_values(sub_list, values)
+            start = stop
+        symbol_list[-1].append(self.lm.delete_symbol)
+        return symbol_list, probs_list
+
+
+class LanguageModelTestCase(unittest.TestCase):
+
+    TEXTS = ["", "a", "ab", "abc", "b", "ca", "xy_ba", "bc", "ab_", "abcde"]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        file_name = os.path.join(self.dir, "synthetic.pckl")
+        f = open(file_name, "w")
+        try:
+            f.write(pickle.dumps(synthetic_model()))
+        finally:
+            f.close()
+        self.lm = LanguageModel(file_name)
+        self.original = OriginalLanguageModel(self.lm)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def testProbabilities(self):
+        """Should compute the same probabilities as the original look-up."""
+        for text in self.TEXTS:
+            self.assertEqual(self.lm.get_probabilities(text).tolist(),
+                             self.original.get_probabilities(text).tolist())
+
+    def testSymbolListSorting(self):
+        """Should sort the symbols like the original, ties included."""
+        for text in self.TEXTS:
+            symbol_list = self.lm.update_symbol_list_sorting(text)
+            expected, probs_list = self.original.update_symbol_list_sorting(text)
+            self.assertEqual(symbol_list, expected)
+            self.assertEqual(self.lm.probs_list, probs_list)
+
+    def testCacheHit(self):
+        """Should return the cached vector for the same word."""
+        prob = self.lm.get_probabilities("xy_ab")
+        hp, pp = self.lm.hp, self.lm.pp
+        self.assertTrue(self.lm.get_probabilities("ab") is prob)
+        self.assertTrue(self.lm.hp is hp)
+        self.assertTrue(self.lm.pp is pp)
+        self.assertEqual((self.lm.hits, self.lm.misses), (1, 1))
+        self.assertFalse(prob.flags.writeable)
+
+    def testCacheInvalidation(self):
+        """Should recompute the probabilities after changing the factors."""
+        prob = self.lm.get_probabilities("ab")
+        self.lm.head_factors = [0.5] * 5
+        changed = self.lm.get_probabilities("ab")
+        self.assertEqual(self.lm.misses, 2)
+        self.assertNotEqual(changed.tolist(), prob.tolist())
+        self.assertEqual(changed.tolist(),
+                         self.original.get_probabilities("ab").tolist())
+
+    def testCacheSize(self):
+        """Should drop the least recently used vector."""
+        self.lm.cache_size = 2
+        self.lm.get_probabilities("a")
+        self.lm.get_probabilities("b")
+        self.lm.get_probabilities("a")
+        self.lm.get_probabilities("c")
+        self.assertEqual([key[0] for key in self.lm.probability_cache],
+                         ["a", "c"])
+
+
+def suite():
+    return unittest.TestLoader().loadTestsFromTestCase(LanguageModelTestCase)
+
+def main():
+    unittest.TextTestRunner(verbosity=2).run(suite())
+
+if __name__ == "__main__":
+    main()
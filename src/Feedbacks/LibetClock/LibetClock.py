@@ -27,7 +27,7 @@ import os
 
 import pygame
 
-from FeedbackBase.PygameFeedback import PygameFeedback
+from FeedbackBase.PygameFeedback import PygameFeedback, text_cache
 
 
 class LibetClock(PygameFeedback):
@@ -541,19 +541,18 @@ class LibetClock(PygameFeedback):
             pos = self.screencenter
 
         size = size*0.6
-        font = pygame.font.Font(None, int(size))
         if not superimpose:
             self.draw_all()
 
         if type(text) is list:
-            height = pygame.font.Font.get_linesize(font)
+            height = text_cache.font(size).get_linesize()
             top = -(2*len(text)-1)*height/2
             for t in range(len(text)):
-                surface = font.render(text[t], 1, color)
+                surface = text_cache.render(text[t], size, color)
 
                 self.screen.blit(surface, surface.get_rect(midtop=(pos[0], pos[1]+top+t*1.5*height)))
         else:
-            surface = font.render(text, 1, color)
+            surface = text_cache.render(text, size, color)
             self.screen.blit(surface, surface.get_rect(center=pos))
         pygame.display.update()
 
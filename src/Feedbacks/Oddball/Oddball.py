@@ -45,10 +45,13 @@ import math
 import os
 import warnings
 from scipy import *
+import numpy
 
 import pygame
 
 from FeedbackBase.MainloopFeedback import MainloopFeedback
+from FeedbackBase.PygameFeedback import text_cache
+from lib.ExperimentalDesign.OddballSequence import oddball_sequence, class_sequence, deviant_count
 from lib import marker
 from lib import serialport
 
@@ -72,6 +75,7 @@ class Oddball(MainloopFeedback):
         self.give_feedback = True
         self.group_stim_markers = False
         self.dd_dist = 2    # no contraint if deviant-deviant distance is 0 (cf. oddball sequence)            
+        self.random_seed = None   # seed of the stimulus sequences, None for a random seed
         
         self.DIR_DEV = ''
         self.DIR_STD= ''
@@ -213,9 +217,11 @@ class Oddball(MainloopFeedback):
         if serial:
             self.logger.debug('using serial port')
             self.send_parallel = self.serialport.send
+            self._serialTriggerPort = self.serialport.trigger_port
         else:
             self.logger.debug('using parallel port')
             self.send_parallel = self.send_parallel_bak
+            self._serialTriggerPort = None
 
 
     def post_mainloop(self):
@@ -471,10 +477,9 @@ class Oddball(MainloopFeedback):
         if not center:
             center = self.screen.get_rect().center
 
-        font = pygame.font.Font(None, size)
         if not superimpose:
             self.screen.blit(self.background, self.backgroundRect)            
-        surface = font.render(text, 1, color,self.backgroundColor)    
+        surface = text_cache.render(text, size, color, True, self.backgroundColor)
         self.screen.blit(surface, surface.get_rect(center=center))
         pygame.display.update()
                 
@@ -541,38 +546,24 @@ class Oddball(MainloopFeedback):
         dd_dist:    constraint variable: minimal number of standards between two deviants 
                    (default: no contraint (=0))
         """
-    
-        devs_to_be_placed= round(N*dev_perc)
-        if devs_to_be_placed+(devs_to_be_placed-1)*dd_dist>N:
-            solve_prob = 'Increase the number of trials, or decrease the percentage of deviants or the minimal dev-to-dev-distance.' 
-            raise Exception('Oddball sequence constraints cannot be fullfilled. ' + solve_prob)
-    
-        devs = -1
-        while round(N*dev_perc) != devs:
-            sequence= zeros((N,1));
-            devs_to_be_placed= round(N*dev_perc)
-            ptr = 0
-            while ptr < N:        
-                togo= N-ptr
-                prob= devs_to_be_placed/floor(togo/2)        
-                if random.random() < prob:
-                    sequence[ptr] = 1
-                    devs_to_be_placed = devs_to_be_placed - 1
-                    ptr = ptr + dd_dist
-                ptr= ptr +  1
-            devs = sum(sequence)
-        #print sequence
-        return sequence
+        return oddball_sequence(N, deviant_count(N, dev_perc), dd_dist,
+                                self.get_random_state())
     
     def create_list(self, nStim, stim_perc):
         """ 
         Creates a randomly shuffled list with numbers ranging from 0-(nStim-1)
         The percentages of the numbers occuring are given by the list stim_perc
         """
-        list = [];
-        for n in range(len(stim_perc)):
-            list.extend([n] * int(nStim*stim_perc[n]))
-        random.shuffle(list)
-        return list
+        return class_sequence(nStim, stim_perc, self.get_random_state()).tolist()
+
+    def get_random_state(self):
+        """
+        Returns the random number generator of the stimulus sequences, a new
+        one whenever random_seed changed.
+        """
+        if getattr(self, '_random_state_seed', -1) != self.random_seed:
+            self._random_state = numpy.random.RandomState(self.random_seed)
+            self._random_state_seed = self.random_seed
+        return self._random_state
     
         
@@ -33,6 +33,7 @@ import os
 import sys
 
 from scipy import *
+import numpy
 import time
 import VisionEgg
 import random
@@ -44,6 +45,7 @@ from VisionEgg.MoreStimuli import FilledCircle
 from FeedbackBase.VisionEggFeedback import VisionEggFeedback
     
 from lib import marker
+from lib.ExperimentalDesign.OddballSequence import oddball_sequence, class_sequence, deviant_count
     
 # TODO: 
 # - EVTL: hit-miss-counter
@@ -79,6 +81,7 @@ class VisualOddballVE(VisionEggFeedback):
         self.give_feedback = True   # will be ignored if self.response=='none'
         self.group_stim_markers = False
         self.dd_dist = 0    # no constraint if deviant-deviant distance is 0 (cf. constraint_stim_sequence() )            
+        self.random_seed = None   # seed of the stimulus sequences, None for a random seed
         
         self.DIR_DEV = 'C:\img_oddball\dev'
         self.DIR_STD= 'C:\img_oddball\std'
@@ -327,27 +330,8 @@ class VisualOddballVE(VisionEggFeedback):
         dd_dist:    constraint variable: minimal number of standards between two deviants 
                    (default: no constraint (=0))
         """    
-        devs_to_be_placed= round(N*dev_perc)
-        if devs_to_be_placed+(devs_to_be_placed-1)*dd_dist>N:
-            solve_prob = 'Increase the number of trials, or decrease the percentage of deviants or the minimal dev-to-dev-distance.' 
-            raise Exception('Oddball sequence constraints cannot be fulfilled. ' + solve_prob)
-        
-        devs = -1
-        while round(N*dev_perc) != devs:
-            sequence= zeros((N,1));
-            devs_to_be_placed= round(N*dev_perc)
-            ptr = 0
-            while ptr < N:        
-                togo= N-ptr
-                prob= devs_to_be_placed/floor(togo/2)        
-                if random.random() < prob:
-                    sequence[ptr] = 1
-                    devs_to_be_placed = devs_to_be_placed - 1
-                    ptr = ptr + dd_dist
-                ptr= ptr +  1
-            devs = sum(sequence)
-        #print sequence
-        return sequence
+        return oddball_sequence(N, deviant_count(N, dev_perc), dd_dist,
+                                self.get_random_state())
     
     
     def stim_sequence(self, nStim, stim_perc):
@@ -355,11 +339,18 @@ class VisualOddballVE(VisionEggFeedback):
         Creates a randomly shuffled list with numbers ranging from 0-(nStim-1)
         The percentages of the numbers occurring are given by the list stim_perc
         """
-        list = [];
-        for n in range(len(stim_perc)):
-            list.extend([n] * int(nStim*stim_perc[n]))
-        random.shuffle(list)
-        return list
+        return class_sequence(nStim, stim_perc, self.get_random_state()).tolist()
+
+
+    def get_random_state(self):
+        """
+        Returns the random number generator of the stimulus sequences, a new
+        one whenever random_seed changed.
+        """
+        if getattr(self, '_random_state_seed', -1) != self.random_seed:
+            self._random_state = numpy.random.RandomState(self.random_seed)
+            self._random_state_seed = self.random_seed
+        return self._random_state
         
         
     def error_check(self):
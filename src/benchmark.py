@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+# benchmark.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Run the Feedbacks headless and record their frame times.
+
+Every Feedback runs in its own process through a scripted session and the
+report is written to OUTPUT/<Feedback>.json. With --baseline the reports are
+compared against the reports of an earlier run. The exit code is 1 if a
+Feedback got slower than the tolerance allows, failed, crashed or timed out.
+"""
+
+
+import os
+import sys
+import json
+import logging
+from optparse import OptionParser
+from multiprocessing import Process
+
+from FeedbackBase.Feedback import Feedback
+from lib.PluginController import PluginController, import_module_and_get_class
+from lib.benchmark import feedback
+
+
+def run(modname, classname, filename, duration, rate):
+    """Run the Feedback and write its report, called in a new process."""
+    try:
+        fbclass = import_module_and_get_class(modname, classname)
+        opengl = "VisionEggFeedback" in [c.__name__ for c in fbclass.__mro__]
+        feedback.enable_headless(opengl)
+        report = feedback.run_feedback(fbclass, duration, rate)
+    except:
+        logging.exception("Benchmarking %s failed:" % classname)
+        report = {"feedback" : classname, "error" : str(sys.exc_info()[1])}
+    report["module"] = modname
+    write_report(filename, report)
+
+
+def write_report(filename, report):
+    fh = open(filename, "w")
+    json.dump(report, fh, indent=2, sort_keys=True)
+    fh.close()
+
+
+def read_report(filename, fb, exitcode):
+    """Return the report the Feedback's process wrote, or an error report
+    if the process died without writing one."""
+    try:
+        return json.load(open(filename))
+    except (IOError, ValueError), e:
+        report = {"feedback" : fb,
+                  "error" : "no report, exit code %s: %s" % (str(exitcode), str(e))}
+        write_report(filename, report)
+        return report
+
+
+def main():
+    parser = OptionParser(usage="%prog [Options]", description=__doc__)
+    parser.add_option("-f", "--feedback", dest="feedbacks", action="append",
+                      help="Feedback to benchmark. Use this option several times for more than one Feedback. [default: all]",
+                      metavar="NAME")
+    parser.add_option("-a", "--additional-feedback-path", dest="fbpath",
+                      action="append", default=[],
+                      help="Additional path to search for Feedbacks.",
+                      metavar="DIR")
+    parser.add_option("-o", "--output", dest="output", default="benchmark",
+                      help="Directory for the reports. [default: %default]",
+                      metavar="DIR")
+    parser.add_option("-d", "--duration", dest="duration", type="float",
+                      default=feedback.DEFAULT_DURATION,
+                      help="Length of the session in seconds. [default: %default]")
+    parser.add_option("-r", "--rate", dest="rate", type="float",
+                      default=feedback.DEFAULT_CONTROL_RATE,
+                      help="Rate of the control signals in Hz. [default: %default]")
+    parser.add_option("-b", "--baseline", dest="baseline",
+                      help="Directory with reports of an earlier run to compare against.",
+                      metavar="DIR")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float",
+                      default=feedback.DEFAULT_TOLERANCE,
+                      help="Allowed slowdown relative to the baseline. [default: %default]")
+    options, args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    pc = PluginController(["Feedbacks"] + options.fbpath, Feedback)
+    pc.find_plugins()
+    feedbacks = options.feedbacks or sorted(pc.availablePlugins.keys())
+    if not os.path.isdir(options.output):
+        os.makedirs(options.output)
+
+    regressions = 0
+    failures = 0
+    for fb in feedbacks:
+        filename = os.path.join(options.output, fb + ".json")
+        # a report of an earlier run must not pass as the current one
+        if os.path.exists(filename):
+            os.remove(filename)
+        proc = Process(target=run, args=(pc.availablePlugins[fb], fb, filename,
+                                         options.duration, options.rate))
+        proc.start()
+        # give the Feedback some time to start and to stop
+        proc.join(options.duration * 2 + 30)
+        if proc.is_alive():
+            proc.terminate()
+            write_report(filename, {"feedback" : fb, "error" : "timeout"})
+        report = read_report(filename, fb, proc.exitcode)
+        if "error" in report:
+            print "%-30s error: %s" % (fb, report["error"])
+            failures += 1
+            continue
+        print "%-30s %5i ticks, tick p50 %.2fms, frame p50 %.2fms" % (fb,
+                report["ticks"], (report["tick_time"]["p50"] or 0) * 1000,
+                (report["frame_time"]["p50"] or 0) * 1000)
+        if options.baseline:
+            basefile = os.path.join(options.baseline, fb + ".json")
+            if not os.path.exists(basefile):
+                continue
+            baseline = json.load(open(basefile))
+            for name, old, new in feedback.compare_reports(baseline, report, options.tolerance):
+                print "    %s regressed: %.6f -> %.6f" % (name, old, new)
+                regressions += 1
+    if regressions or failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -72,6 +72,25 @@ class Emulator(cmd.Cmd):
         self._do_generate_cs(line, 6)
 
 
+    def do_generate_cs_batch(self, line):
+        """Generates batched control signals and sends them to the Feedback Controller.
+
+        Usage: generate_cs_batch [rate [batchsize]]
+
+        Samples are generated with rate Hz (default 500) and sent in batches
+        of batchsize (default 10) samples.
+        """
+        args = line.split()
+        rate = float(args[0]) if len(args) > 0 else 500.0
+        batchsize = int(args[1]) if len(args) > 1 else 10
+        self.net = BciNetwork("localhost", bcinetwork.FC_PORT)
+        self.signal = BciSignal(None, None, bcixml.CONTROL_SIGNAL)
+        self.stopping = False
+        self.t = threading.Thread(target=self._cs_batch_loop, args=(rate, batchsize))
+        self.t.start()
+        print "Enter: stop_cs to stop the signal."
+
+
     def _do_generate_cs(self, line, numbers):
         self.net = BciNetwork("localhost", bcinetwork.FC_PORT)
         self.signal = BciSignal(None, None, bcixml.CONTROL_SIGNAL)
@@ -106,6 +125,18 @@ class Emulator(cmd.Cmd):
 
             self.net.send_signal(self.signal)
 
+    def _cs_batch_loop(self, rate, batchsize):
+        c = 0
+        samples = []
+        while not self.stopping:
+            time.sleep(1.0 / rate)
+            c += 1
+            samples.append((time.time(), math.sin(math.radians(c))))
+            if len(samples) >= batchsize:
+                self.signal.data = {bcixml.CL_BATCH : samples}
+                self.net.send_signal(self.signal)
+                samples = []
+
     def do_stop_cs(self, line):
         """Stops the loop which sends data to the Feedback Controller."""
         self.stopping = True
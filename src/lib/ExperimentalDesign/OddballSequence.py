@@ -0,0 +1,101 @@
+# OddballSequence.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+Stimulus sequences for oddball experiments.
+
+oddball_sequence places exactly the requested number of deviants among the
+standards, with at least dd_dist standards between two deviants. The
+sequence is built in one pass: placing k deviants with the minimum spacing
+in n trials is the same as choosing k of n - (k-1)*dd_dist slots and
+inserting dd_dist standards after each deviant but the last. Every valid
+sequence is equally likely.
+
+Example:
+oddball_sequence(10, 3, dd_dist=2, random_state=1)
+gives an int8 array like [0,1,0,0,1,0,0,0,1,0].
+
+class_sequence shuffles the classes of multi-class stimuli, e.g. the
+deviant and standard images of MultiVisualOddball.
+
+All functions take a random_state: None for NumPy's global random number
+generator, a seed or a numpy.random.RandomState.
+"""
+
+
+import numpy
+
+
+def get_random_state(random_state=None):
+    """Return the random number generator for the random_state argument."""
+    if random_state is None:
+        return numpy.random
+    if isinstance(random_state, numpy.random.RandomState):
+        return random_state
+    return numpy.random.RandomState(random_state)
+
+
+def deviant_count(n, dev_perc):
+    """Return the number of deviants in n trials with dev_perc deviants."""
+    return int(round(n * dev_perc))
+
+
+def oddball_sequence(n, n_deviants, dd_dist=0, random_state=None):
+    """
+    Return an int8 array of length n with n_deviants ones (deviants) and
+    zeros (standards), with at least dd_dist standards between two deviants.
+    """
+    k = n_deviants
+    if k < 0 or k + max(k - 1, 0) * dd_dist > n:
+        raise ValueError('Oddball sequence constraints cannot be fulfilled. '
+                         'Increase the number of trials, or decrease the '
+                         'percentage of deviants or the minimal '
+                         'dev-to-dev-distance.')
+    sequence = numpy.zeros(n, dtype=numpy.int8)
+    if k == 0:
+        return sequence
+    slots = n - (k - 1) * dd_dist
+    positions = get_random_state(random_state).choice(slots, k, replace=False)
+    positions.sort()
+    sequence[positions + numpy.arange(k) * dd_dist] = 1
+    return sequence
+
+
+def class_counts(n, class_perc):
+    """
+    Return the number of stimuli per class for n stimuli, the classes
+    occurring with the percentages in class_perc. Rounds by the largest
+    remainder, so the counts add up to n if class_perc adds up to 1.
+    """
+    exact = [n * p for p in class_perc]
+    counts = [int(e) for e in exact]
+    missing = int(round(sum(exact))) - sum(counts)
+    remainders = sorted(range(len(exact)), key=lambda i: counts[i] - exact[i])
+    for i in remainders[:missing]:
+        counts[i] += 1
+    return counts
+
+
+def class_sequence(n, class_perc, random_state=None):
+    """
+    Return a shuffled int8 array with the classes 0 .. len(class_perc)-1 of
+    n stimuli, the classes occurring with the percentages in class_perc.
+    """
+    counts = class_counts(n, class_perc)
+    sequence = numpy.repeat(numpy.arange(len(counts), dtype=numpy.int8), counts)
+    get_random_state(random_state).shuffle(sequence)
+    return sequence
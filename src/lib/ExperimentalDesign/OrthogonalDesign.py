@@ -21,28 +21,170 @@ a list of length nTrials wherein all factor combinations appear with the same
 frequency.
 
 Example:
-OrthogonalDesign([(1,2),(3,4)],nTrials=8)
-specifies a 2x2 design. The output is [(1,3),(1,4),(2,3),(2,4),(1,3),(1,4),(2,3),(2,4)].
+orthogonalDesign([(1,2),(3,4)],nTrials=8)
+specifies a 2x2 design. The output is [[1,3],[1,4],[2,3],[2,4],[1,3],[1,4],[2,3],[2,4]].
+
+The OrthogonalDesign class computes the trials lazily, block by block. A
+block contains every factor combination (cell) once, the order of the cells
+within the blocks is given by the counterbalancing:
+
+* None
+    the cells in the order above
+* 'shuffle'
+    a new random order in every block
+* 'latin'
+    the rows of a balanced Latin square (Williams design), every cell
+    follows every other cell equally often. The subject selects the first
+    row, so consecutive subjects get different orders.
+
+Iterating over a design yields the trials as tuples, nTrials=None gives an
+endless stream. index_array returns the level indices of all trials as
+NumPy array:
+
+design = OrthogonalDesign([(1,2),(3,4,5)], nTrials=600, counterbalance='latin')
+for trial in design:
+    ...
 """
 
 
-def orthogonalDesign(factors,nTrials,buildup=[],trials=[]):
-
-    # recursion exit strategy
-    if factors==[]:
-        trials.append(buildup)
-        return
-    # Start recursion
-    if nTrials is not None:
-        trials = []
-        nSubconditions = 1
-        for ii in range(len(factors)):
-            nSubconditions *= len(factors[ii])
-        for ii in range(nTrials/nSubconditions):
-            orthogonalDesign(factors,None,[],trials)
-        return trials
-    else:
-        ff = factors[0]
-        for ii in range(len(ff)):
-            orthogonalDesign(factors[1:],None,buildup+[ff[ii]],trials)
+import numpy
+
+
+COUNTERBALANCING = (None, 'shuffle', 'latin')
+# error: nTrials must be a multiple of the number of cells
+# truncate: drop the trials of the incomplete last block
+# partial: the last block is incomplete
+REMAINDERS = ('error', 'truncate', 'partial')
+# Number of blocks computed at once while iterating
+BLOCK_CHUNK = 64
+
+
+def latin_square(n, rows):
+    """
+    Return the rows of a balanced Latin square (Williams design) of order n
+    as (len(rows), n) array. For odd n the rows n to 2n-1 are the first n
+    rows reversed, a square is balanced after n rows for even and 2n rows
+    for odd n. Larger row numbers start again.
+    """
+    rows = numpy.atleast_1d(rows)
+    j = numpy.arange(n)
+    # 0, 1, n-1, 2, n-2, ...
+    first = numpy.where(j % 2, (j + 1) // 2, (n - j // 2) % n)
+    square = (first[numpy.newaxis, :] + rows[:, numpy.newaxis]) % n
+    if n % 2:
+        reverse = rows % (2 * n) >= n
+        square[reverse] = square[reverse, ::-1]
+    return square
+
+
+class OrthogonalDesign(object):
+    """
+    Trials of a multi-factor design, computed block by block.
+    """
+
+    def __init__(self, factors, nTrials=None, counterbalance=None,
+                 remainder='error', subject=0, seed=None):
+        """
+        * factors
+            list with the levels of every factor
+        * nTrials
+            number of trials, None for an endless design
+        * counterbalance
+            order of the cells within a block: None, 'shuffle' or 'latin'
+        * remainder
+            what to do if nTrials is not a multiple of the number of cells:
+            'error', 'truncate' or 'partial'
+        * subject
+            number of the subject, selects the Latin square rows
+        * seed
+            seed of the 'shuffle' orders, None for a random seed. Every
+            iteration over the design yields the same trials.
+        """
+        if counterbalance not in COUNTERBALANCING:
+            raise ValueError("Unknown counterbalancing: %s" % counterbalance)
+        if remainder not in REMAINDERS:
+            raise ValueError("Unknown remainder handling: %s" % remainder)
+        self.factors = [list(f) for f in factors]
+        self.shape = tuple([len(f) for f in self.factors])
+        self.nCells = int(numpy.prod(self.shape))
+        if self.nCells == 0:
+            raise ValueError("Every factor needs at least one level")
+        if nTrials is not None and nTrials % self.nCells:
+            if remainder == 'error':
+                raise ValueError("%d trials are not a multiple of the %d cells"
+                                 % (nTrials, self.nCells))
+            if remainder == 'truncate':
+                nTrials -= nTrials % self.nCells
+        self.nTrials = nTrials
+        self.counterbalance = counterbalance
+        self.subject = subject
+        if seed is None:
+            seed = numpy.random.randint(2**31 - 1)
+        self.seed = seed
+
+    def __len__(self):
+        if self.nTrials is None:
+            raise TypeError("The design has no end")
+        return self.nTrials
+
+    def __iter__(self):
+        for cells in self.blocks():
+            for levels in self.levels(cells).tolist():
+                yield tuple([f[i] for f, i in zip(self.factors, levels)])
+
+    def blocks(self):
+        """Yield the cell indices of the blocks, the last one may be
+        incomplete."""
+        random = numpy.random.RandomState(self.seed)
+        remaining = self.nTrials
+        first = 0
+        while remaining is None or remaining > 0:
+            for cells in self.orders(first, BLOCK_CHUNK, random):
+                if remaining is not None:
+                    if remaining <= 0:
+                        return
+                    cells = cells[:remaining]
+                    remaining -= len(cells)
+                yield cells
+            first += BLOCK_CHUNK
+
+    def orders(self, first, count, random):
+        """Return the cell orders of count blocks, starting with block first,
+        as (count, nCells) array."""
+        if self.counterbalance == 'shuffle':
+            return random.random_sample((count, self.nCells)).argsort(axis=1)
+        if self.counterbalance == 'latin':
+            return latin_square(self.nCells, self.subject + first + numpy.arange(count))
+        return numpy.tile(numpy.arange(self.nCells), (count, 1))
+
+    def levels(self, cells):
+        """Return the level indices of the cells as (len(cells), number of
+        factors) array."""
+        cells = numpy.asarray(cells, dtype=int)
+        if not self.shape:
+            return numpy.zeros((len(cells), 0), dtype=int)
+        return numpy.array(numpy.unravel_index(cells, self.shape)).T
+
+    def cell_indices(self):
+        """Return the cell indices of all trials."""
+        if self.nTrials is None:
+            raise TypeError("The design has no end")
+        count = -(-self.nTrials // self.nCells)
+        orders = self.orders(0, count, numpy.random.RandomState(self.seed))
+        return orders.ravel()[:self.nTrials]
+
+    def index_array(self):
+        """Return the level indices of all trials as (nTrials, number of
+        factors) array."""
+        return self.levels(self.cell_indices())
+
 
+def orthogonalDesign(factors,nTrials):
+    """
+    Return the trials of the design as lists of levels, an incomplete last
+    block is dropped. nTrials=None gives one block.
+    """
+    if nTrials is None:
+        nTrials = OrthogonalDesign(factors).nCells
+    design = OrthogonalDesign(factors, nTrials, remainder='truncate')
+    return [list(trial) for trial in design]
@@ -0,0 +1,301 @@
+# FlashSequence.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+FlashSequence.py
+
+Generates the flash sequences of whole ERP speller trials.
+
+Usage::
+
+    gen = FlashSequenceGenerator(6, nr_sequences=10, min_dist=2)
+    pool = FlashSequencePool(gen)
+    ...
+    flashes = pool.get()                # at the start of every trial
+    ...
+    pool.close()
+
+A trial consists of nr_sequences sequences. Balanced sequences are sampled
+with NumPy as a batch of random permutations for the whole trial, the
+permutations violating a constraint are discarded and the first remaining
+one is taken. Sequences with repetition are drawn flash by flash from the
+groups the constraints allow. The constraints are:
+
+* balanced
+    every group flashes exactly once per sequence, otherwise the groups are
+    drawn with repetition
+* min_dist
+    minimum number of intermediate flashes between two flashes of the same
+    group, also across the sequences of a trial. min_dist=1 forbids
+    adjacent repetitions, for a row/column matrix speller it keeps a row or
+    column from flashing again too early.
+* members
+    groups sharing a member count as the same group for min_dist, e.g. two
+    overlapping letter groups of a checkerboard layout
+
+The FlashSequencePool keeps a few trials generated in a background thread,
+so starting a trial only takes a precomputed trial from its queue.
+"""
+
+
+import logging
+from collections import deque
+from threading import Thread, Condition, Lock
+
+import numpy
+
+
+# Number of candidates sampled at once
+BATCH_SIZE = 64
+# Number of candidates per sequence sampled at once for a whole trial
+TRIAL_BATCH_SIZE = 16
+# Number of batches tried before giving up
+MAX_BATCHES = 100
+# Default number of precomputed trials of a pool
+POOL_SIZE = 4
+
+
+class FlashSequenceGenerator(object):
+    """
+    Samples flash sequences of nr_groups groups which satisfy the constraints.
+    """
+
+    def __init__(self, nr_groups, nr_sequences, min_dist=0, balanced=True,
+                 seq_len=None, members=None, seed=None,
+                 batch_size=BATCH_SIZE, max_batches=MAX_BATCHES):
+        """
+        * nr_groups
+            number of groups (stimuli), the flashes are the group indices
+        * nr_sequences
+            number of sequences per trial
+        * min_dist
+            minimum number of intermediate flashes between two flashes of
+            conflicting groups
+        * balanced
+            if True every group flashes once per sequence, otherwise the
+            groups are drawn with repetition
+        * seq_len
+            number of flashes per sequence, default nr_groups
+        * members
+            list with the members of every group, groups sharing a member
+            conflict. If None only equal groups conflict.
+        * seed
+            seed of the random number generator
+        """
+        if seq_len is None:
+            seq_len = nr_groups
+        if balanced and seq_len > nr_groups:
+            raise ValueError("A balanced sequence has at most %d flashes" % nr_groups)
+        self.nr_groups = nr_groups
+        self.nr_sequences = nr_sequences
+        self.min_dist = min_dist
+        self.balanced = balanced
+        self.seq_len = seq_len
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.random = numpy.random.RandomState(seed)
+        self.conflicts = numpy.eye(nr_groups, dtype=bool)
+        self.overlapping = members is not None
+        if members is not None:
+            members = [set(m) for m in members]
+            for i in range(nr_groups):
+                for j in range(nr_groups):
+                    self.conflicts[i, j] = bool(members[i] & members[j])
+        self._conflict_lists = self.conflicts.tolist()
+
+    def trial(self):
+        """Return the flashes of a trial as array of nr_sequences * seq_len
+        group indices."""
+        n, m = self.seq_len, self.min_dist
+        if not self.balanced:
+            return self._draw(self.nr_sequences * n, [])
+        flashes = numpy.empty(self.nr_sequences * n, dtype=int)
+        if m == 0:
+            flashes[:] = self._permutations(self.nr_sequences).ravel()
+            return flashes
+        # one batch for all sequences, only the flashes at the boundary to
+        # the previous sequence are checked per sequence
+        size = TRIAL_BATCH_SIZE
+        candidates = self._permutations(self.nr_sequences * size)
+        if self.overlapping:
+            valid = self._valid(candidates, numpy.zeros(0, dtype=int))
+        else:
+            # permutations never repeat a group
+            valid = numpy.ones(len(candidates), dtype=bool)
+        valid = valid.reshape(self.nr_sequences, size)
+        candidates = candidates.reshape(self.nr_sequences, size, n)
+        for s in range(self.nr_sequences):
+            tail = flashes[max(s * n - m, 0):s * n].tolist()
+            for i in numpy.flatnonzero(valid[s]):
+                if not self._conflicting(tail, candidates[s, i, :m].tolist()):
+                    flashes[s * n:(s + 1) * n] = candidates[s, i]
+                    break
+            else:
+                flashes[s * n:(s + 1) * n] = self.sequence(tail)
+        return flashes
+
+    def sequence(self, tail=()):
+        """
+        Return the flashes of one sequence.
+        * tail
+            the flashes preceding the sequence, only the last min_dist are
+            relevant
+        """
+        tail = numpy.asarray(tail, dtype=int)[max(len(tail) - self.min_dist, 0):]
+        if not self.balanced:
+            return self._draw(self.seq_len, tail.tolist())
+        if self.min_dist == 0:
+            return self._permutations(1)[0]
+        for _ in range(self.max_batches):
+            candidates = self._permutations(self.batch_size)
+            valid = numpy.flatnonzero(self._valid(candidates, tail))
+            if len(valid):
+                return candidates[valid[0]]
+        raise ValueError("No flash sequence with min_dist %d found" % self.min_dist)
+
+    def _draw(self, count, tail):
+        """Draw count flashes with repetition, each one uniformly from the
+        groups not conflicting with the previous min_dist flashes."""
+        m = self.min_dist
+        conflicts = self._conflict_lists
+        groups = range(self.nr_groups)
+        flashes = list(tail)
+        for u in self.random.random_sample(count):
+            recent = flashes[max(len(flashes) - m, 0):] if m else []
+            allowed = [g for g in groups
+                       if not [r for r in recent if conflicts[r][g]]]
+            if not allowed:
+                raise ValueError("No flash with min_dist %d found" % m)
+            flashes.append(allowed[int(u * len(allowed))])
+        return numpy.array(flashes[len(tail):], dtype=int)
+
+    def _conflicting(self, tail, head):
+        """Return True if a flash of head is too close to a conflicting flash
+        of tail."""
+        conflicts = self._conflict_lists
+        k = len(tail)
+        for i, a in enumerate(tail):
+            for b in head[:self.min_dist - k + i + 1]:
+                if conflicts[a][b]:
+                    return True
+        return False
+
+    def _permutations(self, size):
+        """Return size random permutations, truncated to seq_len."""
+        keys = self.random.random_sample((size, self.nr_groups))
+        return keys.argsort(axis=1)[:, :self.seq_len]
+
+    def _valid(self, candidates, tail):
+        """Return a boolean mask of the candidates satisfying min_dist."""
+        size = len(candidates)
+        k = len(tail)
+        flashes = numpy.hstack((numpy.tile(tail, (size, 1)), candidates))
+        end = flashes.shape[1]
+        valid = numpy.ones(size, dtype=bool)
+        for d in range(1, self.min_dist + 1):
+            # pairs d flashes apart with at least one flash of the candidate
+            start = max(k - d, 0)
+            if start + d >= end:
+                break
+            pairs = self.conflicts[flashes[:, start:end - d], flashes[:, start + d:end]]
+            valid &= ~pairs.any(axis=1)
+        return valid
+
+
+class FlashSequencePool(object):
+    """
+    Keeps trials of a FlashSequenceGenerator precomputed by a background
+    thread.
+    """
+
+    def __init__(self, generator, size=POOL_SIZE):
+        """
+        * generator
+            FlashSequenceGenerator, only used by the pool from now on
+        * size
+            number of trials kept precomputed
+        """
+        self.logger = logging.getLogger("FlashSequencePool")
+        self.generator = generator
+        self.size = size
+        # trials taken from the queue and generated on demand
+        self.hits = 0
+        self.misses = 0
+        self._queue = deque()
+        self._closed = False
+        self._cond = Condition()
+        self._generator_lock = Lock()
+        self._thread = Thread(target=self._fill_loop, name="FlashSequencePool")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def get(self):
+        """Return the flashes of the next trial, generated on demand if no
+        trial is precomputed."""
+        self._cond.acquire()
+        try:
+            if self._queue:
+                self.hits += 1
+                self._cond.notify()
+                return self._queue.popleft()
+            self.misses += 1
+        finally:
+            self._cond.release()
+        return self._generate()
+
+    def available(self):
+        """Return the number of precomputed trials."""
+        return len(self._queue)
+
+    def close(self):
+        """Stop the thread."""
+        self._cond.acquire()
+        try:
+            self._closed = True
+            self._cond.notify()
+        finally:
+            self._cond.release()
+        self._thread.join()
+
+    def _generate(self):
+        self._generator_lock.acquire()
+        try:
+            return self.generator.trial()
+        finally:
+            self._generator_lock.release()
+
+    def _fill_loop(self):
+        while True:
+            self._cond.acquire()
+            try:
+                while len(self._queue) >= self.size and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+            finally:
+                self._cond.release()
+            try:
+                trial = self._generate()
+            except:
+                # get generates the trials and raises the error from now on
+                self.logger.exception("Generating a flash sequence failed:")
+                return
+            self._cond.acquire()
+            try:
+                self._queue.append(trial)
+            finally:
+                self._cond.release()
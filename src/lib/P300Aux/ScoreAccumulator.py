@@ -0,0 +1,205 @@
+# ScoreAccumulator.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""
+ScoreAccumulator.py
+
+Accumulates the classifier outputs of an ERP speller trial per class and
+decides when the trial can be stopped early.
+
+Usage::
+
+    acc = ScoreAccumulator(n_classes=6, max_sequences=10)
+    rule = make_stopping_rule('margin', 0.5, min_sequences=3)
+    ...
+    acc.add(cls, score)                 # for every classifier output
+    if rule(acc):
+        classified = acc.best()
+    ...
+    acc.reset()                         # for the next trial
+
+Adding a score is constant-time: besides storing the score, the accumulator
+updates the running sums, so means and variances need no pass over the
+scores. By default a lower score means a more likely target, as with the
+LDA outputs of the spellers.
+"""
+
+
+import numpy
+
+
+class ScoreAccumulator(object):
+    """
+    Classifier scores of one trial in a preallocated (n_classes,
+    max_sequences) array with running sums per class.
+    """
+
+    def __init__(self, n_classes, max_sequences, minimize=True):
+        """
+        * n_classes
+            number of classes (stimuli) of the trial
+        * max_sequences
+            number of scores stored per class, further scores only enter
+            the running sums
+        * minimize
+            if True the class with the lowest mean score is the best
+        """
+        self.n_classes = n_classes
+        self.max_sequences = max_sequences
+        self.minimize = minimize
+        self.scores = numpy.zeros((n_classes, max_sequences))
+        self.counts = numpy.zeros(n_classes, dtype=int)
+        self.sums = numpy.zeros(n_classes)
+        self.sumsquares = numpy.zeros(n_classes)
+        self.total = 0
+
+    def reset(self):
+        """Remove all scores, keeps the storage."""
+        self.counts[:] = 0
+        self.sums[:] = 0.0
+        self.sumsquares[:] = 0.0
+        self.total = 0
+
+    def add(self, cls, score):
+        """
+        Add the classifier output of one stimulus.
+        * cls
+            class index between 0 and n_classes - 1
+        * score
+            classifier output
+        """
+        n = self.counts[cls]
+        if n < self.max_sequences:
+            self.scores[cls, n] = score
+        self.counts[cls] = n + 1
+        self.sums[cls] += score
+        self.sumsquares[cls] += score * score
+        self.total += 1
+
+    def complete_sequences(self):
+        """Return the number of sequences with a score for every class."""
+        return int(self.counts.min())
+
+    def means(self):
+        """Return the mean score per class, 0 for classes without scores."""
+        return self.sums / numpy.maximum(self.counts, 1)
+
+    def variances(self):
+        """Return the unbiased variance per class, 0 for classes with less
+        than two scores."""
+        n = self.counts
+        means = self.means()
+        var = (self.sumsquares - n * means * means) / numpy.maximum(n - 1, 1)
+        var[n < 2] = 0.0
+        return numpy.maximum(var, 0.0)
+
+    def ranked(self):
+        """Return the class indices ordered from best to worst mean."""
+        means = self.means()
+        if not self.minimize:
+            means = -means
+        # a stable sort keeps the lower index first for equal means
+        return numpy.argsort(means, kind='mergesort')
+
+    def best(self):
+        """Return the index of the class with the best mean score."""
+        return int(self.ranked()[0])
+
+
+class MarginRule(object):
+    """
+    Stop when the mean of the best class is better than the mean of the
+    runner-up by at least margin.
+    """
+
+    def __init__(self, margin, min_sequences=1):
+        self.margin = margin
+        self.min_sequences = min_sequences
+
+    def __call__(self, acc):
+        if acc.complete_sequences() < self.min_sequences:
+            return False
+        first, second = acc.ranked()[:2]
+        means = acc.means()
+        return abs(means[second] - means[first]) >= self.margin
+
+
+class TTestRule(object):
+    """
+    Stop when Welch's t statistic between the best class and the runner-up
+    is at least threshold.
+    """
+
+    def __init__(self, threshold, min_sequences=2):
+        self.threshold = threshold
+        self.min_sequences = max(min_sequences, 2)
+
+    def __call__(self, acc):
+        if acc.complete_sequences() < self.min_sequences:
+            return False
+        first, second = acc.ranked()[:2]
+        means, var, n = acc.means(), acc.variances(), acc.counts
+        se = numpy.sqrt(var[first] / n[first] + var[second] / n[second])
+        diff = abs(means[second] - means[first])
+        if se == 0:
+            return diff > 0
+        return diff / se >= self.threshold
+
+
+class PosteriorRule(object):
+    """
+    Stop when the posterior probability of the best class is at least
+    threshold. The scores are treated as log-likelihood ratios divided by
+    scale, so the evidence of all scores of a class adds up.
+    """
+
+    def __init__(self, threshold, min_sequences=1, scale=1.0):
+        self.threshold = threshold
+        self.min_sequences = min_sequences
+        self.scale = scale
+
+    def posteriors(self, acc):
+        """Return the posterior probability of every class."""
+        evidence = acc.sums / self.scale
+        if acc.minimize:
+            evidence = -evidence
+        p = numpy.exp(evidence - evidence.max())
+        return p / p.sum()
+
+    def __call__(self, acc):
+        if acc.complete_sequences() < self.min_sequences:
+            return False
+        return self.posteriors(acc).max() >= self.threshold
+
+
+STOPPING_RULES = {'margin' : MarginRule,
+                  'ttest' : TTestRule,
+                  'posterior' : PosteriorRule}
+
+
+def make_stopping_rule(name, threshold, min_sequences=1):
+    """
+    Return the early stopping rule with the given name ('margin', 'ttest' or
+    'posterior') or None if name is None.
+    """
+    if name is None:
+        return None
+    try:
+        rule = STOPPING_RULES[name]
+    except KeyError:
+        raise ValueError("Unknown stopping rule: %s" % name)
+    return rule(threshold, min_sequences)
@@ -41,6 +41,7 @@ Circle objects have the following features:
 """
 import math
 import pygame
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 class Circle(VisualElement):
@@ -99,9 +100,8 @@ class Circle(VisualElement):
             else: circular_offset = self.circular_offset # Take standard value
             
             # Create the text elements "
-            font = pygame.font.Font(None, textsize)
             if not circular_layout:  # Just normal text
-                textimage = font.render(text, self.antialias, textcolor);
+                textimage = text_cache.render(text, textsize, textcolor, self.antialias)
                 textrect = textimage.get_rect()
                 w2, h2 = textrect.width / 2, textrect.height / 2
             else:
@@ -115,7 +115,7 @@ class Circle(VisualElement):
                     theta = angDistance * j + circular_offset
                     x = (radius - textsize / 2) * math.cos(theta) + radius
                     y = (radius - textsize / 2) * math.sin(theta) + radius
-                    self.textimages[j] = font.render(text[j], self.antialias, color_now)
+                    self.textimages[j] = text_cache.render(text[j], textsize, color_now, self.antialias)
                     self.textrects[j] = self.textimages[j].get_rect(center=(x, y))
                     # Save the letter positions for state=0
                     if i == 0: self.letter_pos.append((x, y))
@@ -48,6 +48,7 @@ import math
 
 import pygame
 
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 
@@ -106,9 +107,8 @@ class Hexagon(VisualElement):
             else: circular_offset = self.circular_offset # Take standard value
             
             # Get the text image
-            font = pygame.font.Font(None, textsize)
             if not self.circular_layout:  # Just normal text
-                textimage = font.render(text, self.antialias, textcolor);
+                textimage = text_cache.render(text, textsize, textcolor, self.antialias)
                 textrect = textimage.get_rect()
                 w2, h2 = textrect.width / 2, textrect.height / 2
             else:
@@ -122,7 +122,7 @@ class Hexagon(VisualElement):
                     theta = angDistance * j + circular_offset
                     x = (radius - textsize / 2) * math.cos(theta) + radius
                     y = (radius - textsize / 2) * math.sin(theta) + radius
-                    self.textimages[j] = font.render(text[j], self.antialias, color_now)
+                    self.textimages[j] = text_cache.render(text[j], textsize, color_now, self.antialias)
                     self.textrects[j] = self.textimages[j].get_rect(center=(x, y))
 
             # Draw hexagon fill
@@ -31,6 +31,7 @@ Rectangle objects have the following features:
 
 import pygame
 
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 
@@ -74,8 +75,7 @@ class Rectangle(VisualElement):
 
             width, height = size
             # Get the text image
-            font = pygame.font.Font(None, textsize)
-            textimage = font.render(text, self.textantialias, textcolor);
+            textimage = text_cache.render(text, textsize, textcolor, self.textantialias)
             if self.antialias is not None:
                 textimage = pygame.transform.rotate(textimage, rotate)
             textrect = textimage.get_rect()
@@ -34,6 +34,7 @@ t = P300Text(text="A",size=30)
     
 import pygame
 
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 
@@ -60,6 +61,5 @@ class Text(VisualElement):
             else: color = self.color          # Take standard value
             if self.states[i].has_key("size"):    size = self.states[i]["size"]
             else: size = self.size            # Take standard value
-            font = pygame.font.Font(None, size)
-            self.images[i] = font.render(text, True, color);
+            self.images[i] = text_cache.render(text, size, color)
             self.rects[i] = self.images[i].get_rect(center=self.pos)
\ No newline at end of file
@@ -37,6 +37,7 @@ its features manually and calling refresh.
     
 import pygame
 
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 
@@ -63,7 +64,7 @@ class Textbox(VisualElement):
         self.marge = 4          # marge between text and the box boundaries
 
     def refresh(self):
-        font = pygame.font.Font(None, self.textsize)
+        font = text_cache.font(self.textsize)
         boxw, boxh = self.size
         lines = []
         # To process enforced linebreaks, split according to '\n's
@@ -88,7 +89,7 @@ class Textbox(VisualElement):
                     if w >= boxw - self.marge: text.insert(0, word)
                     else:       # Finished
                         oldtext = linetext 
-                lines.append(font.render(oldtext, self.antialias, self.color))
+                lines.append(text_cache.render(oldtext, self.textsize, self.color, self.antialias))
                 currenth += h
 
         # Blit them together
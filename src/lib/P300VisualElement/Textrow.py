@@ -42,6 +42,7 @@ its features manually and calling refresh.
     
 import pygame
 
+from FeedbackBase.PygameFeedback import text_cache
 from VisualElement import VisualElement
 
 
@@ -73,8 +74,6 @@ class Textrow(VisualElement):
         self.leftmarge = 4          # marge between text and the left box boundaries
 
     def refresh(self):
-        font = pygame.font.Font(None, self.textsize)
-        hi_font = pygame.font.Font(None, self.highlight_size) 
         boxw, boxh = self.size
         chunks = []
         if self.highlight is not None:
@@ -82,11 +81,11 @@ class Textrow(VisualElement):
             for pos in range(len(self.text)):
                 letter = self.text[pos]
                 if pos in self.highlight:
-                    chunks.append(hi_font.render(letter, self.antialias, self.highlight_color))
+                    chunks.append(text_cache.render(letter, self.highlight_size, self.highlight_color, self.antialias))
                 else:
-                    chunks.append(font.render(letter, self.antialias, self.color))
+                    chunks.append(text_cache.render(letter, self.textsize, self.color, self.antialias))
         else:
-            chunks.append(font.render(self.text, self.antialias, self.color)) # render whole text
+            chunks.append(text_cache.render(self.text, self.textsize, self.color, self.antialias)) # render whole text
             
         # Prepare surface & draw border
         self.image = pygame.Surface(self.size)
@@ -19,6 +19,7 @@
 import sys
 import os
 import logging
+from threading import Thread, Lock
 
 
 def import_module_and_get_class(modname, classname):
@@ -38,12 +39,25 @@ class PluginController(object):
     """Finds, loads and unloads plugins."""
 
 
-    def __init__(self, plugindirs, baseclass):
+    def __init__(self, plugindirs, baseclass, index=None):
+        """Initialize the Plugin Controller.
+
+        :param plugindirs: Directories to search for plugins
+        :type plugindirs: list
+        :param baseclass: Base class of the plugins
+        :param index: Index to remember the plugins between runs, if None the
+            plugin directories are searched from scratch every time.
+        :type index: :class:`lib.pluginindex.PluginIndex`
+
+        """
         self.logger = logging.getLogger("PluginController")
         self.plugindirs = map(os.path.normpath, map(os.path.abspath, plugindirs))
         self.baseclass = baseclass
         self.availablePlugins = dict()
         self.oldModules = None
+        self.index = index
+        self.refreshThread = None
+        self.refreshLock = Lock()
 
         for dir in plugindirs:
             if os.path.exists(dir):
@@ -52,12 +66,65 @@ class PluginController(object):
                 self.logger.warning("Path %s does not exist, ignoring it" % str(dir))
 
 
-    def find_plugins(self):
+    def find_plugins(self, background=False):
         """Find Plugins.
 
-        :returns: list of available plugins.
+        If the Plugin Controller has an index which knows all plugin
+        directories and background is True, the plugins of the last run are
+        available immediately and the index is refreshed in a background
+        thread.
+
+        :param background: Refresh the index in a background thread
+        :type background: bool
 
         """
+        if self.index is None:
+            self._walk_plugins()
+            return
+        self.index.load()
+        cached = dict()
+        for plugindir in self.plugindirs:
+            plugins = self.index.cached(plugindir)
+            if plugins is None:
+                background = False
+                break
+            cached.update(plugins)
+        if not background:
+            self.refresh_plugins()
+            return
+        self.availablePlugins = cached
+        self.refreshThread = Thread(target=self.refresh_plugins, name="PluginIndex")
+        self.refreshThread.setDaemon(True)
+        self.refreshThread.start()
+
+
+    def refresh_plugins(self):
+        """Rescan the changed parts of the plugin directories and update the
+        index."""
+        self.refreshLock.acquire()
+        try:
+            plugins = dict()
+            for plugindir in self.plugindirs:
+                plugins.update(self.index.scan(plugindir, self.load_feedback_list))
+            self.availablePlugins = plugins
+            self.index.save()
+        finally:
+            self.refreshLock.release()
+
+
+    def is_refreshing(self):
+        """Return True while the index is refreshed in the background."""
+        return self.refreshThread is not None and self.refreshThread.isAlive()
+
+
+    def wait_for_refresh(self):
+        """Wait until the background refresh of the index is finished."""
+        if self.refreshThread:
+            self.refreshThread.join()
+
+
+    def _walk_plugins(self):
+        """Find the plugins by walking through the plugin directories."""
         for plugindir in self.plugindirs:
             for root, dirs, files in os.walk(plugindir):
                 if 'feedbacks.list' in files:
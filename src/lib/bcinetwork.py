@@ -61,10 +61,13 @@ class BciNetwork(object):
         if protocol == 'json':
             self.xmlencoder = bcixml.JsonEncoder()
             self.xmldecoder = bcixml.JsonDecoder()
+        elif protocol == 'binary':
+            self.xmlencoder = bcixml.BinaryEncoder()
+            self.xmldecoder = bcixml.BinaryDecoder()
         else:
             # tobi and bcixml share the same encoder
-            self.xmlencoder = bcixml.XmlEncoder()
-            self.xmldecoder = bcixml.XmlDecoder()
+            self.xmlencoder = bcixml.CachingXmlEncoder()
+            self.xmldecoder = bcixml.FastXmlDecoder()
 
 
     def getAvailableFeedbacks(self):
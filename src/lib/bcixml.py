@@ -20,7 +20,13 @@
 
 import logging
 import sys
+from collections import OrderedDict
+import struct
 from xml.dom import minidom, Node
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
 import json
 
 from lib import pylibtobiic
@@ -71,6 +77,42 @@ CMD_SAVE_VARIABLES = 'savevariables'
 CMD_LOAD_VARIABLES = 'loadvariables'
 CMD_QUIT_FEEDBACK_CONTROLLER = 'quitfeedbackcontroller'
 
+SIGNAL_TYPES = (INTERACTION_SIGNAL, CONTROL_SIGNAL, REPLY_SIGNAL)
+
+# Usual key of the classifier output in control signals
+CL_OUTPUT = "cl_output"
+# Key of batched control signals: the value is a list of (timestamp,
+# cl_output) tuples, oldest first
+CL_BATCH = "cl_batch"
+
+# Maximum number of templates cached by the CachingXmlEncoder
+TEMPLATE_CACHE_SIZE = 128
+
+# Binary protocol
+BINARY_MAGIC = "BCI"
+BINARY_VERSION = 1
+BINARY_SUPPORTED_VERSIONS = (1,)
+
+# Type tags of the binary protocol, every byte below BIN_NONE is a positive
+# fixint
+BIN_NONE = "\xc0"
+BIN_FALSE = "\xc2"
+BIN_TRUE = "\xc3"
+BIN_FLOAT = "\xcb"
+BIN_INT32 = "\xd2"
+BIN_INT64 = "\xd3"
+BIN_LONG = "\xd4"
+BIN_COMPLEX = "\xd5"
+BIN_STR = "\xd9"
+BIN_UNICODE = "\xda"
+BIN_UNSUPPORTED = "\xdb"
+BIN_LIST = "\xdc"
+BIN_TUPLE = "\xdd"
+BIN_SET = "\xde"
+BIN_FROZENSET = "\xdf"
+BIN_DICT = "\xe0"
+BIN_FLOAT_LIST = "\xe1"
+
 
 class XmlDecoder(object):
     """Parses XML strings and returns BciSignal containing the data of the
@@ -217,6 +259,124 @@ class XmlDecoder(object):
 
         return None
 
+class FastXmlDecoder(XmlDecoder):
+    """Parses XML strings using ElementTree and returns BciSignal containing
+    the data of the signal.
+
+    This decoder produces the same BciSignals as :class:`XmlDecoder` but
+    avoids building a DOM tree for every packet. If the fast path fails for
+    any other reason than an invalid signal, the packet is handed over to the
+    minidom based decoder which validates it and raises the appropriate
+    error.
+
+    Usage::
+
+        decoder = FastXmlDecoder()
+        try:
+            bcisignal = decoder.decode_packet(xml)
+        except DecodingError:
+            ...
+
+    """
+
+
+    def __init__(self):
+        XmlDecoder.__init__(self)
+        self.logger = logging.getLogger("FastXmlDecoder")
+
+
+    def decode_packet(self, packet):
+        """Parse the XML string and return a BciSignal.
+
+        :param packet: XML Packet
+        :type packet: str
+        :returns: BciSignal
+        :raises: A DecodingError is raised when the parsing of the packet failed.
+
+        """
+        try:
+            return self.__decode_packet(packet)
+        except DecodingError:
+            raise
+        except Exception:
+            return XmlDecoder.decode_packet(self, packet)
+
+
+    def __decode_packet(self, packet):
+        root = ElementTree.fromstring(packet)
+        l = []    # for the variables
+        c = []    # for the commands
+        t = None  # for the type
+        for node in root:
+            if node.tag in SIGNAL_TYPES:
+                t = unicode(node.tag)
+            else:
+                self.logger.warning("Received a signal which contains neither an interaction- nor a control-signal. (%s)" % str(node.tag))
+                raise DecodingError("Received a signal which contains neither an interaction- nor a control-signal. (%s)" % str(node.tag))
+            for node2 in node:
+                type, value = self.__parse_element(node2)
+                if type == VARIABLE:
+                    l.append(value)
+                else:
+                    c.append(value)
+        return BciSignal(dict(l), c, t)
+
+
+    def __parse_element(self, element):
+        """Parse the element and return a tuple (kind, data)."""
+        type = element.tag
+        name = self.__get(element, NAME)
+        if type in _CONTAINER_TYPES:
+            l = [self.__parse_element(node)[-1][-1] for node in element]
+            return VARIABLE, (name, _CONTAINER_TYPES[type](l))
+        value = self.__get(element, VALUE)
+        convert = _SCALAR_TYPES.get(type)
+        if convert is not None:
+            return VARIABLE, (name, convert(value))
+        elif type in BOOLEAN_TYPE:
+            if value in TRUE_VALUE:
+                return VARIABLE, (name, True)
+            elif value in FALSE_VALUE:
+                return VARIABLE, (name, False)
+            else:
+                raise DecodingError("Unknown boolean value: %s" % str(value))
+        elif type in COMPLEX_TYPE:
+            if value.startswith("(") and value.endswith(")"):
+                value = value[1:-1]
+            return VARIABLE, (name, complex(value))
+        elif type in NONE_TYPE:
+            return VARIABLE, (name, None)
+        elif type in UNSUPPORTED_TYPE:
+            return VARIABLE, (name, value)
+        elif type in COMMAND_TYPE:
+            d = dict()
+            # should only be one child node, since we allow only 1 kwargs-dict
+            # per command
+            for node in element:
+                d = self.__parse_element(node)[-1][-1]
+            return COMMAND, (value, d)
+        raise DecodingError("Unknown type: %s" % str(type))
+
+
+    def __get(self, element, what):
+        """Return the 'what' of the element or None if not given."""
+        value = element.get(what)
+        if value is not None:
+            return unicode(value)
+        for node in element:
+            if node.tag == what:
+                # only the text directly inside the node counts, like
+                # in the minidom decoder
+                content = ""
+                if node.text:
+                    content += unicode(node.text)
+                for child in node:
+                    if child.tail:
+                        content += unicode(child.tail)
+                return content
+        return None
+
+
 class TobiXmlDecoder(XmlDecoder):
     """TobiXmlDecoder.
 
@@ -385,6 +545,140 @@ class XmlEncoder(object):
         root.appendChild(e)
 
 
+class CachingXmlEncoder(XmlEncoder):
+    """Generates an XML string from a BciSignal object using cached templates.
+
+    Signals with the same type, commands and variables (names and types,
+    including the structure of nested containers) share a compiled template,
+    only the values are filled in via direct string building. The number of
+    cached templates is bounded, the least recently used ones are dropped
+    first.
+
+    The output is equivalent to the one of :class:`XmlEncoder`, the only
+    difference is that the variables are written sorted by name.
+
+    Usage::
+
+        enc = CachingXmlEncoder()
+        try:
+            xml = enc.encode_packet(bcisignal)
+        except EncodingError:
+            ...
+
+    """
+
+    def __init__(self, maxsize=TEMPLATE_CACHE_SIZE):
+        """Initialize the encoder.
+
+        :param maxsize: Maximum number of cached templates
+        :type maxsize: int
+
+        """
+        XmlEncoder.__init__(self)
+        self.logger = logging.getLogger("CachingXmlEncoder")
+        self.maxsize = maxsize
+        self.templates = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def encode_packet(self, signal):
+        """Generates an XML packet from a BciSignal object.
+
+        :param signal: Signal
+        :type signal: BciSignal
+        :raises: An EncodingError is raised if the encoding failed.
+        """
+        if signal.type not in SIGNAL_TYPES:
+            raise EncodingError("Unknown signal type: %s" % str(signal.type))
+        # Collect the values and the signature of the signal in one go, the
+        # values are stored in the order they appear in the template
+        values = []
+        commands = []
+        for command, args in signal.commands:
+            values.append(_escape(unicode(str(command))))
+            commands.append(self.__walk(args, values) if args else None)
+        data = []
+        for name in sorted(signal.data):
+            data.append((name, self.__walk(signal.data[name], values)))
+        key = (signal.type, tuple(commands), tuple(data))
+        template = self.templates.pop(key, None)
+        if template is None:
+            self.misses += 1
+            template = self.__compile(key)
+            if len(self.templates) >= self.maxsize:
+                self.templates.popitem(last=False)
+        else:
+            self.hits += 1
+        self.templates[key] = template
+        return (template % tuple(values)).encode('utf-8')
+
+    def __get_type(self, value):
+        type = _ENCODER_TYPES.get(value.__class__)
+        if type is None:
+            type = self._XmlEncoder__get_type(value)
+        return type
+
+    def __walk(self, value, values):
+        """Append the values of value to values and return its signature."""
+        type = self.__get_type(value)
+        if type in (LIST_TYPE, TUPLE_TYPE, SET_TYPE, FROZENSET_TYPE):
+            return (type[0], tuple([self.__walk(v, values) for v in value]))
+        elif type == DICT_TYPE:
+            # each key-value pair is stored as a tuple, pairs with
+            # unsupported values are ignored
+            return (type[0], tuple([self.__walk(i, values) for i in value.items()
+                                    if self.__get_type(i[1]) != UNSUPPORTED_TYPE]))
+        elif value != None:
+            values.append(_escape(unicode(value)))
+        return type[0]
+
+    def __compile(self, key):
+        """Compile the template for the signature key."""
+        type, commands, data = key
+        out = []
+        for args in commands:
+            if args is None:
+                out.append('<%s %s="%%s"/>' % (COMMAND_TYPE[0], VALUE))
+            else:
+                out.append('<%s %s="%%s">' % (COMMAND_TYPE[0], VALUE))
+                self.__compile_element(None, args, out)
+                out.append('</%s>' % COMMAND_TYPE[0])
+        for name, signature in data:
+            self.__compile_element(name, signature, out)
+        head = u'<?xml version="1.0" encoding="utf-8"?><%s %s="%s">' % (XML_ROOT, VERSION, CURRENT_VERSION)
+        if out:
+            body = u'<%s>%s</%s>' % (type, "".join(out), type)
+        else:
+            body = u'<%s/>' % type
+        return head + body + u'</%s>' % XML_ROOT
+
+    def __compile_element(self, name, signature, out):
+        if isinstance(signature, tuple):
+            tag, children = signature
+        else:
+            tag, children = signature, None
+        attrs = u''
+        if name:
+            attrs = u' %s="%s"' % (NAME, _escape(unicode(name)).replace('%', '%%'))
+        if children is None:
+            if tag == NONE_TYPE[0]:
+                out.append(u'<%s%s/>' % (tag, attrs))
+            else:
+                out.append(u'<%s%s %s="%%s"/>' % (tag, attrs, VALUE))
+        elif not children:
+            out.append(u'<%s%s/>' % (tag, attrs))
+        else:
+            out.append(u'<%s%s>' % (tag, attrs))
+            for child in children:
+                self.__compile_element(None, child, out)
+            out.append(u'</%s>' % tag)
+
+
+def _escape(s):
+    """Escape s for the usage in an XML attribute value."""
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace('"', "&quot;").replace(">", "&gt;")
+
+
 class JsonDecoder(object):
     """Decode JSON strings into BciSignal objects."""
 
@@ -476,14 +770,248 @@ class JsonEncoder(object):
             a JSON formatted string.
 
         """
-        bcisignal_stripped = self.strip(bcisignal)
         signaldict = dict()
-        signaldict['data'] = bcisignal_stripped.data
-        signaldict['commands'] = bcisignal_stripped.commands
-        signaldict['type'] = bcisignal_stripped.type
+        signaldict['data'] = bcisignal.data
+        signaldict['commands'] = bcisignal.commands
+        signaldict['type'] = bcisignal.type
         if signaldict['type'] not in [INTERACTION_SIGNAL, CONTROL_SIGNAL, REPLY_SIGNAL]:
             raise EncodingError("Signal type is %s is not supported" % signaldict['type'])
-        return json.dumps(signaldict)
+        # Usually everything is convertible, strip only if necessary
+        try:
+            return json.dumps(signaldict)
+        except (TypeError, ValueError):
+            signaldict['data'] = self.strip(bcisignal).data
+            return json.dumps(signaldict)
+
+
+class BinaryDecoder(object):
+    """Decode packets in the compact binary format into BciSignal objects.
+
+    See :class:`BinaryEncoder` for a description of the format.
+
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('BinaryDecoder')
+
+    def decode_packet(self, packet):
+        """Decode the binary packet into a `BciSignal` object.
+
+        :param packet: Binary packet
+        :type packet: str
+        :returns: BciSignal
+        :raises: A DecodingError is raised when the parsing of the packet failed.
+
+        """
+        try:
+            magic, version, type = _BIN_HEADER.unpack_from(packet)
+        except struct.error:
+            raise DecodingError("Packet too short for a binary signal.")
+        if magic != BINARY_MAGIC:
+            raise DecodingError("Not a binary signal.")
+        if version not in BINARY_SUPPORTED_VERSIONS:
+            raise DecodingError("Unsupported binary signal version: %i" % version)
+        if type >= len(SIGNAL_TYPES):
+            raise DecodingError("Unknown signal type: %i" % type)
+        try:
+            commands, offset = self.__decode(packet, _BIN_HEADER.size)
+            data, offset = self.__decode(packet, offset)
+        except (struct.error, IndexError, UnicodeDecodeError), e:
+            raise DecodingError("Truncated or corrupt binary signal (%s)" % str(e))
+        if offset != len(packet):
+            raise DecodingError("Trailing bytes after binary signal.")
+        if not isinstance(commands, list) or not isinstance(data, dict):
+            raise DecodingError("Malformed binary signal.")
+        return BciSignal(data, commands, SIGNAL_TYPES[type])
+
+    def __decode(self, packet, offset):
+        """Decode the value at offset and return it and the new offset."""
+        tag = packet[offset]
+        if tag < BIN_NONE:
+            # positive fixint
+            return ord(tag), offset + 1
+        decode = self.__decoders.get(tag)
+        if decode is None:
+            raise DecodingError("Unknown type tag: %r" % tag)
+        return decode(self, packet, offset + 1)
+
+    def __decode_none(self, packet, offset):
+        return None, offset
+
+    def __decode_false(self, packet, offset):
+        return False, offset
+
+    def __decode_true(self, packet, offset):
+        return True, offset
+
+    def __decode_int32(self, packet, offset):
+        return _BIN_INT32.unpack_from(packet, offset)[0], offset + 4
+
+    def __decode_int64(self, packet, offset):
+        return int(_BIN_INT64.unpack_from(packet, offset)[0]), offset + 8
+
+    def __decode_float(self, packet, offset):
+        return _BIN_FLOAT.unpack_from(packet, offset)[0], offset + 8
+
+    def __decode_complex(self, packet, offset):
+        real, imag = _BIN_COMPLEX.unpack_from(packet, offset)
+        return complex(real, imag), offset + 16
+
+    def __decode_bytes(self, packet, offset):
+        n = _BIN_LENGTH.unpack_from(packet, offset)[0]
+        offset += 4
+        s = packet[offset:offset+n]
+        if len(s) != n:
+            raise DecodingError("Truncated string in binary signal.")
+        return s, offset + n
+
+    def __decode_long(self, packet, offset):
+        s, offset = self.__decode_bytes(packet, offset)
+        return long(s), offset
+
+    def __decode_unicode(self, packet, offset):
+        s, offset = self.__decode_bytes(packet, offset)
+        return s.decode('utf-8'), offset
+
+    def __decode_float_list(self, packet, offset):
+        n = _BIN_LENGTH.unpack_from(packet, offset)[0]
+        offset += 4
+        fmt = _BIN_FLOAT_ARRAYS.get(n)
+        if fmt is None:
+            fmt = struct.Struct("!%id" % n)
+        return list(fmt.unpack_from(packet, offset)), offset + fmt.size
+
+    def __decode_container(self, packet, offset):
+        tag = packet[offset-1]
+        n = _BIN_LENGTH.unpack_from(packet, offset)[0]
+        offset += 4
+        l = []
+        for i in xrange(n):
+            value, offset = self.__decode(packet, offset)
+            l.append(value)
+        try:
+            return _BIN_CONTAINERS[tag](l), offset
+        except (TypeError, ValueError), e:
+            # e.g. unhashable set members or malformed dict items
+            raise DecodingError("Malformed container in binary signal (%s)" % str(e))
+
+    __decoders = {BIN_NONE : __decode_none,
+                  BIN_FALSE : __decode_false,
+                  BIN_TRUE : __decode_true,
+                  BIN_INT32 : __decode_int32,
+                  BIN_INT64 : __decode_int64,
+                  BIN_FLOAT : __decode_float,
+                  BIN_COMPLEX : __decode_complex,
+                  BIN_LONG : __decode_long,
+                  BIN_STR : __decode_bytes,
+                  BIN_UNICODE : __decode_unicode,
+                  BIN_UNSUPPORTED : __decode_unicode,
+                  BIN_FLOAT_LIST : __decode_float_list,
+                  BIN_LIST : __decode_container,
+                  BIN_TUPLE : __decode_container,
+                  BIN_SET : __decode_container,
+                  BIN_FROZENSET : __decode_container,
+                  BIN_DICT : __decode_container}
+
+
+class BinaryEncoder(object):
+    """Encode BciSignal objects into a compact binary format.
+
+    Each packet starts with a header consisting of :data:`BINARY_MAGIC`, the
+    format version and the index of the signal type in
+    :data:`SIGNAL_TYPES`. It is followed by the list of commands and the
+    dictionary of variables.
+
+    Every value is preceeded by a one byte type tag, so the format is self
+    describing and supports the same types as :class:`XmlEncoder`. Small non
+    negative integers are stored in the tag itself, other numbers in network
+    byte order, strings as length prefixed (UTF-8) bytes and containers as
+    item count followed by their items, lists of floats as item count
+    followed by an array of doubles. Dictionaries are stored as list of
+    (key, value) tuples. Like in the XML protocol, unsupported values are
+    converted to unicode strings or, inside nested dictionaries, ignored.
+
+    """
+
+    def __init__(self):
+        self.logger = logging.getLogger('BinaryEncoder')
+
+    def encode_packet(self, signal):
+        """Encode BciSignal object into a binary packet.
+
+        :param signal: Signal
+        :type signal: BciSignal
+        :returns: Binary packet
+        :raises: An EncodingError is raised if the encoding failed.
+
+        """
+        if signal.type not in SIGNAL_TYPES:
+            raise EncodingError("Unknown signal type: %s" % str(signal.type))
+        out = [_BIN_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, SIGNAL_TYPES.index(signal.type))]
+        out.append(BIN_LIST + _BIN_LENGTH.pack(len(signal.commands)))
+        for command, args in signal.commands:
+            self.__encode((command, args or dict()), out)
+        # unlike in nested dictionaries, unsupported variables are kept
+        out.append(BIN_DICT + _BIN_LENGTH.pack(len(signal.data)))
+        for i in signal.data.iteritems():
+            self.__encode(i, out)
+        return "".join(out)
+
+    def __encode(self, value, out):
+        """Append the encoded value to out."""
+        cls = value.__class__
+        if cls is int or cls is bool:
+            if value is True:
+                out.append(BIN_TRUE)
+            elif value is False:
+                out.append(BIN_FALSE)
+            elif 0 <= value < 0xc0:
+                out.append(chr(value))
+            elif -0x80000000 <= value <= 0x7fffffff:
+                out.append(BIN_INT32 + _BIN_INT32.pack(value))
+            else:
+                out.append(BIN_INT64 + _BIN_INT64.pack(value))
+        elif cls is float:
+            out.append(BIN_FLOAT + _BIN_FLOAT.pack(value))
+        elif value is None:
+            out.append(BIN_NONE)
+        elif cls is str:
+            out.append(BIN_STR + _BIN_LENGTH.pack(len(value)) + value)
+        elif cls is unicode:
+            s = value.encode('utf-8')
+            out.append(BIN_UNICODE + _BIN_LENGTH.pack(len(s)) + s)
+        elif cls is long:
+            s = str(value)
+            out.append(BIN_LONG + _BIN_LENGTH.pack(len(s)) + s)
+        elif cls is complex:
+            out.append(BIN_COMPLEX + _BIN_COMPLEX.pack(value.real, value.imag))
+        elif cls is dict:
+            items = [i for i in value.iteritems() if self.__supported(i[1])]
+            out.append(BIN_DICT + _BIN_LENGTH.pack(len(items)))
+            for i in items:
+                self.__encode(i, out)
+        elif cls is list and value and all([v.__class__ is float for v in value]):
+            # lists of floats, like most cl_outputs, are stored as array
+            fmt = _BIN_FLOAT_ARRAYS.get(len(value))
+            if fmt is None:
+                fmt = struct.Struct("!%id" % len(value))
+            out.append(BIN_FLOAT_LIST + _BIN_LENGTH.pack(len(value)) + fmt.pack(*value))
+        elif cls in _BIN_CONTAINER_TAGS:
+            out.append(_BIN_CONTAINER_TAGS[cls] + _BIN_LENGTH.pack(len(value)))
+            for v in value:
+                self.__encode(v, out)
+        else:
+            # subclasses of the supported types are stored as their base
+            # type, everything else as unicode string
+            for base in _BIN_BASE_TYPES:
+                if isinstance(value, base):
+                    self.__encode(base(value), out)
+                    return
+            s = unicode(value).encode('utf-8')
+            out.append(BIN_UNSUPPORTED + _BIN_LENGTH.pack(len(s)) + s)
+
+    def __supported(self, value):
+        return value is None or isinstance(value, _BIN_BASE_TYPES)
 
 
 class BciSignal(object):
@@ -518,6 +1046,44 @@ class BciSignal(object):
         return 'Type: %s\nData: %s\nCommands: %s\n' % (self.type, self.data, self.commands)
 
 
+# Lookup tables for the FastXmlDecoder: element name -> conversion
+_SCALAR_TYPES = dict()
+for _types, _convert in ((INTEGER_TYPE, int), (FLOAT_TYPE, float),
+                         (LONG_TYPE, long), (STRING_TYPE, str),
+                         (UNICODE_TYPE, unicode)):
+    for _type in _types:
+        _SCALAR_TYPES[_type] = _convert
+_CONTAINER_TYPES = dict()
+for _types, _convert in ((LIST_TYPE, list), (TUPLE_TYPE, tuple),
+                         (SET_TYPE, set), (FROZENSET_TYPE, frozenset),
+                         (DICT_TYPE, dict)):
+    for _type in _types:
+        _CONTAINER_TYPES[_type] = _convert
+del _types, _type, _convert
+# Lookup table for the CachingXmlEncoder: exact class -> type
+_ENCODER_TYPES = {bool : BOOLEAN_TYPE, int : INTEGER_TYPE, float : FLOAT_TYPE,
+                  long : LONG_TYPE, complex : COMPLEX_TYPE, str : STRING_TYPE,
+                  unicode : UNICODE_TYPE, list : LIST_TYPE, tuple : TUPLE_TYPE,
+                  set : SET_TYPE, frozenset : FROZENSET_TYPE, dict : DICT_TYPE,
+                  type(None) : NONE_TYPE}
+# Lookup tables for the BinaryEncoder and -Decoder
+_BIN_HEADER = struct.Struct("!3sBB")
+_BIN_LENGTH = struct.Struct("!I")
+_BIN_INT32 = struct.Struct("!i")
+_BIN_INT64 = struct.Struct("!q")
+_BIN_FLOAT = struct.Struct("!d")
+_BIN_COMPLEX = struct.Struct("!dd")
+# precompiled formats for float lists of common lengths
+_BIN_FLOAT_ARRAYS = dict([(_n, struct.Struct("!%id" % _n)) for _n in range(17)])
+_BIN_CONTAINER_TAGS = {list : BIN_LIST, tuple : BIN_TUPLE, set : BIN_SET,
+                       frozenset : BIN_FROZENSET}
+_BIN_CONTAINERS = {BIN_LIST : list, BIN_TUPLE : tuple, BIN_SET : set,
+                   BIN_FROZENSET : frozenset, BIN_DICT : dict}
+# order matters: bool before int, int before long
+_BIN_BASE_TYPES = (bool, int, long, float, complex, str, unicode, list,
+                   tuple, set, frozenset, dict)
+
+
 class Error(Exception):
     """Our own exception type."""
 
@@ -0,0 +1,27 @@
+# __init__.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Benchmarks for Pyff.
+
+* :mod:`lib.benchmark.feedback` runs Feedbacks headless and records their
+  frame times.
+* :mod:`lib.benchmark.signalpath` measures the stages a signal passes from
+  the network to the Feedback.
+* :mod:`lib.benchmark.flashsequence` measures the generation of the flash
+  sequences of ERP speller trials.
+"""
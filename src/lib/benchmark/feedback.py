@@ -0,0 +1,226 @@
+# feedback.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Headless frame time benchmark for Feedbacks.
+
+This module runs a Feedback without a Feedback Controller through a scripted
+session (play, control signals, pause, resume, stop) and records the time
+spent per tick and between frames. The results are reports (dictionaries)
+which can be saved as JSON and compared against the reports of an earlier
+run, see ``benchmark.py`` in the top level directory.
+"""
+
+
+import os
+import sys
+import gc
+import math
+import time
+import logging
+from threading import Thread
+
+from lib.stats import LatencyHistogram, clock
+
+
+# Version of the report format
+REPORT_VERSION = 1
+# Default length of the scripted session in seconds
+DEFAULT_DURATION = 5.0
+# Default rate of the synthetic control signals in Hz
+DEFAULT_CONTROL_RATE = 25.0
+# Default tolerance for regressions, 0.2 means 20% slower
+DEFAULT_TOLERANCE = 0.2
+# Values of the reports compared by compare_reports
+COMPARED_VALUES = [("tick_time", "p50"), ("tick_time", "p99"),
+                   ("frame_time", "p50"), ("cpu_time", "mean")]
+
+# CPU time of this process, time.clock is wall time on Windows
+if sys.platform == "win32":
+    def cpu_clock():
+        user, system = os.times()[:2]
+        return user + system
+else:
+    cpu_clock = time.clock
+
+
+def enable_headless(opengl=False):
+    """Make pygame render into memory instead of a window.
+
+    Must be called before pygame is initialized. OpenGL needs a real display,
+    for Feedbacks using OpenGL (e.g. VisionEgg) run the benchmark in a
+    virtual X server like ``xvfb-run`` instead.
+
+    :param opengl: The Feedback renders with OpenGL
+    :type opengl: bool
+
+    """
+    if not opengl:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+
+
+class TickRecorder(object):
+    """Records the duration of the Feedback's ticks.
+
+    :class:`FeedbackBase.MainloopFeedback.MainloopFeedback` calls
+    :meth:`begin` and :meth:`end` around every iteration of its mainloop if
+    the Feedback has a recorder. Feedbacks which draw frames outside of the
+    mainloop call :meth:`frame` instead.
+
+    Python 2 cannot count allocations, the recorder counts the net number of
+    container objects created during the ticks, as tracked by the garbage
+    collector.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Remove all recorded values."""
+        self.ticks = 0
+        self.frames = 0
+        self.allocations = 0
+        self.cpuTotal = 0.0
+        self.tickTimes = LatencyHistogram()
+        self.frameTimes = LatencyHistogram()
+        self.cpuTimes = LatencyHistogram()
+        self._lastFrame = None
+        self._start = None
+        self._startCpu = None
+        self._startGc = None
+
+    def begin(self):
+        """Called at the beginning of a tick."""
+        self.frame()
+        self._startGc = gc.get_count()[0]
+        self._startCpu = cpu_clock()
+        self._start = clock()
+
+    def end(self):
+        """Called at the end of a tick."""
+        elapsed = clock() - self._start
+        cpu = cpu_clock() - self._startCpu
+        allocations = gc.get_count()[0] - self._startGc
+        self.ticks += 1
+        self.tickTimes.add(elapsed)
+        self.cpuTimes.add(cpu)
+        self.cpuTotal += cpu
+        # the count drops when the garbage collector ran
+        if allocations > 0:
+            self.allocations += allocations
+
+    def frame(self):
+        """Called when a frame is drawn."""
+        now = clock()
+        if self._lastFrame is not None:
+            self.frameTimes.add(now - self._lastFrame)
+        self._lastFrame = now
+        self.frames += 1
+
+    def report(self):
+        """Return the recorded values as dictionary."""
+        return {"ticks" : self.ticks,
+                "frames" : self.frames,
+                "tick_time" : self.tickTimes.summary(),
+                "frame_time" : self.frameTimes.summary(),
+                "cpu_time" : self.cpuTimes.summary(),
+                "cpu_total" : self.cpuTotal,
+                "allocations_per_tick" : float(self.allocations) / self.ticks if self.ticks else None}
+
+
+def run_feedback(fbclass, duration=DEFAULT_DURATION, rate=DEFAULT_CONTROL_RATE):
+    """Run the Feedback through a scripted session and return a report.
+
+    The Feedback plays for the first half of the duration while it receives
+    synthetic control signals, is paused for a quarter and plays again for
+    the last quarter until it is stopped.
+
+    :param fbclass: Feedback class
+    :param duration: Length of the session in seconds
+    :type duration: float
+    :param rate: Rate of the control signals in Hz
+    :type rate: float
+    :returns: Report
+
+    """
+    feedback = fbclass()
+    feedback._on_init()
+    recorder = TickRecorder()
+    feedback._tick_recorder = recorder
+    driver = Thread(target=_drive, args=(feedback, duration, rate))
+    driver.setDaemon(True)
+    start = clock()
+    driver.start()
+    try:
+        feedback._on_play()
+    finally:
+        elapsed = clock() - start
+        driver.join(duration)
+        feedback._on_quit()
+    report = recorder.report()
+    report["duration"] = elapsed
+    report["version"] = REPORT_VERSION
+    report["feedback"] = fbclass.__name__
+    report["python"] = sys.version.split()[0]
+    return report
+
+
+def compare_reports(baseline, report, tolerance=DEFAULT_TOLERANCE):
+    """Return the values of the report which regressed against the baseline.
+
+    :param baseline: Report of an earlier run
+    :type baseline: dict
+    :param report: Report of this run
+    :type report: dict
+    :param tolerance: Allowed slowdown relative to the baseline
+    :type tolerance: float
+    :returns: List of tuples (name, baseline value, value)
+
+    """
+    regressions = []
+    for group, key in COMPARED_VALUES:
+        old = baseline.get(group, {}).get(key)
+        new = report.get(group, {}).get(key)
+        if old is None or new is None:
+            continue
+        if new > old * (1 + tolerance):
+            regressions.append(("%s.%s" % (group, key), old, new))
+    return regressions
+
+
+def _drive(feedback, duration, rate):
+    """Play the scripted session on the Feedback."""
+    logger = logging.getLogger("Benchmark")
+    try:
+        _send_control_signals(feedback, duration / 2, rate)
+        feedback._on_pause()
+        time.sleep(duration / 4)
+        feedback._on_pause()
+        _send_control_signals(feedback, duration / 4, rate)
+    except:
+        logger.exception("Driving the Feedback failed:")
+    feedback._on_stop()
+
+
+def _send_control_signals(feedback, duration, rate):
+    start = clock()
+    i = 0
+    while clock() - start < duration:
+        feedback._queue_control_event({"cl_output" : math.sin(i / rate)})
+        i += 1
+        time.sleep(1.0 / rate)
@@ -0,0 +1,144 @@
+# flashsequence.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Benchmark for the generation of flash sequences.
+
+Measures the time to generate the flash sequence of a whole trial with
+:class:`lib.P300Aux.FlashSequence.FlashSequenceGenerator`, with
+``random_flash_sequence`` of :mod:`lib.P300Aux.P300Functions` (if pygame is
+available) and the time to take a precomputed trial from a
+:class:`lib.P300Aux.FlashSequence.FlashSequencePool`.
+
+Run it from the ``src`` directory::
+
+    python -m lib.benchmark.flashsequence -o baseline.json
+    ...
+    python -m lib.benchmark.flashsequence -b baseline.json
+
+"""
+
+
+import sys
+import json
+import time
+import random
+from optparse import OptionParser
+
+from lib.P300Aux.FlashSequence import FlashSequenceGenerator, FlashSequencePool
+from lib.benchmark.signalpath import measure, compare_results, DEFAULT_MIN_TIME, DEFAULT_TOLERANCE
+
+
+# Version of the result format
+RESULT_VERSION = 1
+
+# name -> (groups, sequences, min_dist, balanced)
+CONFIGS = {"hex6x10" : (6, 10, 2, True),
+           "matrix12x10" : (12, 10, 3, True),
+           "random6x10" : (6, 10, 2, False)}
+
+
+class _LegacyState(object):
+    """The attributes random_flash_sequence uses of a Feedback."""
+
+    def __init__(self, nr_groups):
+        self.groups = range(nr_groups)
+        self.flash_sequence = []
+        self.random = random.Random()
+
+
+def _legacy_trial(state, nr_sequences, min_dist, balanced, random_flash_sequence):
+    while True:
+        state.flash_sequence = []
+        try:
+            for i in range(nr_sequences):
+                random_flash_sequence(state, min_dist=min_dist, repetition=not balanced)
+            return state.flash_sequence
+        except ValueError:
+            # ran out of allowed groups at the end of a sequence, start over
+            pass
+
+
+def run(min_time=DEFAULT_MIN_TIME):
+    """Run the benchmarks and return the results.
+
+    :param min_time: Minimum time per measurement in seconds
+    :type min_time: float
+    :returns: dictionary
+
+    """
+    try:
+        from lib.P300Aux.P300Functions import random_flash_sequence
+    except ImportError:
+        random_flash_sequence = None
+    results = dict()
+    for name, (groups, sequences, min_dist, balanced) in CONFIGS.items():
+        gen = FlashSequenceGenerator(groups, sequences, min_dist, balanced)
+        results["generator.trial/%s" % name] = measure(gen.trial, min_time)
+        pool = FlashSequencePool(gen, 1)
+        def refill():
+            # wait until the pool precomputed the next trial
+            while not pool.available():
+                time.sleep(0.0001)
+        refill()
+        results["pool.get/%s" % name] = measure(pool.get, min_time, after=refill)
+        pool.close()
+        if random_flash_sequence is not None:
+            state = _LegacyState(groups)
+            results["legacy.trial/%s" % name] = measure(
+                lambda: _legacy_trial(state, sequences, min_dist, balanced, random_flash_sequence),
+                min_time)
+    return {"version" : RESULT_VERSION,
+            "python" : sys.version.split()[0],
+            "results" : results}
+
+
+def main():
+    parser = OptionParser(usage="python -m lib.benchmark.flashsequence [Options]")
+    parser.add_option("-o", "--output", dest="output",
+                      help="Save the results as JSON, e.g. as new baseline.",
+                      metavar="FILE")
+    parser.add_option("-b", "--baseline", dest="baseline",
+                      help="Compare the results against this baseline.",
+                      metavar="FILE")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float",
+                      default=DEFAULT_TOLERANCE,
+                      help="Allowed slowdown relative to the baseline. [default: %default]")
+    parser.add_option("-m", "--min-time", dest="mintime", type="float",
+                      default=DEFAULT_MIN_TIME,
+                      help="Minimum time per measurement in seconds. [default: %default]")
+    options, args = parser.parse_args()
+
+    results = run(options.mintime)
+    print "%-30s %12s %10s %10s" % ("benchmark/config", "trials/s", "p50 (us)", "p99 (us)")
+    for name, r in sorted(results["results"].items()):
+        print "%-30s %12.0f %10.1f %10.1f" % (name, r["ops_per_sec"], r["p50"] * 1e6, r["p99"] * 1e6)
+    if options.output:
+        fh = open(options.output, "w")
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.close()
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+        regressions = compare_results(baseline, results, options.tolerance)
+        for name, old, new in regressions:
+            print "%s regressed: %.1fus -> %.1fus" % (name, old * 1e6, new * 1e6)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
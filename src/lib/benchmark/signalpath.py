@@ -0,0 +1,299 @@
+# signalpath.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Microbenchmarks for the signal path.
+
+A signal from the network passes the following stages until it reaches the
+Feedback: decoding in the UDP dispatcher, :meth:`FeedbackController.handle_signal`
+and the IPC channel to the Feedback process. Replies take the way back and
+are encoded again. This module measures the throughput and latency of each
+stage for payloads from a single ``cl_output`` value to a large reply to
+``getvariables``.
+
+Run it from the ``src`` directory::
+
+    python -m lib.benchmark.signalpath -o baseline.json
+    ...
+    python -m lib.benchmark.signalpath -b baseline.json
+
+The second run fails if a stage got slower than the tolerance allows.
+"""
+
+
+import sys
+import json
+import socket
+import logging
+from optparse import OptionParser
+
+from lib import bcixml
+from lib import ipc
+from lib.feedbackcontroller import FeedbackController
+from lib.stats import clock
+
+
+# Version of the result format
+RESULT_VERSION = 1
+# Default minimum time per measurement in seconds
+DEFAULT_MIN_TIME = 0.2
+# Maximum number of iterations per measurement
+MAX_ITERATIONS = 100000
+# Default tolerance for regressions, 0.2 means 20% slower
+DEFAULT_TOLERANCE = 0.2
+
+
+def make_payloads():
+    """Return the benchmark payloads.
+
+    :returns: List of tuples (name, BciSignal)
+
+    """
+    variables = dict()
+    for i in range(50):
+        variables["int%i" % i] = i
+        variables["float%i" % i] = i * 0.5
+        variables["string%i" % i] = "value %i" % i
+        variables["list%i" % i] = [0.1 * j for j in range(10)]
+    variables["dict"] = dict([("key%i" % i, i) for i in range(20)])
+    variables["flag"] = True
+    return [("scalar", bcixml.BciSignal({bcixml.CL_OUTPUT : 0.5}, None, bcixml.CONTROL_SIGNAL)),
+            ("vector6", bcixml.BciSignal({bcixml.CL_OUTPUT : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]}, None, bcixml.CONTROL_SIGNAL)),
+            ("batch32", bcixml.BciSignal({bcixml.CL_BATCH : [[i * 0.002, 0.5] for i in range(32)]}, None, bcixml.CONTROL_SIGNAL)),
+            ("getvariables", bcixml.BciSignal({"variables" : variables}, None, bcixml.REPLY_SIGNAL))]
+
+
+# (protocol, encoder, decoder), protocols without an encoder decode bcixml;
+# decode.bcixml-fast compares the FastXmlDecoder with the XmlDecoder on the
+# same packets
+CODECS = [("bcixml", bcixml.XmlEncoder, bcixml.XmlDecoder),
+          ("bcixml-fast", None, bcixml.FastXmlDecoder),
+          ("bcixml-cached", bcixml.CachingXmlEncoder, bcixml.FastXmlDecoder),
+          ("tobixml", None, bcixml.TobiXmlDecoder),
+          ("json", bcixml.JsonEncoder, bcixml.JsonDecoder),
+          ("binary", bcixml.BinaryEncoder, bcixml.BinaryDecoder)]
+
+
+def measure(func, min_time=DEFAULT_MIN_TIME, max_iterations=MAX_ITERATIONS, after=None):
+    """Call the function repeatedly and return the summary of its timing.
+
+    :param func: Function without arguments
+    :param min_time: Minimum time to spend in the function in seconds
+    :type min_time: float
+    :param max_iterations: Maximum number of calls
+    :type max_iterations: int
+    :param after: Function called after each call, outside of the
+        measurement
+    :returns: dictionary with iterations, ops_per_sec, mean, min, p50 and
+        p99 (in seconds)
+
+    """
+    samples = []
+    total = 0.0
+    while total < min_time and len(samples) < max_iterations:
+        start = clock()
+        func()
+        elapsed = clock() - start
+        if after:
+            after()
+        samples.append(elapsed)
+        total += elapsed
+    samples.sort()
+    n = len(samples)
+    return {"iterations" : n,
+            "ops_per_sec" : n / total if total else None,
+            "mean" : total / n,
+            "min" : samples[0],
+            "p50" : samples[int(0.5 * (n - 1))],
+            "p99" : samples[int(0.99 * (n - 1))]}
+
+
+def bench_codecs(payloads, min_time=DEFAULT_MIN_TIME):
+    """Measure encoding and decoding of the payloads with every protocol."""
+    results = dict()
+    xml = bcixml.XmlEncoder()
+    for protocol, encoder_class, decoder_class in CODECS:
+        decoder = decoder_class()
+        encoder = encoder_class() if encoder_class else None
+        for name, signal in payloads:
+            if encoder:
+                packet = encoder.encode_packet(signal)
+                results["encode.%s/%s" % (protocol, name)] = \
+                    measure(lambda: encoder.encode_packet(signal), min_time)
+            else:
+                packet = xml.encode_packet(signal)
+            results["decode.%s/%s" % (protocol, name)] = \
+                measure(lambda: decoder.decode_packet(packet), min_time)
+    return results
+
+
+class _ReceivingChannel(ipc.IPCChannel):
+
+    def __init__(self, conn, reactor):
+        ipc.IPCChannel.__init__(self, conn, reactor)
+        self.received = 0
+
+    def handle_message(self, message):
+        self.received += 1
+
+
+class _NoControlRing(object):
+    """Stands in for the Feedback Process Controller, no ring is used."""
+
+    def write_control_signal(self, data):
+        return False
+
+
+def bench_ipc(payloads, min_time=DEFAULT_MIN_TIME):
+    """Measure the latency of messages through the IPC channel.
+
+    A message is sent with :meth:`IPCChannel.send_message` and the time until
+    the receiving channel handled it is measured, including pickling,
+    framing and unpickling.
+    """
+    results = dict()
+    reactor = ipc.Reactor(timeout=0)
+    a, b = socket.socketpair()
+    sender = _ReceivingChannel(a, reactor)
+    receiver = _ReceivingChannel(b, reactor)
+    receiver.request_length_framing()
+    while sender.send_framing != ipc.FRAMING_LENGTH:
+        reactor.poll()
+    for name, signal in payloads:
+        def roundtrip():
+            expected = receiver.received + 1
+            sender.send_message(signal)
+            while receiver.received < expected:
+                reactor.poll()
+        results["ipc.send_message/%s" % name] = measure(roundtrip, min_time)
+    reactor.close_all()
+    return results
+
+
+def bench_dispatch(payloads, min_time=DEFAULT_MIN_TIME):
+    """Measure :meth:`FeedbackController.handle_signal` for control signals.
+
+    The Feedback Controller forwards the signals into an IPC channel, the
+    other end of the channel is drained between the measurements.
+    """
+    results = dict()
+    reactor = ipc.Reactor(timeout=0)
+    a, b = socket.socketpair()
+    receiver = _ReceivingChannel(b, reactor)
+    # The Feedback Controller without its sockets and Feedback processes
+    fc = FeedbackController.__new__(FeedbackController)
+    fc.logger = logging.getLogger("FeedbackController")
+    fc.fbProcCtrl = _NoControlRing()
+    fc.ipcchannel = ipc.FeedbackControllerIPCChannel(a, fc, reactor)
+    receiver.request_length_framing()
+    while fc.ipcchannel.send_framing != ipc.FRAMING_LENGTH:
+        reactor.poll()
+    for name, signal in payloads:
+        if signal.type != bcixml.CONTROL_SIGNAL:
+            continue
+        def drain():
+            while receiver.received == 0:
+                reactor.poll()
+            receiver.received = 0
+        results["dispatch.handle_signal/%s" % name] = \
+            measure(lambda: fc.handle_signal(signal), min_time, after=drain)
+    reactor.close_all()
+    return results
+
+
+def run(stages=None, min_time=DEFAULT_MIN_TIME):
+    """Run the benchmarks and return the results.
+
+    :param stages: Names of the stages to run (codec, ipc, dispatch) or None
+        for all
+    :type stages: list
+    :param min_time: Minimum time per measurement in seconds
+    :type min_time: float
+    :returns: dictionary
+
+    """
+    payloads = make_payloads()
+    results = dict()
+    for stage, bench in [("codec", bench_codecs), ("ipc", bench_ipc),
+                         ("dispatch", bench_dispatch)]:
+        if stages is None or stage in stages:
+            results.update(bench(payloads, min_time))
+    return {"version" : RESULT_VERSION,
+            "python" : sys.version.split()[0],
+            "results" : results}
+
+
+def compare_results(baseline, results, tolerance=DEFAULT_TOLERANCE):
+    """Return the measurements whose median got slower than the tolerance.
+
+    :param baseline: Results of an earlier run
+    :type baseline: dict
+    :param results: Results of this run
+    :type results: dict
+    :param tolerance: Allowed slowdown relative to the baseline
+    :type tolerance: float
+    :returns: List of tuples (name, baseline median, median)
+
+    """
+    regressions = []
+    old = baseline.get("results", {})
+    for name, result in sorted(results.get("results", {}).items()):
+        if name not in old:
+            continue
+        if result["p50"] > old[name]["p50"] * (1 + tolerance):
+            regressions.append((name, old[name]["p50"], result["p50"]))
+    return regressions
+
+
+def main():
+    parser = OptionParser(usage="python -m lib.benchmark.signalpath [Options]")
+    parser.add_option("-s", "--stage", dest="stages", action="append",
+                      type="choice", choices=["codec", "ipc", "dispatch"],
+                      help="Stage to benchmark: codec, ipc or dispatch. Use this option several times for more than one stage. [default: all]")
+    parser.add_option("-o", "--output", dest="output",
+                      help="Save the results as JSON, e.g. as new baseline.",
+                      metavar="FILE")
+    parser.add_option("-b", "--baseline", dest="baseline",
+                      help="Compare the results against this baseline.",
+                      metavar="FILE")
+    parser.add_option("-t", "--tolerance", dest="tolerance", type="float",
+                      default=DEFAULT_TOLERANCE,
+                      help="Allowed slowdown relative to the baseline. [default: %default]")
+    parser.add_option("-m", "--min-time", dest="mintime", type="float",
+                      default=DEFAULT_MIN_TIME,
+                      help="Minimum time per measurement in seconds. [default: %default]")
+    options, args = parser.parse_args()
+
+    results = run(options.stages, options.mintime)
+    print "%-45s %12s %10s %10s" % ("stage/payload", "ops/s", "p50 (us)", "p99 (us)")
+    for name, r in sorted(results["results"].items()):
+        print "%-45s %12.0f %10.1f %10.1f" % (name, r["ops_per_sec"], r["p50"] * 1e6, r["p99"] * 1e6)
+    if options.output:
+        fh = open(options.output, "w")
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.close()
+    if options.baseline:
+        baseline = json.load(open(options.baseline))
+        regressions = compare_results(baseline, results, options.tolerance)
+        for name, old, new in regressions:
+            print "%s regressed: %.1fus -> %.1fus" % (name, old * 1e6, new * 1e6)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# controlring.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Shared memory ring buffer for control signals.
+
+This module provides an optional data plane for control signals between the
+Feedback Controller and the Feedback process. Instead of pickling every
+control signal and sending it through the IPC channel, the Feedback
+Controller writes numeric ``cl_output`` values into a ring of fixed size
+float records in shared memory and the Feedback reads the latest sample
+from there.
+
+Only control signals which consist of a single ``cl_output`` key with a
+number or a list of numbers fit into a record, everything else still goes
+through the IPC channel. Values are stored as floats.
+"""
+
+
+from multiprocessing.sharedctypes import RawArray, RawValue
+
+from lib.bcixml import CL_OUTPUT
+
+
+# default number of records in the ring
+DEFAULT_SLOTS = 64
+# default maximum number of values per record
+DEFAULT_WIDTH = 16
+# record layout: sequence number, number of values, values...
+# (a negative number of values marks a scalar)
+SEQ, LEN, VALUES = 0, 1, 2
+# number of attempts to read a consistent record
+READ_ATTEMPTS = 3
+
+
+class ControlSignalRing(object):
+    """Single writer, single reader ring buffer of control signals.
+
+    The ring must be created before the Feedback process is spawned, so it
+    is shared between both processes. The Feedback Controller only writes into
+    the ring if the Feedback attached itself, otherwise the control signals
+    are sent through the IPC channel as before.
+
+    Usage on the Feedback Controller's end::
+
+        ring = ControlSignalRing()
+        ...
+        if not ring.write(signal.data):
+            # send via IPC
+
+    Usage on the Feedback's end::
+
+        ring.attach()
+        ...
+        seq, data = ring.read_latest(seq)
+        if data is not None:
+            # do something
+
+    """
+
+    def __init__(self, slots=DEFAULT_SLOTS, width=DEFAULT_WIDTH):
+        """Allocate the shared memory.
+
+        :param slots: Number of records in the ring
+        :type slots: int
+        :param width: Maximum number of values per record
+        :type width: int
+
+        """
+        self.slots = slots
+        self.width = width
+        self.stride = width + VALUES
+        self.buf = RawArray('d', slots * self.stride)
+        self.head = RawValue('l', 0)
+        self.attached = RawValue('b', 0)
+
+    def attach(self):
+        """Tell the writer that a reader polls the ring."""
+        self.attached.value = 1
+
+    def detach(self):
+        """Tell the writer that nobody polls the ring anymore."""
+        self.attached.value = 0
+
+    def accepts(self, data):
+        """Return True if the control signal data fits into a record.
+
+        :param data: Control signal data
+        :type data: dict
+
+        """
+        if len(data) != 1 or CL_OUTPUT not in data:
+            return False
+        value = data[CL_OUTPUT]
+        if _is_number(value):
+            return True
+        if isinstance(value, (list, tuple)) and len(value) <= self.width:
+            for v in value:
+                if not _is_number(v):
+                    return False
+            return True
+        return False
+
+    def write(self, data):
+        """Write the control signal data into the next record.
+
+        :param data: Control signal data
+        :type data: dict
+        :returns: True if the data was written, False if no reader is
+            attached or the data does not fit into a record.
+
+        """
+        if not self.attached.value or not self.accepts(data):
+            return False
+        value = data[CL_OUTPUT]
+        seq = self.head.value + 1
+        base = (seq % self.slots) * self.stride
+        buf = self.buf
+        # invalidate the record while writing
+        buf[base+SEQ] = -1
+        if _is_number(value):
+            buf[base+LEN] = -1
+            buf[base+VALUES] = value
+        else:
+            n = len(value)
+            buf[base+LEN] = n
+            buf[base+VALUES:base+VALUES+n] = value
+        buf[base+SEQ] = seq
+        self.head.value = seq
+        return True
+
+    def read_latest(self, last_seq=0):
+        """Return the latest record if it is newer than last_seq.
+
+        :param last_seq: Sequence number of the last record read
+        :type last_seq: int
+        :returns: tuple (sequence number, data) where data is None if there
+            is no newer record
+
+        """
+        buf = self.buf
+        for i in range(READ_ATTEMPTS):
+            seq = self.head.value
+            if seq == last_seq:
+                return last_seq, None
+            base = (seq % self.slots) * self.stride
+            if buf[base+SEQ] != seq:
+                continue
+            n = int(buf[base+LEN])
+            if n < 0:
+                value = buf[base+VALUES]
+            else:
+                value = buf[base+VALUES:base+VALUES+n]
+            # the writer may have lapped us while copying the record
+            if buf[base+SEQ] == seq:
+                return seq, {CL_OUTPUT : value}
+        return last_seq, None
+
+
+def _is_number(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
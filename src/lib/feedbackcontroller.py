@@ -17,6 +17,7 @@
 
 
 import socket
+import errno
 import logging
 import sys
 import asyncore
@@ -24,10 +25,16 @@ import asyncore
 from lib import bcinetwork
 from lib import bcixml
 from FeedbackBase.Feedback import Feedback
-from lib.feedbackprocesscontroller import FeedbackProcessController
+from lib.feedbackprocesscontroller import FeedbackProcessController, DEFAULT_INDEX
+from lib.stats import LatencyHistogram, clock
 import ipc
 
 
+# Maximum number of datagrams read per readiness event, so a flood of
+# control signals cannot starve the IPC channels
+MAX_DATAGRAMS_PER_READ = 64
+
+
 class FeedbackController(object):
     """Feedback Controller.
 
@@ -35,32 +42,38 @@ class FeedbackController(object):
     Feedbacks. Can query the Feedback for it's variables and can as well set
     them.
     """
-    def __init__(self, fbpath=None, port=None, protocol='bcixml'):
+    def __init__(self, fbpath=None, port=None, protocol='bcixml', controlring=False, poolsize=0,
+                 index=DEFAULT_INDEX):
         # Setup my stuff:
         self.logger = logging.getLogger("FeedbackController")
         # Set up the socket
-        self.ipcchannel = ipc.IPCConnectionHandler(self)
-        self.udpconnectionhandler = UDPDispatcher(self, protocol)
+        self.reactor = ipc.Reactor()
+        self.ipcchannel = ipc.IPCConnectionHandler(self, self.reactor)
+        self.udpconnectionhandler = UDPDispatcher(self, protocol, self.reactor)
         # Windows only, set the parallel port port
         self.ppport = port
         fbdirs = ["Feedbacks"]
         if fbpath:
             fbdirs.extend(fbpath)
-        self.fbProcCtrl = FeedbackProcessController(fbdirs, Feedback, 1)
+        self.fbProcCtrl = FeedbackProcessController(fbdirs, Feedback, 1, controlring, poolsize, index)
+        # replace used warm processes between the signals
+        self.reactor.idle_callbacks.append(self.fbProcCtrl.maintain_pool)
         self.fc_data = {}
 
 
     def start(self):
         """Start the Feedback Controller's activities."""
         self.logger.debug("Started mainloop.")
-        ipc.ipcloop()
+        ipc.ipcloop(self.reactor)
         self.logger.debug("Left mainloop.")
 
 
     def stop(self):
         """Stop the Feedback Controller's activities."""
         self.fbProcCtrl.stop_feedback()
-        asyncore.close_all()
+        self.fbProcCtrl.shutdown_pool()
+        self.logger.info("Signal dispatch latency: %s" % str(self.udpconnectionhandler.latency))
+        self.reactor.close_all()
 
 
     def handle_signal(self, signal):
@@ -87,6 +100,8 @@ class FeedbackController(object):
     def _handle_cs(self, signal):
         """Handle Control Signal."""
         # We don't care about control signals, send it to the feedback
+        if self.fbProcCtrl.write_control_signal(signal.data):
+            return
         self.send_to_feedback(signal)
 
 
@@ -145,19 +160,26 @@ class FeedbackController(object):
 class UDPDispatcher(asyncore.dispatcher):
     """UDP Message Hanlder of the Feedback Controller."""
 
-    def __init__(self, fc, protocol):
-        asyncore.dispatcher.__init__(self)
+    def __init__(self, fc, protocol, reactor=None):
+        asyncore.dispatcher.__init__(self, map=reactor.map if reactor else None)
         self.fc = fc
+        self.reactor = reactor
+        # Latency from the wakeup of the reactor to the dispatch of the
+        # signal, i.e. waiting for earlier datagrams plus decoding
+        self.latency = LatencyHistogram()
         if protocol == 'json':
             self.decoder = bcixml.JsonDecoder()
             self.encoder = bcixml.JsonEncoder()
+        elif protocol == 'binary':
+            self.decoder = bcixml.BinaryDecoder()
+            self.encoder = bcixml.BinaryEncoder()
         elif protocol == 'tobixml':
             # tobi and bcixml share the same encoder
             self.decoder = bcixml.TobiXmlDecoder()
-            self.encoder = bcixml.XmlEncoder()
+            self.encoder = bcixml.CachingXmlEncoder()
         else:
-            self.decoder = bcixml.XmlDecoder()
-            self.encoder = bcixml.XmlEncoder()
+            self.decoder = bcixml.FastXmlDecoder()
+            self.encoder = bcixml.CachingXmlEncoder()
         self.create_socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.bind((bcinetwork.LOCALHOST, bcinetwork.FC_PORT))
 
@@ -175,13 +197,22 @@ class UDPDispatcher(asyncore.dispatcher):
         """Handle incoming signals.
 
         Takes incoming signals, decodes them and forwards them to the
-        Feedback Controller.
+        Feedback Controller. Drains the socket, so datagrams arriving in
+        bursts are handled in one go.
         """
-        try:
-            data, address = self.recvfrom(bcinetwork.BUFFER_SIZE)
-            signal = self.decoder.decode_packet(data)
-            signal.peeraddr = address
-            self.fc.handle_signal(signal)
-        except:
-            self.fc.logger.exception("Handling incoming signal caused an exception:")
+        for i in xrange(MAX_DATAGRAMS_PER_READ):
+            try:
+                data, address = self.socket.recvfrom(bcinetwork.BUFFER_SIZE)
+            except socket.error, e:
+                if e.args[0] not in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    self.fc.logger.exception("Receiving incoming signal caused an exception:")
+                return
+            try:
+                signal = self.decoder.decode_packet(data)
+                signal.peeraddr = address
+                if self.reactor:
+                    self.latency.add(clock() - self.reactor.last_wakeup)
+                self.fc.handle_signal(signal)
+            except:
+                self.fc.logger.exception("Handling incoming signal caused an exception:")
 
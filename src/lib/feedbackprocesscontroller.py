@@ -16,25 +16,56 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 
-from threading import Thread
+from threading import Thread, Lock
 import logging
-import asyncore
-from multiprocessing import Process, Event
+from multiprocessing import Process, Event, Pipe
 
 from lib.PluginController import PluginController
+from lib.controlring import ControlSignalRing
+from lib.pluginindex import PluginIndex
 import lib.PluginController
 import ipc
 
 
+# Modules imported by warm Feedback processes before a Feedback is assigned,
+# missing ones are ignored
+PRELOAD_MODULES = ["pygame",
+                   "VisionEgg",
+                   "FeedbackBase.MainloopFeedback",
+                   "FeedbackBase.PygameFeedback",
+                   "FeedbackBase.VisionEggFeedback"]
+
+# Time to wait for the IPC channel of a Feedback process in seconds
+IPC_READY_TIMEOUT = 30
+
+# Placeholder for a plugin index with the default index file
+DEFAULT_INDEX = object()
+
+
+def preload_modules(modules=PRELOAD_MODULES):
+    """Import the given modules, ignoring those which fail to import.
+
+    :param modules: Module names
+    :type modules: list
+
+    """
+    for modname in modules:
+        try:
+            __import__(modname)
+        except Exception, e:
+            logging.debug("Unable to preload %s: %s" % (modname, str(e)))
+
+
 class FeedbackProcess(Process):
     """Process that wrapps the Feedback's activities."""
 
-    def __init__(self, modname, classname, ipcReady, port):
+    def __init__(self, modname, classname, ipcReady, port, controlring=None):
         Process.__init__(self)
         self.classname = classname
         self.modname = modname
         self.ipcReady = ipcReady
         self.port = port
+        self.controlring = controlring
         self.loglevel = logging.getLogger().level
         self.fbloglevel = logging.getLogger("FB").level
         self.logformat = logging.getLogger().handlers[0].formatter._fmt
@@ -43,6 +74,11 @@ class FeedbackProcess(Process):
     def run(self):
         """Run the FeedbackProcess' activities in the new process."""
         # We're in a new process
+        self._run_feedback()
+
+
+    def _run_feedback(self):
+        """Load the Feedback, start its IPC channel and run its mainloop."""
         reload(lib.PluginController)
         try:
             fbClass = lib.PluginController.import_module_and_get_class(self.modname, self.classname)
@@ -56,13 +92,16 @@ class FeedbackProcess(Process):
         logging.getLogger("FB").setLevel(self.fbloglevel)
         feedback = fbClass(port_num=self.port)
         feedback.logger.debug("Initialized Feedback.")
+        if self.controlring is not None:
+            feedback._attach_control_ring(self.controlring)
 
-        # Start the Feedbacks IPC Channel
-        asyncore.socket_map.clear()
+        # Start the Feedbacks IPC Channel with a reactor of our own, the
+        # parent's dispatchers might have been inherited via fork
+        reactor = ipc.Reactor()
         conn = ipc.get_feedbackcontroller_connection()
-        ipc.FeedbackIPCChannel(conn, feedback)
+        ipc.FeedbackIPCChannel(conn, feedback, reactor)
         feedback.logger.debug("Starting IPC loop.")
-        fbipcthread = Thread(target=ipc.ipcloop)
+        fbipcthread = Thread(target=ipc.ipcloop, args=(reactor,))
         fbipcthread.start()
         self.ipcReady.set()
         # Start the Feedbacks Mainloop
@@ -74,19 +113,94 @@ class FeedbackProcess(Process):
             conn.close()
 
 
+class WarmFeedbackProcess(FeedbackProcess):
+    """Feedback process which is started before the Feedback is known.
+
+    The process imports the :data:`PRELOAD_MODULES` and waits until a
+    Feedback is assigned to it, so only the Feedback's own module has to be
+    imported when the Feedback is requested.
+    """
+
+    def __init__(self, controlring=None):
+        FeedbackProcess.__init__(self, None, None, Event(), None, controlring)
+        self.jobs, self.jobsender = Pipe(False)
+
+
+    def run(self):
+        """Preload the modules and wait for a Feedback."""
+        self.jobsender.close()
+        preload_modules()
+        try:
+            job = self.jobs.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        self.modname, self.classname, self.port = job
+        self._run_feedback()
+
+
+    def assign(self, modname, classname, port):
+        """Make the process load and run the given Feedback.
+
+        :param modname: Module name
+        :type modname: str
+        :param classname: Class name
+        :type classname: str
+        :param port: Parallel Port
+
+        """
+        self.modname, self.classname, self.port = modname, classname, port
+        self.jobsender.send((modname, classname, port))
+        self.jobsender.close()
+
+
+    def dismiss(self):
+        """Make an idle process terminate."""
+        try:
+            self.jobsender.send(None)
+            self.jobsender.close()
+        except (IOError, EOFError):
+            pass
+
+
 class FeedbackProcessController(object):
     """Takes care of starting and stopping of Feedback Processes."""
 
-    def __init__(self, plugindirs, baseclass, timeout):
-        """Initialize the Feedback Process Controller."""
+    def __init__(self, plugindirs, baseclass, timeout, controlring=False, poolsize=0,
+                 index=DEFAULT_INDEX):
+        """Initialize the Feedback Process Controller.
+
+        :param controlring: Deliver numeric control signals via shared memory
+        :type controlring: bool
+        :param poolsize: Number of warm Feedback processes to keep ready
+        :type poolsize: int
+        :param index: Index of the plugin directories, None to search them
+            from scratch every time. Defaults to a :class:`PluginIndex` with
+            the default index file.
+        :type index: :class:`lib.pluginindex.PluginIndex`
+
+        """
         # Where are we:
         # Proc/Thread: FB/??
         self.logger = logging.getLogger("FeedbackProcessController")
         self.currentProc = None
         self.timeout = timeout
-        self.pluginController = PluginController(plugindirs, baseclass)
+        self.useControlRing = controlring
+        self.controlRing = None
+        if index is DEFAULT_INDEX:
+            index = PluginIndex()
+        self.pluginController = PluginController(plugindirs, baseclass, index)
+
+        # Start the warm processes before any other thread of this process
+        # runs, a fork while another thread holds a lock (e.g. of a log
+        # handler) copies the lock in its locked state.
+        self.poolSize = poolsize
+        self.pool = []
+        self.poolLock = Lock()
+        self._fill_pool()
 
-        self.pluginController.find_plugins()
+        self.pluginController.find_plugins(background=True)
         self.pluginController.unload_plugin()
 
 
@@ -102,17 +216,63 @@ class FeedbackProcessController(object):
         if self.currentProc:
             self.logger.warning("Trying to start feedback but another one is still running. Killing the old one now and proceed.")
             self.stop_feedback()
-        ipcReady = Event()
-        self.currentProc = FeedbackProcess(self.pluginController.availablePlugins[name], name, ipcReady, port)
-        self.currentProc.start()
-        # Wait until the network from the Process is ready, this is necessary
-        # since spawning a new process under Windows is very slow.
-        self.logger.debug("Waiting for IPC channel to become ready...")
-        ipcReady.wait()
-        self.logger.debug("IPC channel ready.")
+        if name not in self.pluginController.availablePlugins:
+            # Maybe the Feedback is new and the index is still refreshing
+            self.pluginController.wait_for_refresh()
+        modname = self.pluginController.availablePlugins[name]
+        ready = False
+        worker = self._take_worker()
+        if worker:
+            self.logger.debug("Using warm process.")
+            self.controlRing = worker.controlring
+            self.currentProc = worker
+            worker.assign(modname, name, port)
+            ready = self._wait_for_ipc(worker.ipcReady)
+            if not ready:
+                self.logger.warning("Warm process did not become ready, starting a new one.")
+                worker.terminate()
+                worker.join(self.timeout)
+        if not ready:
+            ipcReady = Event()
+            # The ring must exist before the process is spawned
+            if self.useControlRing:
+                self.controlRing = ControlSignalRing()
+            self.currentProc = FeedbackProcess(modname, name, ipcReady, port, self.controlRing)
+            self.currentProc.start()
+            if not self._wait_for_ipc(ipcReady):
+                self.logger.error("IPC channel of the Feedback did not become ready.")
         self.logger.debug("Done starting process.")
 
 
+    def maintain_pool(self):
+        """Replace the warm processes taken by :meth:`start_feedback`.
+
+        Call it regularly from the thread using the controller, e.g. from the
+        idle tick of its main loop. The processes are forked from this thread
+        and only while the index refresh is not running, so no other thread
+        holds a lock during the fork. Returns immediately if the pool is full
+        or the refresh is running.
+        """
+        if len(self.pool) >= self.poolSize or self.pluginController.is_refreshing():
+            return
+        self._fill_pool()
+
+
+    def _wait_for_ipc(self, ipcReady):
+        """Wait until the network from the Process is ready, this is
+        necessary since spawning a new process under Windows is very slow.
+
+        :returns: True if the IPC channel is ready, False after
+            :data:`IPC_READY_TIMEOUT`
+
+        """
+        self.logger.debug("Waiting for IPC channel to become ready...")
+        ready = ipcReady.wait(IPC_READY_TIMEOUT)
+        if ready:
+            self.logger.debug("IPC channel ready.")
+        return ready
+
+
     def stop_feedback(self):
         """Stops the current Process.
 
@@ -134,9 +294,67 @@ class FeedbackProcessController(object):
 
         del(self.currentProc)
         self.currentProc = None
+        self.controlRing = None
         self.logger.debug("Done stopping process.")
 
 
+    def shutdown_pool(self):
+        """Stop all warm processes and do not start new ones."""
+        self.logger.debug("Stopping warm processes...")
+        self.poolLock.acquire()
+        try:
+            self.poolSize = 0
+            for worker in self.pool:
+                worker.dismiss()
+            for worker in self.pool:
+                worker.join(self.timeout)
+                if worker.is_alive():
+                    worker.terminate()
+            self.pool = []
+        finally:
+            self.poolLock.release()
+
+
+    def _take_worker(self):
+        """Return a warm process or None if there is none."""
+        self.poolLock.acquire()
+        try:
+            while self.pool:
+                worker = self.pool.pop(0)
+                if worker.is_alive():
+                    return worker
+            return None
+        finally:
+            self.poolLock.release()
+
+
+    def _fill_pool(self):
+        """Start warm processes until the pool is full."""
+        self.poolLock.acquire()
+        try:
+            while len(self.pool) < self.poolSize:
+                ring = ControlSignalRing() if self.useControlRing else None
+                worker = WarmFeedbackProcess(ring)
+                worker.start()
+                self.pool.append(worker)
+        finally:
+            self.poolLock.release()
+
+
+    def write_control_signal(self, data):
+        """Write the control signal into the shared memory ring.
+
+        :param data: Control signal data
+        :type data: dict
+        :returns: True if the data was written, False if it has to be sent
+            via IPC instead.
+
+        """
+        if self.controlRing is None:
+            return False
+        return self.controlRing.write(data)
+
+
     def get_feedbacks(self):
         """Return a list of available Feedbacks.
 
@@ -25,24 +25,148 @@ between the Feedback Controller and the Feedbacks
 
 import asyncore
 import asynchat
+import select
+import errno
 import socket
 import cPickle as pickle
+from cStringIO import StringIO
+import struct
 import logging
 
 import bcixml
+from lib.stats import clock
 
 
 # delimiter for IPC messages.
 TERMINATOR = "\r\n\r\n"
+# header preceeding each message in length-prefixed framing mode: payload
+# length as unsigned 32 bit integer in network byte order
+HEADER = struct.Struct("!I")
+# initial size of the preallocated payload buffer
+INITIAL_BUFFER_SIZE = 4096
+# framing modes
+FRAMING_TERMINATOR = "terminator"
+FRAMING_LENGTH = "length"
 # Port for IPC connections
 IPC_PORT = 12347
 LOCALHOST = "127.0.0.1"
+# Maximum time the reactor blocks without checking for pending writes
+REACTOR_TIMEOUT = 0.05
 
 import thread
 
-def ipcloop():
-    """Start the IPC loop."""
-    asyncore.loop()
+def ipcloop(reactor=None):
+    """Start the IPC loop.
+
+    :param reactor: Reactor to run, if None the global asyncore socket map
+        is used.
+
+    """
+    if reactor is None:
+        asyncore.loop()
+    else:
+        reactor.loop()
+
+
+class Reactor(object):
+    """Event loop for a set of asyncore dispatchers.
+
+    Every reactor has its own socket map, so processes and threads do not
+    share their dispatchers by accident. Pass the reactor to the dispatchers
+    in this module, they register themselves in its map.
+
+    The loop uses epoll where available and falls back to poll and select
+    otherwise. It blocks at most :data:`REACTOR_TIMEOUT` seconds, so data
+    pushed by other threads is sent in time.
+
+    """
+
+    def __init__(self, timeout=REACTOR_TIMEOUT):
+        self.logger = logging.getLogger("Reactor")
+        self.map = {}
+        self.timeout = timeout
+        # time when the last poll returned
+        self.last_wakeup = clock()
+        self._epoll = None
+        self._registered = {}
+        # functions called after every poll in the reactor's thread
+        self.idle_callbacks = []
+        if hasattr(select, "epoll"):
+            self._epoll = select.epoll()
+
+    def loop(self):
+        """Dispatch events until all dispatchers are closed."""
+        while self.map:
+            self.poll()
+            self.idle()
+        if self._epoll:
+            self._epoll.close()
+
+    def idle(self):
+        """Call the idle callbacks."""
+        for callback in self.idle_callbacks:
+            try:
+                callback()
+            except:
+                self.logger.exception("Idle callback failed:")
+
+    def poll(self):
+        """Wait for events and dispatch them once."""
+        if self._epoll:
+            self._epoll_poll()
+        elif hasattr(select, "poll"):
+            asyncore.poll2(self.timeout, self.map)
+            self.last_wakeup = clock()
+        else:
+            asyncore.poll(self.timeout, self.map)
+            self.last_wakeup = clock()
+
+    def close_all(self):
+        """Close all dispatchers, this ends the loop."""
+        asyncore.close_all(self.map)
+
+    def _epoll_poll(self):
+        # Update the registered events, dispatchers may have become readable
+        # or writable since the last time
+        for fd, obj in self.map.items():
+            flags = 0
+            if obj.readable():
+                flags |= select.EPOLLIN | select.EPOLLPRI
+            if obj.writable() and not obj.accepting:
+                flags |= select.EPOLLOUT
+            if flags:
+                flags |= select.EPOLLERR | select.EPOLLHUP
+            # compare the dispatcher too, fds are reused after closing
+            if self._registered.get(fd) != (obj, flags):
+                self._register(fd, obj, flags)
+        for fd in self._registered.keys():
+            if fd not in self.map:
+                self._register(fd, None, 0)
+        try:
+            events = self._epoll.poll(self.timeout)
+        except IOError, e:
+            if e.errno != errno.EINTR:
+                raise
+            return
+        self.last_wakeup = clock()
+        for fd, flags in events:
+            obj = self.map.get(fd)
+            if obj is None:
+                continue
+            asyncore.readwrite(obj, flags)
+
+    def _register(self, fd, obj, flags):
+        """(Re-)register fd with flags, unregister it if flags is 0."""
+        old = self._registered.pop(fd, None)
+        if old is not None:
+            try:
+                self._epoll.unregister(fd)
+            except (IOError, ValueError):
+                # the fd was closed and therefore already removed
+                pass
+        if flags:
+            self._epoll.register(fd, flags)
+            self._registered[fd] = (obj, flags)
 
 
 def get_feedbackcontroller_connection():
@@ -57,13 +181,14 @@ class IPCConnectionHandler(asyncore.dispatcher):
     FeedbackControllerIPCChannel.
     """
 
-    def __init__(self, fc):
-        asyncore.dispatcher.__init__(self)
+    def __init__(self, fc, reactor=None):
+        asyncore.dispatcher.__init__(self, map=reactor.map if reactor else None)
         self.logger = logging.getLogger("IPCConnectionHandler")
         self.conn = None
         self.addr = None
         self.ipcchan = None
         self.fc = fc
+        self.reactor = reactor
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.bind((LOCALHOST, IPC_PORT))
@@ -73,7 +198,7 @@ class IPCConnectionHandler(asyncore.dispatcher):
         """Handle incoming connection from Feedback."""
         self.logger.debug("Accepting.")
         self.conn, self.addr = self.accept()
-        self.ipcchan = FeedbackControllerIPCChannel(self.conn, self.fc)
+        self.ipcchan = FeedbackControllerIPCChannel(self.conn, self.fc, self.reactor)
 
     def handle_close(self):
         """Handle closing of connection."""
@@ -114,15 +239,32 @@ class IPCChannel(asynchat.async_chat):
 
     for sending messages via IPC.
 
+    The channel starts in the legacy framing mode where messages are
+    delimited by :data:`TERMINATOR`. A peer can request the length-prefixed
+    framing mode by sending a handshake message, after that each message is
+    preceeded by a :data:`HEADER` containing the length of the pickled
+    payload, which is read into a preallocated buffer. The sending and the
+    receiving direction are switched independently, each at the handshake
+    message which announces the switch, so no message in flight gets lost.
+
     """
 
-    def __init__(self, conn):
+    def __init__(self, conn, reactor=None):
         """Initialize the Channel, set terminator and clear input buffer."""
-        asynchat.async_chat.__init__(self, conn)
+        asynchat.async_chat.__init__(self, conn, reactor.map if reactor else None)
         self.logger = logging.getLogger("IPCChannel")
         self.set_terminator(TERMINATOR)
         # input buffer
         self.ibuf = ""
+        # framing mode for incoming and outgoing messages
+        self.recv_framing = FRAMING_TERMINATOR
+        self.send_framing = FRAMING_TERMINATOR
+        # preallocated payload buffer for length-prefixed framing
+        self.pbuf = bytearray(INITIAL_BUFFER_SIZE)
+        self.pview = memoryview(self.pbuf)
+        self.plen = 0
+        self.ppos = 0
+        self.in_header = True
 
     def collect_incoming_data(self, data):
         """Append incoming data to input buffer.
@@ -130,13 +272,34 @@ class IPCChannel(asynchat.async_chat):
         :param data: Incoming data
 
         """
-        self.ibuf += data
+        if self.recv_framing == FRAMING_LENGTH and not self.in_header:
+            n = len(data)
+            self.pview[self.ppos:self.ppos+n] = data
+            self.ppos += n
+        else:
+            self.ibuf += data
 
     def found_terminator(self):
         """Process message from peer."""
-        dump = self.ibuf
-        self.ibuf = ""
-        ipcmessage = pickle.loads(dump)
+        if self.recv_framing == FRAMING_LENGTH:
+            if self.in_header:
+                self.plen = HEADER.unpack(self.ibuf)[0]
+                self.ibuf = ""
+                if self.plen > 0:
+                    self._prepare_payload_buffer(self.plen)
+                    self.in_header = False
+                    self.set_terminator(self.plen)
+                return
+            self.in_header = True
+            self.set_terminator(HEADER.size)
+            ipcmessage = pickle.load(StringIO(buffer(self.pbuf, 0, self.plen)))
+        else:
+            dump = self.ibuf
+            self.ibuf = ""
+            ipcmessage = pickle.loads(dump)
+        if isinstance(ipcmessage, FramingRequest):
+            self._handle_framing_request(ipcmessage)
+            return
         try:
             self.handle_message(ipcmessage)
         except:
@@ -149,8 +312,21 @@ class IPCChannel(asynchat.async_chat):
 
         """
         dump = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
-        dump += TERMINATOR
-        self.push(dump)
+        if self.send_framing == FRAMING_LENGTH:
+            self.push(HEADER.pack(len(dump)) + dump)
+        else:
+            self.push(dump + TERMINATOR)
+
+    def request_length_framing(self):
+        """Ask the peer to switch to the length-prefixed framing mode.
+
+        Everything we send after the request is length-prefixed, the
+        incoming direction switches as soon as the peer acknowledged the
+        request.
+
+        """
+        self.send_message(FramingRequest(FRAMING_LENGTH))
+        self.send_framing = FRAMING_LENGTH
 
     def handle_close(self):
         """Handle closing of connection."""
@@ -167,12 +343,51 @@ class IPCChannel(asynchat.async_chat):
         """
         pass
 
+    def _handle_framing_request(self, request):
+        """Switch the incoming direction to the requested framing mode and
+        acknowledge if necessary."""
+        if request.framing not in (FRAMING_TERMINATOR, FRAMING_LENGTH):
+            self.logger.warning("Peer requested unknown framing mode (%s), ignoring it." % str(request.framing))
+            return
+        self.logger.debug("Switching incoming framing to %s." % request.framing)
+        self.recv_framing = request.framing
+        if request.framing == FRAMING_LENGTH:
+            self.in_header = True
+            self.set_terminator(HEADER.size)
+        else:
+            self.set_terminator(TERMINATOR)
+        if self.send_framing != request.framing:
+            self.send_message(FramingRequest(request.framing))
+            self.send_framing = request.framing
+
+    def _prepare_payload_buffer(self, size):
+        """Make sure the payload buffer can hold size bytes."""
+        self.ppos = 0
+        if size > len(self.pbuf):
+            newsize = len(self.pbuf)
+            while newsize < size:
+                newsize *= 2
+            self.pbuf = bytearray(newsize)
+            self.pview = memoryview(self.pbuf)
+
+
+class FramingRequest(object):
+    """Handshake message to switch the framing mode of an IPC channel.
+
+    The message is consumed by the :class:`IPCChannel` and never reaches
+    :func:`IPCChannel.handle_message`.
+
+    """
+
+    def __init__(self, framing):
+        self.framing = framing
+
 
 class FeedbackControllerIPCChannel(IPCChannel):
     """IPC Channel for Feedback Contoller's end."""
 
-    def __init__(self, conn, fc):
-        IPCChannel.__init__(self, conn)
+    def __init__(self, conn, fc, reactor=None):
+        IPCChannel.__init__(self, conn, reactor)
         self.fc = fc
 
     def handle_message(self, message):
@@ -187,9 +402,10 @@ class FeedbackControllerIPCChannel(IPCChannel):
 class FeedbackIPCChannel(IPCChannel):
     """IPC Channel for Feedback's end."""
 
-    def __init__(self, conn, feedback):
-        IPCChannel.__init__(self, conn)
+    def __init__(self, conn, feedback, reactor=None):
+        IPCChannel.__init__(self, conn, reactor)
         self.feedback = feedback
+        self.request_length_framing()
 
 
     def handle_message(self, message):
@@ -201,7 +417,7 @@ class FeedbackIPCChannel(IPCChannel):
         self.feedback.logger.debug("Processing signal")
 
         if message.type == bcixml.CONTROL_SIGNAL:
-            self.feedback._on_control_event(message.data)
+            self.feedback._queue_control_event(message.data)
             return
 
         cmd = message.commands[0][0] if len(message.commands) > 0 else None
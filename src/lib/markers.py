@@ -0,0 +1,313 @@
+# markers.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Asynchronous delivery of markers to several transports.
+
+A marker is timestamped once when the Feedback sends it and put into the
+queue of a :class:`MarkerSink`. The sink's thread delivers the queued markers
+to every transport, so the thread calling :meth:`MarkerSink.put` never blocks
+on a socket or a driver::
+
+    sink = MarkerSink([TriggerTransport(port), UdpTransport("127.0.0.1", 12344)])
+    sink.put(42)
+    ...
+    print sink.stats()
+    sink.close()
+
+"""
+
+
+import socket
+import logging
+from collections import deque
+from threading import Thread, Condition
+
+from lib import trigger
+from lib.stats import monotonic, LatencyHistogram
+
+
+# Default maximum number of queued markers, older markers are dropped
+QUEUE_SIZE = 1024
+# Maximum size of a UDP datagram with several markers in bytes
+MAX_DATAGRAM_SIZE = 1400
+
+
+class MarkerTransport(object):
+    """Transport the markers are delivered to.
+
+    The base class delivers nothing, derived classes override
+    :meth:`deliver`. The sink keeps the statistics of each transport in
+    :attr:`sent`, :attr:`dropped` and :attr:`latency`.
+    """
+
+    name = "marker"
+
+    def __init__(self):
+        self.sent = 0
+        self.dropped = 0
+        # time between sending and delivering the markers
+        self.latency = LatencyHistogram()
+
+    def deliver(self, markers):
+        """Deliver the markers.
+
+        :param markers: List of tuples (time, value), time is the
+            :func:`lib.stats.monotonic` time the marker was sent
+        :type markers: list
+        :returns: Number of delivered markers
+
+        """
+        return 0
+
+    def close(self):
+        """Release the resources of the transport."""
+        pass
+
+
+class TriggerTransport(MarkerTransport):
+    """Writes integer markers as triggers to a :class:`lib.trigger.TriggerPort`.
+
+    Markers which are not integers are ignored. Markers queued in quick
+    succession are not overwritten: the dispatcher holds every trigger for
+    reset_time and writes the next one after the port was reset.
+    """
+
+    def __init__(self, port, reset_time=trigger.DEFAULT_RESET_TIME):
+        """
+        :param port: Parallel or serial port
+        :type port: :class:`lib.trigger.TriggerPort`
+        :param reset_time: Time until a trigger is reset in seconds
+        :type reset_time: float
+
+        """
+        MarkerTransport.__init__(self)
+        self.name = port.name
+        self.port = port
+        self.reset_time = reset_time
+
+    def deliver(self, markers):
+        dispatcher = trigger.get_dispatcher()
+        n = 0
+        for t, value in markers:
+            if isinstance(value, (int, long)):
+                dispatcher.send(self.port, value, True, self.reset_time, queue=True)
+                n += 1
+        return n
+
+
+class UdpTransport(MarkerTransport):
+    """Sends markers as lines of text via UDP.
+
+    Every marker is terminated by ``'\\n'``, markers queued at the same time
+    are sent in one datagram.
+    """
+
+    name = "udp"
+
+    def __init__(self, host, port):
+        """
+        :param host: Receiving host
+        :type host: str
+        :param port: Receiving port
+        :type port: int
+
+        """
+        MarkerTransport.__init__(self)
+        self.address = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def deliver(self, markers):
+        n = 0
+        lines = []
+        size = 0
+        for t, value in markers:
+            line = str(value) + '\n'
+            if lines and size + len(line) > MAX_DATAGRAM_SIZE:
+                n += self._send(lines)
+                lines = []
+                size = 0
+            lines.append(line)
+            size += len(line)
+        if lines:
+            n += self._send(lines)
+        return n
+
+    def _send(self, lines):
+        self.socket.sendto("".join(lines), self.address)
+        return len(lines)
+
+    def close(self):
+        self.socket.close()
+
+
+class LslTransport(MarkerTransport):
+    """Pushes markers as strings to a Lab Streaming Layer outlet.
+
+    The samples get the time the marker was sent, converted to the LSL clock.
+    """
+
+    name = "lsl"
+
+    def __init__(self, outlet, local_clock):
+        """
+        :param outlet: Outlet with one string channel
+        :type outlet: pylsl.StreamOutlet
+        :param local_clock: pylsl.local_clock
+
+        """
+        MarkerTransport.__init__(self)
+        self.outlet = outlet
+        self.local_clock = local_clock
+
+    def deliver(self, markers):
+        offset = self.local_clock() - monotonic()
+        for t, value in markers:
+            self.outlet.push_sample([str(value)], t + offset)
+        return len(markers)
+
+
+class MarkerSink(object):
+    """Queues markers and delivers them to the transports in a thread."""
+
+    def __init__(self, transports, queue_size=QUEUE_SIZE):
+        """
+        :param transports: Transports to deliver every marker to
+        :type transports: list of :class:`MarkerTransport`
+        :param queue_size: Maximum number of queued markers, if the queue is
+            full the oldest marker is dropped
+        :type queue_size: int
+
+        """
+        self.logger = logging.getLogger("MarkerSink")
+        self.transports = list(transports)
+        self.queue_size = queue_size
+        self._queue = deque()
+        self._closed = False
+        # markers taken from the queue but not delivered yet
+        self._busy = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._deliver_loop, name="MarkerSink")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def put(self, value, timestamp=None):
+        """Queue the marker for delivery.
+
+        :param value: Marker, integers are sent as triggers too
+        :param timestamp: :func:`lib.stats.monotonic` time of the marker,
+            None for now
+        :type timestamp: float
+        :returns: The timestamp of the marker
+
+        """
+        if timestamp is None:
+            timestamp = monotonic()
+        self._cond.acquire()
+        try:
+            if len(self._queue) >= self.queue_size:
+                self._queue.popleft()
+                for transport in self.transports:
+                    transport.dropped += 1
+            self._queue.append((timestamp, value))
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        return timestamp
+
+    def flush(self, timeout=1.0):
+        """Wait until all queued markers are delivered.
+
+        :param timeout: Maximum time to wait in seconds
+        :type timeout: float
+        :returns: True if the queue is empty, False otherwise
+
+        """
+        deadline = monotonic() + timeout
+        self._cond.acquire()
+        try:
+            while self._queue or self._busy:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+        finally:
+            self._cond.release()
+
+    def stats(self):
+        """Return the statistics of the transports.
+
+        :returns: dictionary: transport name -> dictionary with sent,
+            dropped and latency
+
+        """
+        return dict([(t.name, {"sent" : t.sent,
+                               "dropped" : t.dropped,
+                               "latency" : t.latency.summary()})
+                     for t in self.transports])
+
+    def close(self):
+        """Deliver the queued markers, stop the thread and close the
+        transports."""
+        self._cond.acquire()
+        try:
+            self._closed = True
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        self._thread.join()
+        for transport in self.transports:
+            try:
+                transport.close()
+            except:
+                self.logger.exception("Closing %s failed:" % transport.name)
+
+    def _deliver_loop(self):
+        while True:
+            self._cond.acquire()
+            try:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                markers = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            finally:
+                self._cond.release()
+            for transport in self.transports:
+                self._deliver(transport, markers)
+            self._cond.acquire()
+            try:
+                self._busy = False
+                self._cond.notifyAll()
+            finally:
+                self._cond.release()
+
+    def _deliver(self, transport, markers):
+        try:
+            n = transport.deliver(markers)
+        except:
+            self.logger.exception("Delivering markers via %s failed:" % transport.name)
+            transport.dropped += len(markers)
+            return
+        transport.sent += n
+        if n:
+            now = monotonic()
+            for t, value in markers:
+                transport.latency.add(now - t)
@@ -0,0 +1,234 @@
+# pluginindex.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Persistent index of the Feedbacks found in the plugin directories.
+
+Walking large plugin directories on network storage and parsing every
+``feedbacks.list`` is slow. The index remembers the directory tree of every
+plugin directory together with the directories' modification times and the
+hashes of the ``feedbacks.list`` files. A rescan only lists the directories
+which changed since the last scan and only parses lists whose content
+changed.
+"""
+
+
+import os
+import sys
+import time
+import tempfile
+import logging
+import cPickle as pickle
+from hashlib import md5
+
+
+# name of the file listing the Feedbacks of a directory
+FEEDBACKS_LIST = "feedbacks.list"
+# version of the index file format
+INDEX_VERSION = 1
+# default location of the index file
+DEFAULT_INDEX_FILE = os.path.join(os.path.expanduser("~"), ".pyff", "plugins.index")
+# modification times closer to the scan than this (in seconds) are not
+# trusted, the directory might change again within the file system's
+# timestamp resolution
+RACY_INTERVAL = 2.0
+
+
+class PluginIndex(object):
+    """Index of the Feedbacks in a set of plugin directories.
+
+    Usage::
+
+        index = PluginIndex()
+        index.load()
+        plugins = index.cached(plugindir)     # fast, maybe outdated
+        plugins = index.scan(plugindir, load_feedback_list)
+        index.save()
+
+    """
+
+    def __init__(self, filename=DEFAULT_INDEX_FILE):
+        """Initialize an empty index.
+
+        :param filename: File to load the index from and save it to
+        :type filename: str
+
+        """
+        self.logger = logging.getLogger("PluginIndex")
+        self.filename = filename
+        # plugindir -> directory -> entry
+        self.trees = {}
+
+    def load(self):
+        """Load the index from the index file, ignoring missing or broken
+        files."""
+        try:
+            fh = open(self.filename, "rb")
+            try:
+                data = pickle.load(fh)
+            finally:
+                fh.close()
+        except Exception, e:
+            self.logger.debug("Unable to load index %s: %s" % (self.filename, str(e)))
+            return
+        if data.get("version") == INDEX_VERSION:
+            self.trees = data["trees"]
+
+    def save(self):
+        """Save the index to the index file.
+
+        The index is written to a temporary file which replaces the index
+        file, so processes saving the same index at once do not mix their
+        writes and loading never sees a partly written file.
+        """
+        tmpname = None
+        try:
+            dirname = os.path.dirname(self.filename)
+            if dirname and not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            fd, tmpname = tempfile.mkstemp(prefix=".plugins-", dir=dirname or ".")
+            fh = os.fdopen(fd, "wb")
+            try:
+                pickle.dump({"version" : INDEX_VERSION, "trees" : self.trees},
+                            fh, pickle.HIGHEST_PROTOCOL)
+            finally:
+                fh.close()
+            if sys.platform == 'win32' and os.path.exists(self.filename):
+                # rename does not replace existing files on Windows
+                os.remove(self.filename)
+            os.rename(tmpname, self.filename)
+            tmpname = None
+        except Exception, e:
+            self.logger.warning("Unable to save index %s: %s" % (self.filename, str(e)))
+        if tmpname is not None and os.path.exists(tmpname):
+            os.remove(tmpname)
+
+    def cached(self, plugindir):
+        """Return the Feedbacks of the last scan without touching the file
+        system.
+
+        :param plugindir: Plugin directory
+        :type plugindir: str
+        :returns: dictionary: classname -> module or None if the directory
+            was never scanned.
+
+        """
+        tree = self.trees.get(plugindir)
+        if tree is None:
+            return None
+        plugins = dict()
+        self._collect(tree, plugindir, plugins)
+        return plugins
+
+    def scan(self, plugindir, load_feedback_list):
+        """Update the index of the plugin directory and return its Feedbacks.
+
+        The result is the same as walking the directory with ``os.walk`` and
+        not descending into directories containing a ``feedbacks.list``.
+
+        :param plugindir: Plugin directory
+        :type plugindir: str
+        :param load_feedback_list: Function which parses a ``feedbacks.list``,
+            called with the file name and the plugin directory.
+        :returns: dictionary: classname -> module.
+
+        """
+        tree = self.trees.setdefault(plugindir, {})
+        seen = set()
+        plugins = dict()
+        now = time.time()
+        self._scan_dir(tree, plugindir, plugindir, load_feedback_list, now, seen, plugins)
+        for path in tree.keys():
+            if path not in seen:
+                del tree[path]
+        return plugins
+
+    def _scan_dir(self, tree, path, plugindir, load_feedback_list, now, seen, plugins):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        seen.add(path)
+        entry = tree.get(path)
+        if entry is None or entry["mtime"] != mtime:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                return
+            subdirs = []
+            for name in names:
+                subpath = os.path.join(path, name)
+                # like os.walk, do not follow symbolic links
+                if os.path.isdir(subpath) and not os.path.islink(subpath):
+                    subdirs.append(name)
+            old = entry
+            entry = {"mtime" : _trusted(mtime, now),
+                     "subdirs" : subdirs,
+                     "haslist" : FEEDBACKS_LIST in names,
+                     "liststat" : None,
+                     "digest" : None,
+                     "plugins" : None}
+            if old is not None and old["haslist"]:
+                entry["digest"] = old["digest"]
+                entry["plugins"] = old["plugins"]
+            tree[path] = entry
+        if entry["haslist"]:
+            self._scan_list(entry, path, plugindir, load_feedback_list, now)
+            plugins.update(entry["plugins"])
+            return
+        for name in entry["subdirs"]:
+            self._scan_dir(tree, os.path.join(path, name), plugindir,
+                           load_feedback_list, now, seen, plugins)
+
+    def _scan_list(self, entry, path, plugindir, load_feedback_list, now):
+        filename = os.path.join(path, FEEDBACKS_LIST)
+        try:
+            st = os.stat(filename)
+            liststat = (_trusted(st.st_mtime, now), st.st_size)
+            if liststat[0] is not None and entry["liststat"] == liststat:
+                return
+            fh = open(filename, "rb")
+            try:
+                digest = md5(fh.read()).hexdigest()
+            finally:
+                fh.close()
+        except (OSError, IOError):
+            entry["liststat"] = entry["digest"] = None
+            entry["plugins"] = dict()
+            return
+        entry["liststat"] = liststat
+        if digest != entry["digest"] or entry["plugins"] is None:
+            self.logger.info("Found %s in %s" % (FEEDBACKS_LIST, path))
+            entry["plugins"] = load_feedback_list(filename, plugindir)
+            entry["digest"] = digest
+
+    def _collect(self, tree, path, plugins):
+        entry = tree.get(path)
+        if entry is None:
+            return
+        if entry["haslist"]:
+            plugins.update(entry["plugins"] or {})
+            return
+        for name in entry["subdirs"]:
+            self._collect(tree, os.path.join(path, name), plugins)
+
+
+def _trusted(mtime, now):
+    """Return the modification time or None if it is too recent to rely on."""
+    if abs(now - mtime) < RACY_INTERVAL:
+        return None
+    return mtime
@@ -28,7 +28,8 @@
 
 
 import serial
-from threading import Timer
+
+from lib import trigger
 
 
 class SerialPort(object):
@@ -43,8 +44,8 @@ class SerialPort(object):
 
         """
         self.port = serial.Serial(port=port, baudrate=baudrate)
-        self.trigger_reset_time = 0.01
-        self.reset_timer = Timer(0, None)
+        self.trigger_port = trigger.SerialPort(self.port)
+        self.trigger_reset_time = trigger.DEFAULT_RESET_TIME
 
 
     def send(self, data, reset=True):
@@ -55,12 +56,8 @@ class SerialPort(object):
         data : bytevalue
 
         """
-        if reset == True:
-            self.reset_timer.cancel()
-        self.port.write(chr(data))
-        if reset == True:
-            self.reset_timer = Timer(self.trigger_reset_time, self.send, (0, False))
-            self.reset_timer.start()
+        trigger.get_dispatcher().send(self.trigger_port, data, reset,
+                                      self.trigger_reset_time)
 
     def close(self):
         self.port.close()
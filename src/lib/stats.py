@@ -0,0 +1,152 @@
+# stats.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Lightweight timing statistics.
+
+This module provides the clock used for all latency measurements in Pyff and
+a histogram to collect latencies without storing every single value.
+"""
+
+
+import sys
+import ctypes
+import ctypes.util
+from bisect import bisect_left
+from timeit import default_timer
+
+
+# The best clock available on this platform (time.clock on Windows,
+# time.time elsewhere)
+clock = default_timer
+
+
+def _get_monotonic():
+    """Return a clock which does not jump when the system time is set."""
+    if sys.platform == "win32":
+        # time.clock is based on the performance counter
+        return default_timer
+    CLOCK_MONOTONIC = 1
+    class timespec(ctypes.Structure):
+        _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+    try:
+        librt = ctypes.CDLL(ctypes.util.find_library("rt") or "librt.so.1", use_errno=True)
+        clock_gettime = librt.clock_gettime
+    except (OSError, AttributeError):
+        return default_timer
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    def monotonic():
+        ts = timespec()
+        clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts))
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+    return monotonic
+
+# Monotonic clock in seconds with an arbitrary start, use it for deadlines
+monotonic = _get_monotonic()
+
+# Upper bounds of the histogram buckets in seconds: 1us, 2us, 4us, ... ~1s
+BUCKETS = tuple([2**i / 1e6 for i in range(21)])
+
+
+class LatencyHistogram(object):
+    """Histogram of latencies with logarithmic buckets.
+
+    Usage::
+
+        h = LatencyHistogram()
+        t0 = clock()
+        ...
+        h.add(clock() - t0)
+        print h.percentile(99)
+
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """Initialize an empty histogram.
+
+        :param buckets: Ascending upper bounds of the buckets in seconds,
+            an additional bucket collects everything above the last bound.
+        :type buckets: tuple
+
+        """
+        self.buckets = buckets
+        self.reset()
+
+    def reset(self):
+        """Remove all values from the histogram."""
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, latency):
+        """Add a value to the histogram.
+
+        :param latency: Latency in seconds
+        :type latency: float
+
+        """
+        self.counts[bisect_left(self.buckets, latency)] += 1
+        self.count += 1
+        self.total += latency
+        if self.min is None or latency < self.min:
+            self.min = latency
+        if self.max is None or latency > self.max:
+            self.max = latency
+
+    def mean(self):
+        """Return the mean latency or None if the histogram is empty."""
+        if not self.count:
+            return None
+        return self.total / self.count
+
+    def percentile(self, p):
+        """Return the upper bound of the bucket containing the p-th percentile.
+
+        :param p: Percentile between 0 and 100
+        :type p: float
+        :returns: Latency in seconds or None if the histogram is empty
+
+        """
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if n and seen >= rank:
+                if i < len(self.buckets):
+                    return min(self.buckets[i], self.max)
+                return self.max
+        return self.max
+
+    def summary(self):
+        """Return a dictionary with count, mean, min, max, p50 and p99."""
+        return {"count" : self.count,
+                "mean" : self.mean(),
+                "min" : self.min,
+                "max" : self.max,
+                "p50" : self.percentile(50),
+                "p99" : self.percentile(99)}
+
+    def __str__(self):
+        if not self.count:
+            return "no values"
+        return "n=%i mean=%.1fus p50<=%.1fus p99<=%.1fus max=%.1fus" % (
+                self.count, self.mean() * 1e6, self.percentile(50) * 1e6,
+                self.percentile(99) * 1e6, self.max * 1e6)
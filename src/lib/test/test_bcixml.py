@@ -18,6 +18,9 @@
 
 
 import unittest
+import sys
+import cPickle as pickle
+from cStringIO import StringIO
 from xml.dom import minidom, Node
 
 from lib import bcixml
@@ -176,9 +179,216 @@ class BcixmlTestCase(unittest.TestCase):
         signal2 = self.decoder.decode_packet(xml)
         self.assertEqual(signal.commands, signal2.commands)
 
+
+class FastXmlDecoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = bcixml.XmlEncoder()
+        self.decoder = bcixml.XmlDecoder()
+        self.fastdecoder = bcixml.FastXmlDecoder()
+        data = {"boolean" : True,
+                "integer" : 1,
+                "float" : 0.69,
+                "long" : long(1),
+                "complex" : 1+2j,
+                "string" : "foo",
+                "unicode" : u"\xdf",
+                "none" : None,
+                "list" : [1, 2, 3, 4, 5, 6],
+                "llist" : [[1], [[1], 2], [[[1], [2]], [3]]],
+                "tuple" : (1, 2, 3, 4, 5, 6),
+                "set" : set([1, 2, 3]),
+                "frozenset" : frozenset([1, 2, 3, 4, 5]),
+                "ddict" : {"key" : "value", "d" : {"foo" : 1, "bar" : 2}}}
+        commands = [("start", {"foo" : 1}), ("init", dict())]
+        self.packets = [
+            self.encoder.encode_packet(bcixml.BciSignal({"cl_output" : 0.5}, None, bcixml.CONTROL_SIGNAL)),
+            self.encoder.encode_packet(bcixml.BciSignal({"cl_output" : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]}, None, bcixml.CONTROL_SIGNAL)),
+            self.encoder.encode_packet(bcixml.BciSignal(data, commands, bcixml.INTERACTION_SIGNAL)),
+            self.encoder.encode_packet(bcixml.BciSignal(None, None, bcixml.REPLY_SIGNAL)),
+            # name and value as child elements
+            """<?xml version="1.0" ?><bci-signal version="1.0"><control-signal><f><name>foo</name><value>1.5</value></f></control-signal></bci-signal>""",
+            ]
+
+    def testIdenticalSignals(self):
+        """Should produce byte-identical BciSignals like the XmlDecoder."""
+        for packet in self.packets:
+            self.assertEqual(self.__dump(self.decoder.decode_packet(packet)),
+                             self.__dump(self.fastdecoder.decode_packet(packet)))
+
+    def testDecodeUnsupportedSignalType(self):
+        """Should throw an Exception on decoding an unknown signal type."""
+        xml = """<?xml version="1.0" ?><bci-signal version="1.0"><foo/></bci-signal>"""
+        self.assertRaises(bcixml.DecodingError, self.fastdecoder.decode_packet, xml)
+
+    def testDecodeInvalidXml(self):
+        """Should throw an Exception on decoding invalid XML."""
+        self.assertRaises(bcixml.DecodingError, self.fastdecoder.decode_packet, "<bci-signal>")
+
+    def testDecodeUnknownType(self):
+        """Should throw an Exception on decoding an unknown element."""
+        xml = """<?xml version="1.0" ?><bci-signal version="1.0"><control-signal><foo name="bar" value="1"/></control-signal></bci-signal>"""
+        self.assertRaises(bcixml.DecodingError, self.fastdecoder.decode_packet, xml)
+
+    def __dump(self, signal):
+        # without memoization, so the output does not depend on refcounts
+        f = StringIO()
+        p = pickle.Pickler(f, 0)
+        p.fast = True
+        p.dump((signal.type, signal.data, signal.commands))
+        return f.getvalue()
+
+
+class CachingXmlEncoderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = bcixml.XmlEncoder()
+        self.cachingencoder = bcixml.CachingXmlEncoder(maxsize=2)
+        self.decoder = bcixml.XmlDecoder()
+
+    def testSameOutput(self):
+        """Should produce the same XML like the XmlEncoder."""
+        class Foo(object):
+            pass
+        values = [True, 1, 0.69, long(1), 1+2j, "foo", u"\xdf", None,
+                  'a&b<c>"d"%s', [], [1, [2, 3]], (1, (2,)), set([1, 2]),
+                  frozenset([1]), {"foo" : 1, "bar" : {"baz" : None}},
+                  {"foo" : Foo()}, [Foo()]]
+        for value in values:
+            for name in ("somename", "100%", ""):
+                signal = bcixml.BciSignal({name : value}, [("play", {"x" : value}), ("stop", None)], bcixml.CONTROL_SIGNAL)
+                self.assertEqual(self.encoder.encode_packet(signal),
+                                 self.cachingencoder.encode_packet(signal))
+
+    def testEmptySignal(self):
+        """Should produce the same XML for empty signals."""
+        signal = bcixml.BciSignal(None, None, bcixml.REPLY_SIGNAL)
+        self.assertEqual(self.encoder.encode_packet(signal),
+                         self.cachingencoder.encode_packet(signal))
+
+    def testManyVariables(self):
+        """Should encode many variables decodable by the XmlDecoder."""
+        data = dict([("var%i" % i, [i, str(i), float(i)]) for i in range(300)])
+        signal = bcixml.BciSignal({"variables" : data}, None, bcixml.REPLY_SIGNAL)
+        for i in range(2):
+            xml = self.cachingencoder.encode_packet(signal)
+            self.assertEqual(self.decoder.decode_packet(xml).data, signal.data)
+        self.assertEqual(self.cachingencoder.hits, 1)
+
+    def testCacheBound(self):
+        """Should drop the least recently used templates."""
+        for value in 1, 1.0, 1, "foo", 1.0:
+            signal = bcixml.BciSignal({"foo" : value}, None, bcixml.CONTROL_SIGNAL)
+            self.cachingencoder.encode_packet(signal)
+        self.assertEqual(len(self.cachingencoder.templates), 2)
+        self.assertEqual(self.cachingencoder.hits, 1)
+        self.assertEqual(self.cachingencoder.misses, 4)
+
+    def testEncodeUnsupportedSignalType(self):
+        """Should throw an Exception on encoding an unknown signal type."""
+        signal = bcixml.BciSignal(None, None, "foo")
+        self.assertRaises(bcixml.EncodingError, self.cachingencoder.encode_packet, signal)
+
+
+class BinaryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = bcixml.BinaryEncoder()
+        self.decoder = bcixml.BinaryDecoder()
+
+    def testTypes(self):
+        """Should correctly en/decode every supported type."""
+        values = [True, False, 0, 1, 191, 192, -1, 2**31, -2**40, sys.maxint,
+                  -sys.maxint-1, 0.69, -1e300, long(1), 2**100, 1+2j, "",
+                  "foo\x00\xff", u"", u"\xdf", None, [], [1, [2, [3]]],
+                  (), (1, (2,)), set([1, "a"]), frozenset([1, (2, 3)]), {},
+                  {"foo" : 1, 2 : {"bar" : [None]}, (1, 2) : u"baz"}]
+        for value in values:
+            self.__convert_and_compare("somename", value)
+
+    def testUnsupported(self):
+        """Should convert or ignore unsupported types."""
+        class Foo(object):
+            def __unicode__(self):
+                return u"foo"
+        self.__convert_and_compare("somename", Foo(), u"foo")
+        self.__convert_and_compare("somename", [Foo()], [u"foo"])
+        self.__convert_and_compare("somename", {"foo" : Foo()}, {})
+
+    def testSubclasses(self):
+        """Should store subclasses of supported types as their base type."""
+        class MyInt(int):
+            pass
+        self.__convert_and_compare("somename", MyInt(3), 3)
+
+    def testSignalTypes(self):
+        """Should support all signal types."""
+        for t in bcixml.SIGNAL_TYPES:
+            signal = bcixml.BciSignal({"foo" : 1}, None, t)
+            signal2 = self.decoder.decode_packet(self.encoder.encode_packet(signal))
+            self.assertEqual(signal2.type, t)
+
+    def testCommands(self):
+        """Should support Commands with and without arguments."""
+        commands = [(bcixml.CMD_PLAY, dict()), (bcixml.CMD_SAVE_VARIABLES, {"filename" : "foo"})]
+        signal = bcixml.BciSignal(None, commands, bcixml.INTERACTION_SIGNAL)
+        signal2 = self.decoder.decode_packet(self.encoder.encode_packet(signal))
+        self.assertEqual(signal2.commands, commands)
+
+    def testEncodeUnsupportedSignalType(self):
+        """Should throw an Exception on encoding an unknown signal type."""
+        signal = bcixml.BciSignal(None, None, "foo")
+        self.assertRaises(bcixml.EncodingError, self.encoder.encode_packet, signal)
+
+    def testDecodeInvalidPackets(self):
+        """Should throw an Exception on decoding invalid packets."""
+        signal = bcixml.BciSignal({"foo" : [1, 2, "bar"]}, [("play", None)], bcixml.CONTROL_SIGNAL)
+        packet = self.encoder.encode_packet(signal)
+        invalid = ["", "<bci-signal/>", packet[:-1], packet + "\x00",
+                   "XYZ" + packet[3:],
+                   packet[:3] + "\x02" + packet[4:],
+                   packet[:4] + "\x03" + packet[5:]]
+        for p in invalid:
+            self.assertRaises(bcixml.DecodingError, self.decoder.decode_packet, p)
+
+    def testSmallerThanXml(self):
+        """Should produce smaller packets than XML."""
+        signal = bcixml.BciSignal({"cl_output" : [0.1, 0.2, 0.3, 0.4, 0.5, 0.6]}, None, bcixml.CONTROL_SIGNAL)
+        self.assertTrue(len(self.encoder.encode_packet(signal)) <
+                        len(bcixml.XmlEncoder().encode_packet(signal)) / 2)
+
+    def __convert_and_compare(self, name, value, value2=None):
+        signal = bcixml.BciSignal({name : value}, None, bcixml.INTERACTION_SIGNAL)
+        packet = self.encoder.encode_packet(signal)
+        signal2 = self.decoder.decode_packet(packet)
+        if value2 is None:
+            value2 = value
+        self.assertTrue(signal2.data.has_key(name))
+        self.assertEqual(signal2.data[name], value2)
+        self.assertEqual(type(signal2.data[name]), type(value2))
+
+
+class JsonTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = bcixml.JsonEncoder()
+        self.decoder = bcixml.JsonDecoder()
+
+    def testStripUnsupported(self):
+        """Should ignore variables which cannot be converted to JSON."""
+        signal = bcixml.BciSignal({"foo" : 1, "bar" : object()}, None, bcixml.INTERACTION_SIGNAL)
+        signal2 = self.decoder.decode_packet(self.encoder.encode_packet(signal))
+        self.assertEqual(signal2.data, {"foo" : 1})
+
+
 #suite = unittest.makeSuite(BcixmlTestCase)
 def suite():
-    testSuite = unittest.makeSuite(BcixmlTestCase)
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(unittest.makeSuite(BcixmlTestCase))
+    testSuite.addTest(unittest.makeSuite(FastXmlDecoderTestCase))
+    testSuite.addTest(unittest.makeSuite(CachingXmlEncoderTestCase))
+    testSuite.addTest(unittest.makeSuite(BinaryTestCase))
+    testSuite.addTest(unittest.makeSuite(JsonTestCase))
     return testSuite
 
 def main():
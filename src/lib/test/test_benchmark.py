@@ -0,0 +1,87 @@
+# test_benchmark.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import time
+
+from FeedbackBase.MainloopFeedback import MainloopFeedback
+from lib.benchmark import feedback as benchmark
+
+
+class CountingFeedback(MainloopFeedback):
+
+    def init(self):
+        self.playTicks = 0
+        self.pauseTicks = 0
+        self.controlEvents = 0
+
+    def tick(self):
+        time.sleep(0.001)
+
+    def play_tick(self):
+        self.playTicks += 1
+
+    def pause_tick(self):
+        self.pauseTicks += 1
+
+    def on_control_event(self, data):
+        self.controlEvents += 1
+
+
+class BenchmarkTestCase(unittest.TestCase):
+
+    def testRunFeedback(self):
+        """Should run the Feedback through the session and record its ticks."""
+        feedbacks = []
+        def fbclass():
+            fb = CountingFeedback()
+            feedbacks.append(fb)
+            return fb
+        fbclass.__name__ = "CountingFeedback"
+        report = benchmark.run_feedback(fbclass, 0.4, 100)
+        fb = feedbacks[0]
+        self.assertTrue(fb.playTicks > 0)
+        self.assertTrue(fb.pauseTicks > 0)
+        self.assertTrue(fb.controlEvents > 0)
+        self.assertEqual(report["ticks"], fb.playTicks + fb.pauseTicks)
+        self.assertEqual(report["feedback"], "CountingFeedback")
+        self.assertTrue(report["tick_time"]["p50"] >= 0.001)
+        self.assertEqual(report["frame_time"]["count"], report["ticks"] - 1)
+
+    def testCompareReports(self):
+        """Should only report values slower than the tolerance."""
+        baseline = {"tick_time" : {"p50" : 0.01, "p99" : 0.02},
+                    "frame_time" : {"p50" : 0.03},
+                    "cpu_time" : {"mean" : None}}
+        report = {"tick_time" : {"p50" : 0.0119, "p99" : 0.03},
+                  "frame_time" : {"p50" : 0.01},
+                  "cpu_time" : {"mean" : 0.5}}
+        self.assertEqual(benchmark.compare_reports(baseline, report, 0.2),
+                         [("tick_time.p99", 0.02, 0.03)])
+
+
+def suite():
+    testSuite = unittest.makeSuite(BenchmarkTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# test_controlring.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from lib.controlring import ControlSignalRing
+
+
+class ControlSignalRingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = ControlSignalRing(slots=4, width=3)
+        self.ring.attach()
+
+    def testNotAttached(self):
+        """Should not write if no reader is attached."""
+        self.ring.detach()
+        self.assertFalse(self.ring.write({"cl_output" : 1.0}))
+
+    def testScalar(self):
+        """Should transport scalars."""
+        self.assertTrue(self.ring.write({"cl_output" : 1}))
+        seq, data = self.ring.read_latest()
+        self.assertEqual(data, {"cl_output" : 1.0})
+
+    def testVector(self):
+        """Should transport lists and tuples of numbers."""
+        self.assertTrue(self.ring.write({"cl_output" : (1, 2.5)}))
+        seq, data = self.ring.read_latest()
+        self.assertEqual(data, {"cl_output" : [1.0, 2.5]})
+
+    def testRejectUnsupported(self):
+        """Should reject data which does not fit into a record."""
+        for data in ({"cl_output" : [1, 2, 3, 4]},
+                     {"cl_output" : "foo"},
+                     {"cl_output" : True},
+                     {"cl_output" : 1, "foo" : 2},
+                     {"foo" : 1}):
+            self.assertFalse(self.ring.write(data))
+
+    def testLatestOnly(self):
+        """Should return only the latest record and only once."""
+        for i in range(10):
+            self.ring.write({"cl_output" : i})
+        seq, data = self.ring.read_latest()
+        self.assertEqual(data, {"cl_output" : 9.0})
+        seq, data = self.ring.read_latest(seq)
+        self.assertEqual(data, None)
+
+
+def suite():
+    testSuite = unittest.makeSuite(ControlSignalRingTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# test_feedbackprocesscontroller.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import logging
+
+from FeedbackBase.Feedback import Feedback
+from lib.feedbackprocesscontroller import FeedbackProcessController, WarmFeedbackProcess
+
+
+class WarmPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # FeedbackProcess copies the format of the first log handler
+        logging.basicConfig()
+
+    def testDismiss(self):
+        """An idle warm process should terminate when dismissed."""
+        worker = WarmFeedbackProcess()
+        worker.start()
+        worker.dismiss()
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertEqual(worker.exitcode, 0)
+
+    def testPool(self):
+        """Should keep the pool filled until it is shut down."""
+        fpc = FeedbackProcessController([], Feedback, 1, poolsize=2, index=None)
+        self.assertEqual(len(fpc.pool), 2)
+        workers = list(fpc.pool)
+        fpc.shutdown_pool()
+        self.assertEqual(fpc.pool, [])
+        self.assertEqual(fpc._take_worker(), None)
+        for worker in workers:
+            self.assertFalse(worker.is_alive())
+
+    def testMaintainPool(self):
+        """Should replace taken workers only when asked to."""
+        fpc = FeedbackProcessController([], Feedback, 1, poolsize=2, index=None)
+        try:
+            worker = fpc._take_worker()
+            worker.dismiss()
+            worker.join(5)
+            self.assertEqual(len(fpc.pool), 1)
+            fpc.maintain_pool()
+            self.assertEqual(len(fpc.pool), 2)
+        finally:
+            fpc.shutdown_pool()
+        fpc.maintain_pool()
+        self.assertEqual(fpc.pool, [])
+
+
+def suite():
+    testSuite = unittest.makeSuite(WarmPoolTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# test_flashsequence.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from lib.P300Aux.FlashSequence import FlashSequenceGenerator, FlashSequencePool
+from lib.benchmark import flashsequence
+
+
+class FlashSequenceTestCase(unittest.TestCase):
+
+    def assertMinDist(self, flashes, min_dist, conflicts):
+        for i in range(len(flashes)):
+            for j in range(i + 1, min(i + min_dist + 1, len(flashes))):
+                self.assertFalse(conflicts(flashes[i], flashes[j]),
+                                 "%s: flashes %d and %d too close" % (list(flashes), i, j))
+
+    def testBalanced(self):
+        """Should flash every group once per sequence."""
+        gen = FlashSequenceGenerator(6, 10, min_dist=2, seed=1)
+        for _ in range(20):
+            flashes = gen.trial()
+            self.assertEqual(len(flashes), 60)
+            for s in range(10):
+                self.assertEqual(sorted(flashes[s * 6:(s + 1) * 6]), range(6))
+            self.assertMinDist(flashes, 2, lambda a, b: a == b)
+
+    def testUnbalanced(self):
+        """Should draw with repetition, but never closer than min_dist."""
+        gen = FlashSequenceGenerator(6, 5, min_dist=3, balanced=False, seq_len=11, seed=1)
+        for _ in range(20):
+            flashes = gen.trial()
+            self.assertEqual(len(flashes), 55)
+            self.assertMinDist(flashes, 3, lambda a, b: a == b)
+
+    def testMembers(self):
+        """Should keep groups sharing a member apart."""
+        members = [[0, 1], [1, 2], [2, 3], [3, 4], [4, 5], [5, 0], [6], [7]]
+        overlap = lambda a, b: bool(set(members[a]) & set(members[b]))
+        gen = FlashSequenceGenerator(8, 5, min_dist=1, members=members, seed=1)
+        for _ in range(20):
+            self.assertMinDist(gen.trial(), 1, overlap)
+
+    def testSequenceTail(self):
+        """Should respect the flashes before the sequence."""
+        gen = FlashSequenceGenerator(4, 1, min_dist=2, seed=1)
+        for _ in range(20):
+            self.assertMinDist([0, 1] + list(gen.sequence([3, 2, 0, 1])), 2,
+                               lambda a, b: a == b)
+
+    def testSeed(self):
+        """Should repeat the trials for the same seed."""
+        a = FlashSequenceGenerator(6, 10, min_dist=2, seed=42)
+        b = FlashSequenceGenerator(6, 10, min_dist=2, seed=42)
+        self.assertEqual(list(a.trial()), list(b.trial()))
+
+    def testImpossible(self):
+        """Should fail if no sequence satisfies the constraints."""
+        gen = FlashSequenceGenerator(6, 2, min_dist=6, max_batches=2)
+        self.assertRaises(ValueError, gen.trial)
+        self.assertRaises(ValueError, FlashSequenceGenerator, 6, 2, seq_len=7)
+
+    def testPool(self):
+        """Should hand out precomputed trials."""
+        pool = FlashSequencePool(FlashSequenceGenerator(6, 10, min_dist=2), 2)
+        try:
+            for _ in range(5):
+                self.assertEqual(len(pool.get()), 60)
+            self.assertEqual(pool.hits + pool.misses, 5)
+        finally:
+            pool.close()
+
+    def testBenchmark(self):
+        """Should measure every configuration."""
+        results = flashsequence.run(min_time=0.001)["results"]
+        for name in flashsequence.CONFIGS:
+            self.assertTrue(results["generator.trial/%s" % name]["iterations"] > 0)
+            self.assertTrue(results["pool.get/%s" % name]["iterations"] > 0)
+
+
+def suite():
+    testSuite = unittest.makeSuite(FlashSequenceTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
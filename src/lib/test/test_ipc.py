@@ -0,0 +1,144 @@
+# test_ipc.py -
+# Copyright (C) 2009  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import asyncore
+import socket
+
+from lib import ipc
+
+
+class RecordingChannel(ipc.IPCChannel):
+
+    def __init__(self, conn, reactor=None):
+        ipc.IPCChannel.__init__(self, conn, reactor)
+        self.received = []
+
+    def handle_message(self, message):
+        self.received.append(message)
+
+
+class IPCChannelTestCase(unittest.TestCase):
+
+    def setUp(self):
+        asyncore.socket_map.clear()
+        a, b = socket.socketpair()
+        self.fc = RecordingChannel(a)
+        self.fb = RecordingChannel(b)
+
+    def tearDown(self):
+        self.fc.close()
+        self.fb.close()
+        asyncore.socket_map.clear()
+
+    def testTerminatorFraming(self):
+        """Should transport messages in legacy framing mode."""
+        self.fb.send_message("foo")
+        self.fc.send_message({"bar" : 1})
+        self._loop()
+        self.assertEqual(self.fc.received, ["foo"])
+        self.assertEqual(self.fb.received, [{"bar" : 1}])
+
+    def testNegotiateLengthFraming(self):
+        """Both directions should switch to length-prefixed framing."""
+        self.fc.send_message("before")
+        self.fb.request_length_framing()
+        self.fb.send_message("after")
+        self._loop()
+        self.fc.send_message("after")
+        self._loop()
+        for chan in self.fc, self.fb:
+            self.assertEqual(chan.recv_framing, ipc.FRAMING_LENGTH)
+            self.assertEqual(chan.send_framing, ipc.FRAMING_LENGTH)
+        self.assertEqual(self.fc.received, ["after"])
+        self.assertEqual(self.fb.received, ["before", "after"])
+
+    def testPayloadContainingTerminator(self):
+        """Should not split payloads containing the terminator."""
+        self.fb.request_length_framing()
+        self._loop()
+        message = "foo" + ipc.TERMINATOR + "bar"
+        self.fb.send_message(message)
+        self.fc.send_message(message)
+        self._loop()
+        self.assertEqual(self.fc.received, [message])
+        self.assertEqual(self.fb.received, [message])
+
+    def testPayloadLargerThanBuffer(self):
+        """Should grow the payload buffer for large messages."""
+        self.fb.request_length_framing()
+        self._loop()
+        messages = ["x" * (ipc.INITIAL_BUFFER_SIZE * 3), "small", range(10000)]
+        for m in messages:
+            self.fb.send_message(m)
+        self._loop()
+        self.assertEqual(self.fc.received, messages)
+
+    def _loop(self):
+        asyncore.loop(timeout=0.001, count=100)
+
+
+class ReactorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        asyncore.socket_map.clear()
+        self.reactor = ipc.Reactor()
+        a, b = socket.socketpair()
+        self.fc = RecordingChannel(a, self.reactor)
+        self.fb = RecordingChannel(b, self.reactor)
+
+    def tearDown(self):
+        self.reactor.close_all()
+
+    def testOwnMap(self):
+        """Should register the dispatchers in the reactor's map only."""
+        self.assertEqual(len(self.reactor.map), 2)
+        self.assertEqual(len(asyncore.socket_map), 0)
+
+    def testDispatch(self):
+        """Should dispatch messages in both directions."""
+        self.fb.request_length_framing()
+        self.fb.send_message("x" * 100000)
+        self.fc.send_message("bar")
+        self._loop()
+        self.assertEqual(self.fc.received, ["x" * 100000])
+        self.assertEqual(self.fb.received, ["bar"])
+
+    def testLoopEndsWhenClosed(self):
+        """Should leave the loop once all dispatchers are closed."""
+        self.reactor.close_all()
+        self.reactor.loop()
+        self.assertEqual(len(self.reactor.map), 0)
+
+    def _loop(self):
+        for i in range(50):
+            self.reactor.poll()
+
+
+def suite():
+    testSuite = unittest.TestSuite()
+    testSuite.addTest(unittest.makeSuite(IPCChannelTestCase))
+    testSuite.addTest(unittest.makeSuite(ReactorTestCase))
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
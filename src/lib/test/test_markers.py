@@ -0,0 +1,154 @@
+# test_markers.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import socket
+import unittest
+from threading import Event
+
+from lib import markers
+from lib import trigger
+
+
+class RecordingTransport(markers.MarkerTransport):
+
+    name = "recording"
+
+    def __init__(self, block=None):
+        markers.MarkerTransport.__init__(self)
+        self.batches = []
+        self.block = block
+
+    def deliver(self, batch):
+        if self.block:
+            self.block.wait()
+        self.batches.append(batch)
+        return len(batch)
+
+
+class FailingTransport(markers.MarkerTransport):
+
+    name = "failing"
+
+    def deliver(self, batch):
+        raise IOError("no device")
+
+
+class MarkerSinkTestCase(unittest.TestCase):
+
+    def testDeliverToAllTransports(self):
+        """Should deliver every marker with its timestamp to all transports."""
+        a, b = RecordingTransport(), RecordingTransport()
+        sink = markers.MarkerSink([a, b])
+        t = sink.put("start")
+        self.failUnless(sink.flush())
+        sink.close()
+        self.assertEqual(a.batches, [[(t, "start")]])
+        self.assertEqual(b.batches, [[(t, "start")]])
+        self.assertEqual(sink.stats()["recording"]["sent"], 1)
+
+    def testBatch(self):
+        """Should deliver markers queued meanwhile in one batch."""
+        block = Event()
+        transport = RecordingTransport(block)
+        sink = markers.MarkerSink([transport])
+        sink.put(1)
+        # wait until the first marker is taken from the queue
+        while not sink._busy:
+            pass
+        for i in range(2, 5):
+            sink.put(i)
+        block.set()
+        sink.close()
+        self.assertEqual([[v for t, v in b] for b in transport.batches], [[1], [2, 3, 4]])
+
+    def testDropOldest(self):
+        """Should drop the oldest markers if the queue is full."""
+        block = Event()
+        transport = RecordingTransport(block)
+        sink = markers.MarkerSink([transport], queue_size=2)
+        sink.put(0)
+        # wait until the first marker is taken from the queue
+        while not sink._busy:
+            pass
+        for i in range(1, 5):
+            sink.put(i)
+        block.set()
+        sink.close()
+        self.assertEqual([[v for t, v in b] for b in transport.batches], [[0], [3, 4]])
+        self.assertEqual(transport.dropped, 2)
+
+    def testFailingTransport(self):
+        """Should count the markers of a failing transport as dropped."""
+        transport = RecordingTransport()
+        sink = markers.MarkerSink([FailingTransport(), transport])
+        sink.put(1)
+        sink.close()
+        stats = sink.stats()
+        self.assertEqual(stats["failing"]["dropped"], 1)
+        self.assertEqual(stats["recording"]["sent"], 1)
+
+    def testTriggerTransport(self):
+        """Should write only integer markers to the port."""
+        port = trigger.LoopbackPort()
+        sink = markers.MarkerSink([markers.TriggerTransport(port)])
+        sink.put("text")
+        sink.put(7)
+        sink.close()
+        self.assertEqual(port.values[0], 7)
+
+    def testTriggerSpacing(self):
+        """Should hold every queued trigger for the reset time."""
+        port = trigger.LoopbackPort()
+        port.name = "spacing"
+        reset_time = 0.01
+        sink = markers.MarkerSink([markers.TriggerTransport(port, reset_time)])
+        for value in [11, 12, 13]:
+            sink.put(value)
+        sink.close()
+        dispatcher = trigger.get_dispatcher()
+        end = time.time() + 1.0
+        while dispatcher.pending() and time.time() < end:
+            time.sleep(0.001)
+        self.assertEqual(port.values, [11, 0, 12, 0, 13, 0])
+        records = [(t, v) for t, name, v in dispatcher.records if name == "spacing"]
+        for (t1, v1), (t2, v2) in zip(records[:-1], records[1:]):
+            self.failUnless(t2 - t1 >= reset_time, "%d held for %fs" % (v1, t2 - t1))
+
+    def testUdpTransport(self):
+        """Should send the markers as lines in one datagram."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(("127.0.0.1", 0))
+        receiver.settimeout(1.0)
+        transport = markers.UdpTransport("127.0.0.1", receiver.getsockname()[1])
+        self.assertEqual(transport.deliver([(0.0, "S 1"), (0.0, 2)]), 2)
+        self.assertEqual(receiver.recv(4096), "S 1\n2\n")
+        transport.close()
+        receiver.close()
+
+
+def suite():
+    testSuite = unittest.makeSuite(MarkerSinkTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
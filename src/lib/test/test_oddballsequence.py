@@ -0,0 +1,82 @@
+# test_oddballsequence.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+import numpy
+
+from lib.ExperimentalDesign.OddballSequence import oddball_sequence, \
+    class_counts, class_sequence, deviant_count
+
+
+class OddballSequenceTestCase(unittest.TestCase):
+
+    def testDeviants(self):
+        """Should place exactly the deviants with the minimum spacing."""
+        for n, k, d in [(100, 10, 3), (10, 3, 2), (7, 3, 2), (50, 0, 5), (5, 5, 0)]:
+            for seed in range(20):
+                seq = oddball_sequence(n, k, d, seed)
+                self.assertEqual(seq.dtype, numpy.int8)
+                self.assertEqual(len(seq), n)
+                self.assertEqual(seq.sum(), k)
+                positions = numpy.flatnonzero(seq)
+                self.assertTrue((numpy.diff(positions) > d).all())
+
+    def testTight(self):
+        """Should find the only sequence if the constraints are tight."""
+        self.assertEqual(list(oddball_sequence(7, 3, 2)), [1, 0, 0, 1, 0, 0, 1])
+        self.assertRaises(ValueError, oddball_sequence, 6, 3, 2)
+
+    def testUniform(self):
+        """Should draw every valid sequence about equally often."""
+        counts = dict()
+        rs = numpy.random.RandomState(0)
+        for _ in range(3000):
+            seq = tuple(oddball_sequence(5, 2, 1, rs))
+            counts[seq] = counts.get(seq, 0) + 1
+        # C(4, 2) sequences with two deviants and a standard in between
+        self.assertEqual(len(counts), 6)
+        self.assertTrue(min(counts.values()) > 400)
+
+    def testSeed(self):
+        """Should repeat the sequences for the same seed."""
+        self.assertEqual(list(oddball_sequence(100, 20, 2, 42)),
+                         list(oddball_sequence(100, 20, 2, 42)))
+        self.assertEqual(list(class_sequence(20, [.4, .6], 42)),
+                         list(class_sequence(20, [.4, .6], 42)))
+
+    def testClasses(self):
+        """Should give every class its share of the stimuli."""
+        self.assertEqual(class_counts(20, [.4, .6]), [8, 12])
+        self.assertEqual(class_counts(10, [1/3., 1/3., 1/3.]), [4, 3, 3])
+        seq = class_sequence(20, [.25, .25, .5], 1)
+        self.assertEqual(seq.dtype, numpy.int8)
+        self.assertEqual(list(numpy.bincount(seq)), [5, 5, 10])
+        self.assertEqual(deviant_count(30, .25), 8)
+
+
+def suite():
+    testSuite = unittest.makeSuite(OddballSequenceTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# test_orthogonaldesign.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import itertools
+
+from lib.ExperimentalDesign.OrthogonalDesign import OrthogonalDesign, \
+    orthogonalDesign, latin_square
+
+
+class OrthogonalDesignTestCase(unittest.TestCase):
+
+    def testOrthogonalDesign(self):
+        """Should keep the output of orthogonalDesign."""
+        trials = [[1, 3], [1, 4], [2, 3], [2, 4]]
+        self.assertEqual(orthogonalDesign([(1, 2), (3, 4)], 8), trials * 2)
+        # no state leaks between calls
+        self.assertEqual(orthogonalDesign([(1, 2), (3, 4)], 4), trials)
+        self.assertEqual(orthogonalDesign([(1, 2), (3, 4)], 7), trials)
+        self.assertEqual(orthogonalDesign([(1, 2), (3, 4)], None), trials)
+
+    def testBalanced(self):
+        """Should present every cell once per block."""
+        for counterbalance in [None, 'shuffle', 'latin']:
+            design = OrthogonalDesign([(1, 2), 'abc'], 60, counterbalance)
+            trials = list(design)
+            self.assertEqual(len(trials), len(design))
+            for b in range(10):
+                self.assertEqual(sorted(trials[b * 6:(b + 1) * 6]),
+                                 [(1, 'a'), (1, 'b'), (1, 'c'), (2, 'a'), (2, 'b'), (2, 'c')])
+
+    def testRemainder(self):
+        """Should handle incomplete blocks as requested."""
+        self.assertRaises(ValueError, OrthogonalDesign, [(1, 2), (3, 4)], 7)
+        self.assertEqual(len(OrthogonalDesign([(1, 2), (3, 4)], 7, remainder='truncate')), 4)
+        design = OrthogonalDesign([(1, 2), (3, 4)], 7, 'latin', 'partial')
+        self.assertEqual(len(list(design)), 7)
+        self.assertEqual(len(design.index_array()), 7)
+
+    def testIndexArray(self):
+        """Should give the same trials as the iteration."""
+        for counterbalance in [None, 'shuffle', 'latin']:
+            design = OrthogonalDesign([(1, 2, 3), (4, 5)], 500, counterbalance, 'partial')
+            levels = [(design.factors[0][i], design.factors[1][j])
+                      for i, j in design.index_array().tolist()]
+            self.assertEqual(levels, list(design))
+            # iterating again gives the same trials
+            self.assertEqual(levels, list(design))
+
+    def testEndless(self):
+        """Should stream trials without an end."""
+        design = OrthogonalDesign(['ab', 'xy'], counterbalance='shuffle', seed=1)
+        trials = list(itertools.islice(design, 1000))
+        self.assertEqual(trials.count(('a', 'x')), 250)
+        self.assertRaises(TypeError, len, design)
+
+    def testLatinSquare(self):
+        """Should let every cell follow every other cell equally often."""
+        for n in [4, 5]:
+            rows = n if n % 2 == 0 else 2 * n
+            square = latin_square(n, range(rows))
+            follows = dict()
+            for row in square.tolist():
+                self.assertEqual(sorted(row), range(n))
+                for pair in zip(row[:-1], row[1:]):
+                    follows[pair] = follows.get(pair, 0) + 1
+            self.assertEqual(len(follows), n * (n - 1))
+            self.assertEqual(len(set(follows.values())), 1)
+
+    def testSubject(self):
+        """Should start subjects at different Latin square rows."""
+        first = [list(OrthogonalDesign([(1, 2), (3, 4)], 4, 'latin', subject=s))[0]
+                 for s in range(4)]
+        self.assertEqual(len(set(first)), 4)
+
+
+def suite():
+    testSuite = unittest.makeSuite(OrthogonalDesignTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# test_pluginindex.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+import tempfile
+import shutil
+import os
+
+from lib.PluginController import PluginController
+from lib.pluginindex import PluginIndex
+
+
+class PluginIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.plugindir = os.path.join(self.tmpdir, "Feedbacks")
+        self.indexfile = os.path.join(self.tmpdir, "index", "plugins.index")
+        self._write_list(["Foo"], "FooFeedback")
+        self._write_list(["Bar", "Baz"], "BarFeedback")
+        os.makedirs(os.path.join(self.plugindir, "Empty", "Nothing"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def testSameAsWalk(self):
+        """Should find the same plugins as walking the directories."""
+        self.assertEqual(self._find(True), self._find(False))
+        self.assertEqual(self._find(True), {"FooFeedback" : "Foo.FooFeedback",
+                                            "BarFeedback" : "Bar.Baz.BarFeedback"})
+
+    def testCached(self):
+        """Should answer from the saved index before refreshing it."""
+        self._find(True)
+        self._write_list(["New"], "NewFeedback")
+        pc = PluginController([self.plugindir], object, PluginIndex(self.indexfile))
+        # hold the refresh back until the cached plugins are read
+        pc.refreshLock.acquire()
+        try:
+            pc.find_plugins(background=True)
+            cached = pc.availablePlugins
+        finally:
+            pc.refreshLock.release()
+        pc.wait_for_refresh()
+        self.assertFalse("NewFeedback" in cached)
+        self.assertTrue("NewFeedback" in pc.availablePlugins)
+
+    def testChanges(self):
+        """Should pick up changed, new and removed feedbacks.list files."""
+        self._backdate()
+        index = PluginIndex(self.indexfile)
+        index.scan(self.plugindir, self._load)
+        self._write_list(["Foo"], "FooFeedback", "OtherFeedback")
+        self._write_list(["Empty", "Nothing"], "NothingFeedback")
+        os.remove(os.path.join(self.plugindir, "Bar", "Baz", "feedbacks.list"))
+        plugins = index.scan(self.plugindir, self._load)
+        self.assertEqual(sorted(plugins.keys()),
+                         ["FooFeedback", "NothingFeedback", "OtherFeedback"])
+
+    def testUnchangedListNotParsed(self):
+        """Should not parse a feedbacks.list whose content did not change."""
+        self._backdate()
+        index = PluginIndex(self.indexfile)
+        index.scan(self.plugindir, self._load)
+        calls = []
+        def load(filename, plugindir):
+            calls.append(filename)
+            return self._load(filename, plugindir)
+        index.scan(self.plugindir, load)
+        self.assertEqual(calls, [])
+        # touching the file without changing it only rehashes it
+        self._write_list(["Foo"], "FooFeedback")
+        index.scan(self.plugindir, load)
+        self.assertEqual(calls, [])
+
+    def testBrokenIndexFile(self):
+        """Should ignore a broken index file."""
+        os.makedirs(os.path.dirname(self.indexfile))
+        open(self.indexfile, "wb").write("garbage")
+        index = PluginIndex(self.indexfile)
+        index.load()
+        self.assertEqual(index.cached(self.plugindir), None)
+
+    def testSaveReplaces(self):
+        """Should replace the index file without leaving temporary files."""
+        index = PluginIndex(self.indexfile)
+        index.scan(self.plugindir, self._load)
+        index.save()
+        index.save()
+        self.assertEqual(os.listdir(os.path.dirname(self.indexfile)), ["plugins.index"])
+        loaded = PluginIndex(self.indexfile)
+        loaded.load()
+        self.assertEqual(loaded.cached(self.plugindir), index.cached(self.plugindir))
+
+    def _find(self, useindex):
+        index = PluginIndex(self.indexfile) if useindex else None
+        pc = PluginController([self.plugindir], object, index)
+        pc.find_plugins()
+        return pc.availablePlugins
+
+    def _load(self, filename, plugindir):
+        return PluginController([], object).load_feedback_list(filename, plugindir)
+
+    def _write_list(self, path, *feedbacks):
+        dirname = os.path.join(self.plugindir, *path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fh = open(os.path.join(dirname, "feedbacks.list"), "w")
+        for fb in feedbacks:
+            fh.write("%s.%s\n" % (fb, fb))
+        fh.close()
+
+    def _backdate(self):
+        """Make all modification times old enough to be trusted."""
+        for root, dirs, files in os.walk(self.plugindir):
+            for name in dirs + files:
+                os.utime(os.path.join(root, name), (1, 1))
+        os.utime(self.plugindir, (1, 1))
+
+
+def suite():
+    testSuite = unittest.makeSuite(PluginIndexTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# test_scoreaccumulator.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from lib.P300Aux.ScoreAccumulator import ScoreAccumulator, make_stopping_rule
+
+
+class ScoreAccumulatorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.acc = ScoreAccumulator(3, 4)
+        for scores in [(1.0, -1.0, 0.5), (2.0, -2.0, 0.5)]:
+            for cls, score in enumerate(scores):
+                self.acc.add(cls, score)
+
+    def testMeansVariances(self):
+        """Should compute the running means and variances."""
+        self.assertEqual(list(self.acc.means()), [1.5, -1.5, 0.5])
+        self.assertEqual(list(self.acc.variances()), [0.5, 0.5, 0.0])
+        self.assertEqual(self.acc.complete_sequences(), 2)
+        self.assertEqual(self.acc.total, 6)
+
+    def testBest(self):
+        """Should pick the class with the lowest mean by default."""
+        self.assertEqual(self.acc.best(), 1)
+        self.assertEqual(list(self.acc.ranked()), [1, 2, 0])
+        acc = ScoreAccumulator(2, 1, minimize=False)
+        acc.add(0, 1.0)
+        acc.add(1, 2.0)
+        self.assertEqual(acc.best(), 1)
+
+    def testOverflow(self):
+        """Should keep the running sums beyond max_sequences."""
+        for i in range(5):
+            self.acc.add(0, 1.5)
+        self.assertEqual(self.acc.counts[0], 7)
+        self.assertEqual(self.acc.means()[0], 1.5)
+
+    def testReset(self):
+        """Should forget all scores."""
+        self.acc.reset()
+        self.assertEqual(self.acc.total, 0)
+        self.assertEqual(list(self.acc.means()), [0.0, 0.0, 0.0])
+
+    def testMarginRule(self):
+        """Should stop if the best class leads by the margin."""
+        self.assertTrue(make_stopping_rule('margin', 2.0, 2)(self.acc))
+        self.assertFalse(make_stopping_rule('margin', 2.5, 2)(self.acc))
+        self.assertFalse(make_stopping_rule('margin', 2.0, 3)(self.acc))
+
+    def testTTestRule(self):
+        """Should stop if the t statistic exceeds the threshold."""
+        # t = 2.0 / sqrt(0.5 / 2 + 0.0 / 2) = 4.0
+        self.assertTrue(make_stopping_rule('ttest', 4.0, 2)(self.acc))
+        self.assertFalse(make_stopping_rule('ttest', 4.1, 2)(self.acc))
+
+    def testPosteriorRule(self):
+        """Should stop if the posterior of the best class is high enough."""
+        rule = make_stopping_rule('posterior', 0.9)
+        p = rule.posteriors(self.acc)
+        self.assertAlmostEqual(p.sum(), 1.0)
+        self.assertEqual(p.argmax(), 1)
+        self.assertTrue(rule(self.acc))
+        self.assertFalse(make_stopping_rule('posterior', 0.99)(self.acc))
+
+    def testUnknownRule(self):
+        """Should reject unknown stopping rules."""
+        self.assertEqual(make_stopping_rule(None, 1.0), None)
+        self.assertRaises(ValueError, make_stopping_rule, 'foo', 1.0)
+
+
+def suite():
+    testSuite = unittest.makeSuite(ScoreAccumulatorTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# test_signalpath.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import unittest
+
+from lib.benchmark import signalpath
+
+
+class SignalPathTestCase(unittest.TestCase):
+
+    def testRun(self):
+        """Should measure every stage and payload."""
+        results = signalpath.run(min_time=0.001)["results"]
+        for name in ["encode.bcixml/scalar", "decode.bcixml-fast/scalar",
+                     "decode.tobixml/getvariables",
+                     "decode.binary/batch32", "ipc.send_message/getvariables",
+                     "dispatch.handle_signal/vector6"]:
+            self.assertTrue(name in results)
+            self.assertTrue(results[name]["iterations"] > 0)
+            self.assertTrue(results[name]["p50"] <= results[name]["p99"])
+        # replies are not dispatched to the Feedback
+        self.assertFalse("dispatch.handle_signal/getvariables" in results)
+
+    def testCompareResults(self):
+        """Should only report medians slower than the tolerance."""
+        baseline = {"results" : {"a" : {"p50" : 1.0}, "b" : {"p50" : 1.0}}}
+        results = {"results" : {"a" : {"p50" : 1.1}, "b" : {"p50" : 1.5},
+                                "c" : {"p50" : 9.0}}}
+        self.assertEqual(signalpath.compare_results(baseline, results, 0.2),
+                         [("b", 1.0, 1.5)])
+
+
+def suite():
+    testSuite = unittest.makeSuite(SignalPathTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
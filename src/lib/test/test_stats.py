@@ -0,0 +1,72 @@
+# test_stats.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import unittest
+
+from lib.stats import LatencyHistogram, monotonic
+
+
+class LatencyHistogramTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.h = LatencyHistogram()
+
+    def testEmpty(self):
+        """Should return None for an empty histogram."""
+        self.assertEqual(self.h.mean(), None)
+        self.assertEqual(self.h.percentile(50), None)
+
+    def testPercentiles(self):
+        """Should return the upper bound of the percentile's bucket."""
+        for i in range(99):
+            self.h.add(3e-6)
+        self.h.add(0.1)
+        self.assertEqual(self.h.count, 100)
+        self.assertEqual(self.h.percentile(50), 4e-6)
+        self.assertEqual(self.h.percentile(99), 4e-6)
+        self.assertEqual(self.h.percentile(100), 0.1)
+        self.assertEqual(self.h.max, 0.1)
+
+    def testOverflow(self):
+        """Should collect values above the last bucket."""
+        self.h.add(10.0)
+        self.assertEqual(self.h.percentile(50), 10.0)
+
+
+class MonotonicTestCase(unittest.TestCase):
+
+    def testMonotonic(self):
+        """Should advance with the time."""
+        t1 = monotonic()
+        time.sleep(0.01)
+        t2 = monotonic()
+        self.failUnless(0.005 < t2 - t1 < 1.0)
+
+
+def suite():
+    testSuite = unittest.makeSuite(LatencyHistogramTestCase)
+    testSuite.addTest(unittest.makeSuite(MonotonicTestCase))
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
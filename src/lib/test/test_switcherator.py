@@ -0,0 +1,78 @@
+# test_switcherator.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import unittest
+from threading import Thread
+
+from lib.vision_egg.util.switcherator import Flag, Switcherator
+
+
+class FlagTestCase(unittest.TestCase):
+
+    def testWaitNotSuspended(self):
+        """Should return immediately if not suspended."""
+        flag = Flag()
+        self.assertTrue(flag.wait(0))
+
+    def testWaitTimeout(self):
+        """Should return False if still suspended after the timeout."""
+        flag = Flag()
+        flag.toggle_suspension()
+        self.assertFalse(flag.wait(0.01))
+
+    def testResume(self):
+        """Should wake up waiting threads when resumed."""
+        self.__wake(lambda flag: flag.toggle_suspension())
+
+    def testOff(self):
+        """Should wake up waiting threads when switched off."""
+        flag = self.__wake(lambda flag: flag.off())
+        self.assertFalse(flag)
+
+    def testSwitcherator(self):
+        """Should stop iterating when the flag is switched off."""
+        flag = Flag()
+        it = Switcherator(flag, range(3), suspendable=True)
+        self.assertEqual(it.next(), 0)
+        flag.off()
+        self.assertRaises(StopIteration, it.next)
+
+    def __wake(self, change):
+        flag = Flag()
+        flag.toggle_suspension()
+        thread = Thread(target=flag.wait)
+        thread.start()
+        time.sleep(0.01)
+        self.assertTrue(thread.isAlive())
+        change(flag)
+        thread.join(1)
+        self.assertFalse(thread.isAlive())
+        return flag
+
+
+def suite():
+    testSuite = unittest.makeSuite(FlagTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# test_timeline.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib import timeline
+from lib.timeline import Timeline
+
+
+class TimelineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # 60Hz with frame 4 one frame late and frame 7 two frames late
+        self.tl = Timeline(16, 8)
+        self.tl.frames = 8
+        t = 0.0
+        for i, interval in enumerate([0, 1, 1, 1, 2, 1, 1, 3]):
+            t += interval / 60.0
+            self.tl.flips[i] = t
+
+    def testRefreshInterval(self):
+        """Should measure the median flip interval."""
+        self.assertAlmostEqual(self.tl.refresh_interval(), 1 / 60.0)
+
+    def testLateFrames(self):
+        """Should detect late frames and count the dropped ones."""
+        late = self.tl.late_frames()
+        self.assertEqual([(f, d) for f, i, d in late], [(4, 1), (7, 2)])
+        summary = self.tl.summary()
+        self.assertEqual(summary["late_frames"], 2)
+        self.assertEqual(summary["dropped_frames"], 3)
+
+    def testEventFrame(self):
+        """Should assign events to the next flip."""
+        tl = Timeline(4, 4)
+        tl.flip()
+        tl.event(timeline.ONSET, 1)
+        tl.event(timeline.TRIGGER, 42)
+        tl.flip()
+        tl.event(timeline.MARKER, 2)
+        events = tl.get_events()
+        self.assertEqual([(k, v, f) for t, k, v, f, d in events],
+                         [(timeline.ONSET, 1, 1), (timeline.TRIGGER, 42, 1),
+                          (timeline.MARKER, 2, 2)])
+        self.failUnless(events[0][4] >= 0)
+        self.assertEqual(events[2][4], None)
+        self.assertEqual(len(tl.get_events(timeline.TRIGGER)), 1)
+
+    def testOverflow(self):
+        """Should count flips and events which do not fit."""
+        tl = Timeline(1, 1)
+        tl.flip()
+        tl.flip()
+        tl.event(timeline.ONSET)
+        tl.event(timeline.ONSET)
+        self.assertEqual((tl.frames, tl.events, tl.overflow), (1, 1, 2))
+
+    def testSaveLoad(self):
+        """Should save and load the binary format."""
+        self.tl.event(timeline.TRIGGER, 7)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmpdir, "run.timeline")
+            self.tl.save(filename)
+            tl = timeline.load(filename)
+        finally:
+            shutil.rmtree(tmpdir)
+        self.assertEqual(tl.flips, self.tl.flips[:8])
+        self.assertEqual(tl.get_events(), self.tl.get_events())
+        self.assertEqual(tl.summary(), self.tl.summary())
+
+
+def suite():
+    testSuite = unittest.makeSuite(TimelineTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
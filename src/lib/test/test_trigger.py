@@ -0,0 +1,107 @@
+# test_trigger.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+import time
+import unittest
+
+from lib import trigger
+
+
+class TriggerDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dispatcher = trigger.TriggerDispatcher()
+        self.port = trigger.LoopbackPort()
+
+    def tearDown(self):
+        self.dispatcher.close()
+
+    def wait_for_resets(self, timeout=1.0):
+        end = time.time() + timeout
+        while self.dispatcher.pending() and time.time() < end:
+            time.sleep(0.001)
+
+    def testSetImmediately(self):
+        """Should write the trigger before send returns."""
+        self.dispatcher.send(self.port, 42, reset_time=1.0)
+        self.assertEqual(self.port.values, [42])
+
+    def testReset(self):
+        """Should reset the port to zero after the reset time."""
+        self.dispatcher.send(self.port, 42, reset_time=0.01)
+        self.wait_for_resets()
+        self.assertEqual(self.port.values, [42, 0])
+        (t1, name, value), (t2, name, value) = self.dispatcher.records
+        self.assertEqual(name, "loopback")
+        self.failUnless(t2 - t1 >= 0.01)
+
+    def testNoReset(self):
+        """Should not reset the port if reset is False."""
+        self.dispatcher.send(self.port, 42, reset=False)
+        self.assertEqual(self.dispatcher.pending(), 0)
+        time.sleep(0.02)
+        self.assertEqual(self.port.values, [42])
+
+    def testReplacePendingReset(self):
+        """Should reset only once for triggers in quick succession."""
+        self.dispatcher.send(self.port, 1, reset_time=0.05)
+        self.dispatcher.send(self.port, 2, reset_time=0.05)
+        self.dispatcher.send(self.port, 3, reset_time=0.05)
+        self.wait_for_resets()
+        time.sleep(0.02)
+        self.assertEqual(self.port.values, [1, 2, 3, 0])
+
+    def testQueue(self):
+        """Should write queued triggers after the previous reset."""
+        self.dispatcher.send(self.port, 1, reset_time=0.01, queue=True)
+        self.dispatcher.send(self.port, 2, reset_time=0.01, queue=True)
+        self.dispatcher.send(self.port, 3, reset_time=0.01, queue=True)
+        self.assertEqual(self.port.values, [1])
+        self.assertEqual(self.dispatcher.pending(), 3)
+        self.wait_for_resets()
+        self.assertEqual(self.port.values, [1, 0, 2, 0, 3, 0])
+        times = [t for t, n, v in self.dispatcher.records]
+        for t1, t2 in zip(times[:-1], times[1:]):
+            self.failUnless(t2 - t1 >= 0.01)
+
+    def testPorts(self):
+        """Should reset every port independently."""
+        other = trigger.LoopbackPort()
+        self.dispatcher.send(self.port, 1, reset_time=0.05)
+        self.dispatcher.send(other, 2, reset_time=0.01)
+        self.assertEqual(self.dispatcher.pending(), 2)
+        self.wait_for_resets()
+        self.assertEqual(self.port.values, [1, 0])
+        self.assertEqual(other.values, [2, 0])
+        self.assertEqual([v for t, n, v in self.dispatcher.records], [1, 2, 0, 0])
+
+    def testGetDispatcher(self):
+        """Should return the same dispatcher within a process."""
+        self.failUnless(trigger.get_dispatcher() is trigger.get_dispatcher())
+
+
+def suite():
+    testSuite = unittest.makeSuite(TriggerDispatcherTestCase)
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# timeline.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Presentation timeline of a Feedback.
+
+A :class:`Timeline` records the :func:`lib.stats.monotonic` time of every
+display flip and of events like stimulus onsets and triggers. An event
+becomes visible with the next flip, so every event is assigned to the frame
+of that flip. From the flip times the timeline derives the refresh interval
+and detects dropped frames::
+
+    tl = Timeline()
+    ...
+    tl.event(ONSET, 3)
+    pygame.display.flip()
+    tl.flip()
+    ...
+    print tl
+    tl.save("run1.timeline")
+
+The times are stored in preallocated arrays, recording allocates no memory
+per frame. Timelines are saved in a compact binary format which
+:func:`load` reads, or as NumPy ``.npz`` file if the file name ends with
+``.npz``.
+"""
+
+
+import sys
+import struct
+from array import array
+from threading import Lock
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from lib.stats import monotonic
+
+
+# Event kinds
+ONSET = 1
+TRIGGER = 2
+MARKER = 3
+KIND_NAMES = {ONSET : "onset", TRIGGER : "trigger", MARKER : "marker"}
+
+# Default number of frames and events a timeline can hold, 2**18 frames are
+# more than an hour at 60Hz
+FRAME_CAPACITY = 2**18
+EVENT_CAPACITY = 2**16
+# Intervals longer than (1 + LATE_TOLERANCE) refresh intervals are late
+LATE_TOLERANCE = 0.5
+
+# Binary format: header followed by the frame times and the event arrays,
+# all little endian
+MAGIC = "PTL1"
+HEADER = struct.Struct("<4sIII")
+
+
+class Timeline(object):
+    """Flip and event times of a presentation."""
+
+    def __init__(self, frame_capacity=FRAME_CAPACITY, event_capacity=EVENT_CAPACITY):
+        """
+        :param frame_capacity: Maximum number of recorded flips
+        :type frame_capacity: int
+        :param event_capacity: Maximum number of recorded events
+        :type event_capacity: int
+
+        """
+        self.flips = array("d", [0.0]) * frame_capacity
+        self.event_times = array("d", [0.0]) * event_capacity
+        self.event_frames = array("i", [0]) * event_capacity
+        self.event_kinds = array("i", [0]) * event_capacity
+        self.event_values = array("i", [0]) * event_capacity
+        self.frames = 0
+        self.events = 0
+        # flips and events which did not fit into the arrays
+        self.overflow = 0
+        self._lock = Lock()
+
+    def flip(self):
+        """Record a display flip, call it right after flipping.
+
+        Call it from exactly one place per display, every call counts as a
+        frame.
+        """
+        t = monotonic()
+        self._lock.acquire()
+        try:
+            if self.frames < len(self.flips):
+                self.flips[self.frames] = t
+                self.frames += 1
+            else:
+                self.overflow += 1
+        finally:
+            self._lock.release()
+
+    def event(self, kind, value=0):
+        """Record an event, which becomes visible with the next flip.
+
+        :param kind: ONSET, TRIGGER or MARKER
+        :type kind: int
+        :param value: E.g. the trigger value or the number of the stimulus
+        :type value: int
+
+        """
+        t = monotonic()
+        self._lock.acquire()
+        try:
+            i = self.events
+            if i < len(self.event_times):
+                self.event_times[i] = t
+                self.event_frames[i] = self.frames
+                self.event_kinds[i] = kind
+                self.event_values[i] = value
+                self.events += 1
+            else:
+                self.overflow += 1
+        finally:
+            self._lock.release()
+
+    def intervals(self):
+        """Return the intervals between the recorded flips."""
+        flips = self.flips
+        return [flips[i + 1] - flips[i] for i in range(self.frames - 1)]
+
+    def refresh_interval(self):
+        """Return the median flip interval or None with less than two flips."""
+        intervals = sorted(self.intervals())
+        if not intervals:
+            return None
+        return intervals[len(intervals) // 2]
+
+    def late_frames(self, tolerance=LATE_TOLERANCE):
+        """Return the frames which came late.
+
+        :param tolerance: Allowed deviation from the refresh interval
+        :type tolerance: float
+        :returns: List of tuples (frame, interval, dropped frames)
+
+        """
+        refresh = self.refresh_interval()
+        if not refresh:
+            return []
+        late = []
+        for i, interval in enumerate(self.intervals()):
+            if interval > refresh * (1 + tolerance):
+                late.append((i + 1, interval, max(int(round(interval / refresh)) - 1, 1)))
+        return late
+
+    def get_events(self, kind=None):
+        """Return the recorded events with the flips they became visible on.
+
+        :param kind: Only return events of this kind, None for all
+        :type kind: int
+        :returns: List of tuples (time, kind, value, frame, delay), delay is
+            the time from the event to its flip or None if there was no
+            flip after the event
+
+        """
+        events = []
+        for i in range(self.events):
+            if kind is not None and self.event_kinds[i] != kind:
+                continue
+            frame = self.event_frames[i]
+            delay = None
+            if frame < self.frames:
+                delay = self.flips[frame] - self.event_times[i]
+            events.append((self.event_times[i], self.event_kinds[i],
+                           self.event_values[i], frame, delay))
+        return events
+
+    def summary(self):
+        """Return a dictionary with the number of frames and events, the
+        duration, the refresh interval, the number of late and dropped frames
+        and the maximum delay from an event to its flip."""
+        late = self.late_frames()
+        delays = [e[4] for e in self.get_events() if e[4] is not None]
+        return {"frames" : self.frames,
+                "events" : self.events,
+                "overflow" : self.overflow,
+                "duration" : self.flips[self.frames - 1] - self.flips[0] if self.frames else 0.0,
+                "refresh_interval" : self.refresh_interval(),
+                "late_frames" : len(late),
+                "dropped_frames" : sum([d for f, i, d in late]),
+                "max_event_delay" : max(delays) if delays else None}
+
+    def save(self, filename):
+        """Save the timeline, as NumPy archive if the file name ends with
+        ``.npz``.
+
+        :param filename: File name
+        :type filename: str
+
+        """
+        if filename.endswith(".npz"):
+            self._save_npz(filename)
+            return
+        fh = open(filename, "wb")
+        try:
+            fh.write(HEADER.pack(MAGIC, self.frames, self.events, self.overflow))
+            for a, n in ((self.flips, self.frames),
+                         (self.event_times, self.events),
+                         (self.event_frames, self.events),
+                         (self.event_kinds, self.events),
+                         (self.event_values, self.events)):
+                _write_array(fh, a[:n])
+        finally:
+            fh.close()
+
+    def _save_npz(self, filename):
+        if numpy is None:
+            raise IOError("Saving %s requires NumPy" % filename)
+        n = self.events
+        numpy.savez(filename,
+                    flips=numpy.frombuffer(self.flips, "d", self.frames),
+                    event_times=numpy.frombuffer(self.event_times, "d", n),
+                    event_frames=numpy.frombuffer(self.event_frames, "i", n),
+                    event_kinds=numpy.frombuffer(self.event_kinds, "i", n),
+                    event_values=numpy.frombuffer(self.event_values, "i", n),
+                    overflow=self.overflow)
+
+    def __str__(self):
+        s = self.summary()
+        refresh = s["refresh_interval"]
+        return "%i frames, %i events, refresh interval %s, %i late frames, %i dropped frames" % (
+                s["frames"], s["events"],
+                "%.2fms" % (refresh * 1000) if refresh else "unknown",
+                s["late_frames"], s["dropped_frames"])
+
+
+def load(filename):
+    """Load a timeline saved in the binary format.
+
+    :param filename: File name
+    :type filename: str
+    :returns: :class:`Timeline`
+
+    """
+    fh = open(filename, "rb")
+    try:
+        magic, frames, events, overflow = HEADER.unpack(fh.read(HEADER.size))
+        if magic != MAGIC:
+            raise IOError("%s is not a timeline" % filename)
+        tl = Timeline(frames, events)
+        tl.flips = _read_array(fh, "d", frames)
+        tl.event_times = _read_array(fh, "d", events)
+        tl.event_frames = _read_array(fh, "i", events)
+        tl.event_kinds = _read_array(fh, "i", events)
+        tl.event_values = _read_array(fh, "i", events)
+    finally:
+        fh.close()
+    tl.frames, tl.events, tl.overflow = frames, events, overflow
+    return tl
+
+
+def _write_array(fh, a):
+    if sys.byteorder == "big":
+        a = array(a.typecode, a)
+        a.byteswap()
+    a.tofile(fh)
+
+
+def _read_array(fh, typecode, n):
+    a = array(typecode)
+    a.fromfile(fh, n)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+_pygame_display = None
+
+def record_pygame_flips(tl):
+    """Record every ``pygame.display.flip`` and ``pygame.display.update``
+    in the timeline until :func:`stop_recording_pygame_flips` is called.
+
+    :param tl: Timeline
+    :type tl: :class:`Timeline`
+
+    """
+    global _pygame_display
+    import pygame
+    stop_recording_pygame_flips()
+    flip, update = pygame.display.flip, pygame.display.update
+    def recording_flip():
+        flip()
+        tl.flip()
+    def recording_update(*args):
+        update(*args)
+        tl.flip()
+    pygame.display.flip = recording_flip
+    pygame.display.update = recording_update
+    _pygame_display = flip, update
+
+
+def stop_recording_pygame_flips():
+    """Restore the original ``pygame.display`` functions."""
+    global _pygame_display
+    if _pygame_display is None:
+        return
+    import pygame
+    pygame.display.flip, pygame.display.update = _pygame_display
+    _pygame_display = None
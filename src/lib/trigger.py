@@ -0,0 +1,267 @@
+# trigger.py -
+# Copyright (C) 2014  Bastian Venthur
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along
+# with this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+
+"""Trigger pulses on hardware ports.
+
+A trigger is a value written to a port (parallel or serial) which is reset to
+zero after a short time. Instead of starting a timer thread per trigger, all
+resets of a process are scheduled by one :class:`TriggerDispatcher` with a
+deadline queue. A new trigger on a port before the reset of the previous one
+replaces the pending reset, unless it is sent with ``queue=True``: queued
+triggers wait until the previous trigger is reset and the port stayed at zero
+for the reset time, so every trigger is held long enough to be sampled.
+
+The dispatcher keeps a record of the actual set and reset times, which can be
+used to check the timing of an experiment::
+
+    port = trigger.ParallelPort(pport, 0x378)
+    trigger.get_dispatcher().send(port, 42)
+    ...
+    for t, name, value in trigger.get_dispatcher().records:
+        print t, name, value
+
+"""
+
+
+import os
+import sys
+import atexit
+import heapq
+import logging
+from collections import deque
+from threading import Thread, Condition, Lock
+
+from lib.stats import monotonic
+
+
+# Default time until a trigger is reset in seconds
+DEFAULT_RESET_TIME = 0.01
+# Number of set and reset events kept in the record
+RECORD_SIZE = 10000
+
+
+class TriggerPort(object):
+    """Port the triggers are written to.
+
+    The base class ignores all triggers, derived classes override
+    :meth:`write`.
+    """
+
+    name = "trigger"
+
+    def write(self, value):
+        """Write the value to the port.
+
+        :param value: Trigger value
+        :type value: int
+
+        """
+        pass
+
+
+class ParallelPort(TriggerPort):
+    """Parallel port via inpout32.dll on Windows or pyparallel elsewhere."""
+
+    name = "parallel"
+
+    def __init__(self, pport, port_num=0x378):
+        """
+        :param pport: inpout32 dll on Windows, parallel.Parallel elsewhere
+        :param port_num: Address of the port (Windows only)
+        :type port_num: int
+
+        """
+        self.pport = pport
+        self.port_num = port_num
+        self.win32 = sys.platform == 'win32'
+
+    def write(self, value):
+        if self.win32:
+            self.pport.Out32(self.port_num, value)
+        else:
+            self.pport.setData(value)
+
+
+class SerialPort(TriggerPort):
+    """Serial port, the value is written as one byte."""
+
+    name = "serial"
+
+    def __init__(self, serial):
+        """
+        :param serial: Open port
+        :type serial: serial.Serial
+
+        """
+        self.serial = serial
+
+    def write(self, value):
+        self.serial.write(chr(value))
+
+
+class NullPort(TriggerPort):
+    """Port which ignores all triggers."""
+
+    name = "null"
+
+
+class LoopbackPort(TriggerPort):
+    """Port which remembers the values written to it, useful for tests."""
+
+    name = "loopback"
+
+    def __init__(self):
+        self.values = []
+
+    def write(self, value):
+        self.values.append(value)
+
+
+class TriggerDispatcher(object):
+    """Writes triggers and resets them after a deadline.
+
+    Use :func:`get_dispatcher` to get the dispatcher of the current process.
+    Triggers are written immediately in the calling thread, the resets are
+    written by a daemon thread of the dispatcher.
+    """
+
+    def __init__(self, record_size=RECORD_SIZE):
+        self.logger = logging.getLogger("TriggerDispatcher")
+        # (time, port name, value) of all writes
+        self.records = deque(maxlen=record_size)
+        # heap of (deadline, sequence number, port, value), value None for a
+        # reset, otherwise a queued trigger
+        self._deadlines = []
+        # port -> sequence number of its pending reset or queued trigger
+        self._pending = {}
+        # port -> deque of (value, reset_time) of queued triggers
+        self._queued = {}
+        self._seq = 0
+        self._closed = False
+        self._cond = Condition()
+        self._thread = Thread(target=self._reset_loop, name="TriggerDispatcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, port, value, reset=True, reset_time=DEFAULT_RESET_TIME, queue=False):
+        """Write the trigger to the port.
+
+        :param port: Port
+        :type port: :class:`TriggerPort`
+        :param value: Trigger value
+        :type value: int
+        :param reset: Reset the port to zero after reset_time
+        :type reset: bool
+        :param reset_time: Time until the reset in seconds
+        :type reset_time: float
+        :param queue: If the port is not reset yet, write the trigger after
+            the reset and reset_time at zero instead of immediately. Queued
+            triggers are always reset.
+        :type queue: bool
+
+        """
+        self._cond.acquire()
+        try:
+            if queue and port in self._pending:
+                self._queued.setdefault(port, deque()).append((value, reset_time))
+                return
+            self._write(port, value)
+            if reset or queue:
+                # replaces a pending reset of a previous trigger
+                self._schedule(port, monotonic() + reset_time, None)
+        finally:
+            self._cond.release()
+
+    def pending(self):
+        """Return the number of pending resets and queued triggers."""
+        return len(self._pending) + sum([len(q) for q in self._queued.values()])
+
+    def close(self):
+        """Stop the dispatcher, pending resets are dropped."""
+        self._cond.acquire()
+        try:
+            self._closed = True
+            self._cond.notify()
+        finally:
+            self._cond.release()
+        self._thread.join()
+
+    def _write(self, port, value):
+        try:
+            port.write(value)
+        except:
+            self.logger.exception("Writing trigger %s to %s failed:" % (str(value), port.name))
+            return
+        self.records.append((monotonic(), port.name, value))
+
+    def _schedule(self, port, deadline, value):
+        self._seq += 1
+        self._pending[port] = self._seq
+        heapq.heappush(self._deadlines, (deadline, self._seq, port, value))
+        self._cond.notify()
+
+    def _reset_loop(self):
+        self._cond.acquire()
+        try:
+            while not self._closed:
+                if not self._deadlines:
+                    self._cond.wait()
+                    continue
+                deadline, seq, port, value = self._deadlines[0]
+                now = monotonic()
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                heapq.heappop(self._deadlines)
+                # outdated if the port got a new trigger in the meantime
+                if self._pending.get(port) != seq:
+                    continue
+                del self._pending[port]
+                queued = self._queued.get(port)
+                if value is not None:
+                    # queued trigger, its reset follows after its reset time
+                    self._write(port, value)
+                    self._schedule(port, now + queued.popleft()[1], None)
+                else:
+                    self._write(port, 0)
+                    if queued:
+                        # keep the port at zero before the next trigger
+                        self._schedule(port, now + queued[0][1], queued[0][0])
+                if not queued:
+                    self._queued.pop(port, None)
+        finally:
+            self._cond.release()
+
+
+_dispatcher = None
+_dispatcher_pid = None
+_dispatcher_lock = Lock()
+
+def get_dispatcher():
+    """Return the trigger dispatcher of this process."""
+    global _dispatcher, _dispatcher_pid
+    _dispatcher_lock.acquire()
+    try:
+        # the thread of a dispatcher inherited via fork is not running
+        if _dispatcher is None or _dispatcher_pid != os.getpid():
+            _dispatcher = TriggerDispatcher()
+            _dispatcher_pid = os.getpid()
+            atexit.register(_dispatcher.close)
+        return _dispatcher
+    finally:
+        _dispatcher_lock.release()
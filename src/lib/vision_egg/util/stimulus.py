@@ -16,22 +16,60 @@ along with this program; if not, see <http://www.gnu.org/licenses/>.
 """
 
 from time import sleep
-from datetime import datetime, timedelta
+from datetime import timedelta
 import collections, logging, itertools, random
 
 import VisionEgg
 
+from lib import timeline
+from lib.stats import monotonic, LatencyHistogram
 from lib.vision_egg.util.frame_counter import FrameCounter
 
 _refresh_rate = VisionEgg.config.VISIONEGG_MONITOR_REFRESH_HZ
 _frame_duration = 1. / _refresh_rate
 
+# Time before a stimulus onset in seconds from which on the painter spins
+# instead of sleeping, covering the scheduler's wakeup latency
+SPIN_MARGIN = .002
+
 def _frames(time):
     return int(round(float(time) * _refresh_rate))
 
 def _is_seq(l):
     return isinstance(l, collections.Sequence)
 
+def sleep_until(deadline, spin_margin=SPIN_MARGIN):
+    """ Wait until the monotonic clock reaches deadline. Sleep until
+    spin_margin seconds before the deadline, then spin. """
+    remaining = deadline - monotonic()
+    while remaining > spin_margin:
+        sleep(remaining - spin_margin)
+        remaining = deadline - monotonic()
+    while monotonic() < deadline:
+        pass
+
+class OnsetStatistics(object):
+    """ Difference between the target and the actual stimulus onsets.
+    Onsets are never early, so only the lateness is collected. An onset
+    which is at least one frame late misses its vsync frame. """
+    def __init__(self):
+        self.lateness = LatencyHistogram()
+        self.missed_frames = 0
+
+    def add(self, target, actual):
+        late = max(actual - target, 0.)
+        self.lateness.add(late)
+        if late >= _frame_duration:
+            self.missed_frames += 1
+
+    def summary(self):
+        summary = self.lateness.summary()
+        summary['missed_frames'] = self.missed_frames
+        return summary
+
+    def __str__(self):
+        return '%s, %d missed frames' % (self.lateness, self.missed_frames)
+
 class StimulusTime(object):
     def __init__(self, time, vsync=True):
         self._vsync = vsync
@@ -95,7 +133,8 @@ class StimulusPainter(object):
     """ Painter for a series of stimuli. """
     def __init__(self, prepare, wait, view, flag, wait_style_fixed=False,
                  print_frames=False, suspendable=True, pre_stimulus=None,
-                 frame_transition=False, vsync=True):
+                 frame_transition=False, vsync=True, spin_margin=SPIN_MARGIN,
+                 timeline=None):
         self._prepare_func = prepare
         self._wait_times = itertools.cycle(wait)
         self._view = view
@@ -106,9 +145,15 @@ class StimulusPainter(object):
         self._pre_stimulus = pre_stimulus
         self._frame_transition = frame_transition
         self._vsync = vsync
+        self._spin_margin = spin_margin
+        self._timeline = timeline
+        self._onsets = 0
         self._logger = logging.getLogger('StimulusPainter')
+        # the flips are recorded by the presentation of the Feedback, the
+        # frame counter must not add its own
         self._frame_counter = FrameCounter(self._flag)
-        self._suspended_time = timedelta()
+        self._suspended_time = 0.
+        self.onset_stats = OnsetStatistics()
         self._wait = self._frame_wait if frame_transition else self._time_wait
         self._online_times = []
 
@@ -116,7 +161,7 @@ class StimulusPainter(object):
         if self._print_frames or self._frame_transition:
             self._frame_counter.start()
         if self._prepare():
-            self._last_start = datetime.now()
+            self._last_start = monotonic()
             self._frame_counter.lock()
             self._present()
             while self._prepare():
@@ -127,6 +172,9 @@ class StimulusPainter(object):
         if self._print_frames:
             self._logger.debug('Frames rendered during last sequence: %d' %
                                self._frame_counter.frame)
+        if not self._frame_transition:
+            self._logger.debug('Stimulus onset lateness: %s' %
+                               self.onset_stats)
 
     def _frame_wait(self):
         next_interval = self._next_duration
@@ -137,11 +185,11 @@ class StimulusPainter(object):
                                self._frame_counter.last_interval)
 
     def _time_wait(self):
-        next_start = self._last_start + self._next_duration
-        while next_start - datetime.now() > timedelta():
-            pass
-        self._last_start = (next_start if self._wait_style_fixed else
-                            datetime.now())
+        next_start = self._last_start + self._next_duration.total_seconds()
+        sleep_until(next_start, self._spin_margin)
+        now = monotonic()
+        self.onset_stats.add(next_start, now)
+        self._last_start = next_start if self._wait_style_fixed else now
         if self._print_frames:
             self._logger.debug('Frames after waiting: %d' %
                                self._frame_counter.last_interval)
@@ -149,9 +197,9 @@ class StimulusPainter(object):
     def _prepare(self):
         if self._flag:
             if self._suspendable and self._flag.suspended:
-                suspend_start = datetime.now()
+                suspend_start = monotonic()
                 self._flag.wait()
-                self._suspended_time = datetime.now() - suspend_start
+                self._suspended_time = monotonic() - suspend_start
             return self._do_prepare()
 
     def _present(self):
@@ -160,6 +208,9 @@ class StimulusPainter(object):
                                self._frame_counter.last_interval)
         if self._pre_stimulus is not None:
             self._pre_stimulus()
+        if self._timeline is not None:
+            self._timeline.event(timeline.ONSET, self._onsets)
+        self._onsets += 1
         self._frame_counter.lock()
         self._view.update()
 
@@ -174,8 +225,8 @@ class StimulusPainter(object):
     @property
     def _suspended(self):
         t = self._suspended_time
-        self._suspended_time = timedelta()
-        return _frames(t.total_seconds()) if self._frame_transition else t
+        self._suspended_time = 0.
+        return _frames(t) if self._frame_transition else timedelta(seconds=t)
 
 class StimulusSequence(StimulusPainter):
     def _do_prepare(self):
@@ -202,12 +253,15 @@ class StimulusSequenceFactory(object):
     respectively.
     """
     def __init__(self, view, flag, print_frames=False, vsync_times=False,
-                 frame_transition=False):
+                 frame_transition=False, spin_margin=SPIN_MARGIN,
+                 timeline=None):
         self._view = view
         self._flag = flag
         self._print_frames = print_frames
         self._vsync_times = vsync_times
         self._frame_transition = frame_transition
+        self._spin_margin = spin_margin
+        self._timeline = timeline
         self._logger = logging.getLogger('StimulusSequenceFactory')
 
     def create(self, prepare, times=None, wait_style_fixed=True,
@@ -230,7 +284,8 @@ class StimulusSequenceFactory(object):
                    print_frames=self._print_frames, suspendable=suspendable,
                    pre_stimulus=pre_stimulus,
                    frame_transition=self._frame_transition,
-                   vsync=self._vsync_times)
+                   vsync=self._vsync_times, spin_margin=self._spin_margin,
+                   timeline=self._timeline)
 
     def _times(self, times):
         if not _is_seq(times):
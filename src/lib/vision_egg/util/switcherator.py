@@ -13,29 +13,49 @@ program; if not, see <http://www.gnu.org/licenses/>.
 
 """
 
-from time import sleep
+from threading import Condition
 
 class Flag(object):
+    """ Run/suspend state shared by the stimulus iterators.
+    Waiting threads are woken as soon as the state changes. """
     def __init__(self):
+        self._cond = Condition()
         self.reset()
 
     def __nonzero__(self):
         return self._flag
 
+    def _set(self, flag, suspended):
+        self._cond.acquire()
+        try:
+            self._flag = flag
+            self.suspended = suspended
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
     def off(self):
-        self._flag = False
-        self.suspended = False
+        self._set(False, False)
 
     def reset(self):
-        self._flag = True
-        self.suspended = False
+        self._set(True, False)
 
     def toggle_suspension(self):
-        self.suspended = not self.suspended
+        self._set(self._flag, not self.suspended)
 
-    def wait(self):
-        while self.suspended:
-            sleep(0.1)
+    def wait(self, timeout=None):
+        """ Block while suspended. Return True if no longer suspended,
+        False if the timeout expired. """
+        self._cond.acquire()
+        try:
+            if timeout is None:
+                while self.suspended:
+                    self._cond.wait()
+            elif self.suspended:
+                self._cond.wait(timeout)
+            return not self.suspended
+        finally:
+            self._cond.release()
 
 class Switcherator(object):
     def __init__(self, flag, itr, suspendable=False):